@@ -0,0 +1,73 @@
+"""
+Compare two benchmark result files, e.g. from the base and head commits.
+
+    python -m benchmarks.compare benchmarks/results/abc1234.json benchmarks/results/def5678.json
+
+Prints the p50/p95 change of every benchmark present in both and exits with
+status 1 when one got slower than --threshold or runs more SQL queries.
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as results_file:
+        data = json.load(results_file)
+    return data, {(result['name'], result['scale']): result for result in data['results']}
+
+
+def change(base, head):
+    if not base:
+        return 0.0
+    return (head - base) / base
+
+
+def compare(base_results, head_results, threshold):
+    """
+    Return (rows, regressions) for the benchmarks present in both runs
+    """
+    rows = []
+    regressions = []
+    for key in sorted(base_results.keys() & head_results.keys()):
+        base, head = base_results[key], head_results[key]
+        p50 = change(base['p50_ms'], head['p50_ms'])
+        p95 = change(base['p95_ms'], head['p95_ms'])
+        queries = head['queries_max'] - base['queries_max']
+        regressed = p50 > threshold or queries > 0
+        rows.append((key, base, head, p50, p95, queries, regressed))
+        if regressed:
+            regressions.append(key)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('base')
+    parser.add_argument('head')
+    parser.add_argument(
+        '--threshold', type=float, default=0.2,
+        help='Relative p50 slowdown counted as a regression (default: 0.2)',
+    )
+    args = parser.parse_args()
+
+    base_data, base_results = load(args.base)
+    head_data, head_results = load(args.head)
+    rows, regressions = compare(base_results, head_results, args.threshold)
+
+    print(f'{base_data["commit"]} -> {head_data["commit"]}')
+    print(
+        f'{"benchmark":<28} {"scale":<7} {"p50_ms":>17} {"change":>8} '
+        f'{"p95_ms":>17} {"change":>8} {"queries":>9}'
+    )
+    for (name, scale), base, head, p50, p95, queries, regressed in rows:
+        print(
+            f'{name:<28} {scale:<7} {base["p50_ms"]:>8.2f}→{head["p50_ms"]:<8.2f} {p50:>+8.0%} '
+            f'{base["p95_ms"]:>8.2f}→{head["p95_ms"]:<8.2f} {p95:>+8.0%} '
+            f'{base["queries_max"]:>4}→{head["queries_max"]:<4}{"  REGRESSION" if regressed else ""}'
+        )
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import django
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from loadtest.process_audio import percentile
+
+from .datasets import SCALES, seed
+
+
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('benchmarks')
+    group.addoption(
+        '--bench-scales', default='small',
+        help=f'Comma-separated dataset scales to run at ({", ".join(SCALES)}; default: small)',
+    )
+    group.addoption('--bench-iterations', type=int, default=50, help='Timed requests per benchmark')
+    group.addoption('--bench-warmup', type=int, default=3, help='Untimed requests before each benchmark')
+    group.addoption(
+        '--bench-json',
+        help='Where to write the results (default: benchmarks/results/<commit>.json)',
+    )
+
+
+def pytest_generate_tests(metafunc):
+    if 'dataset' in metafunc.fixturenames:
+        scales = [name.strip() for name in metafunc.config.getoption('bench_scales').split(',') if name.strip()]
+        unknown = sorted(set(scales) - set(SCALES))
+        if unknown:
+            raise pytest.UsageError(f'Unknown benchmark scale(s): {", ".join(unknown)}')
+        # Session-scoped, so pytest groups the benchmarks by scale and seeds each once
+        metafunc.parametrize('dataset', scales, indirect=True, scope='session')
+
+
+@pytest.fixture(scope='session')
+def dataset(request, django_db_setup, django_db_blocker):
+    """
+    The database seeded at the requested scale, for the whole session
+    """
+    with django_db_blocker.unblock():
+        started = time.perf_counter()
+        dataset = seed(SCALES[request.param])
+        request.config.bench_seed_seconds[request.param] = round(time.perf_counter() - started, 2)
+    return dataset
+
+
+def pytest_configure(config):
+    config.bench_results = []
+    config.bench_seed_seconds = {}
+
+
+class Benchmark:
+    """
+    Times repeated calls of a request function and records latency
+    percentiles and SQL query counts for the JSON report
+    """
+
+    def __init__(self, config, name, scale):
+        self.config = config
+        self.name = name
+        self.scale = scale
+
+    def __call__(self, request, iterations=None, expected_status=(200,)):
+        """
+        Call `request(i)` for warmup and timed iterations; it must return a
+        test client response
+        """
+        iterations = iterations or self.config.getoption('bench_iterations')
+        for index in range(self.config.getoption('bench_warmup')):
+            request(-1 - index)
+
+        latencies = []
+        queries = []
+        for index in range(iterations):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = request(index)
+                latencies.append((time.perf_counter() - started) * 1000)
+            assert response.status_code in expected_status, (response.status_code, response.content[:200])
+            queries.append(len(captured))
+
+        result = {
+            'name': self.name,
+            'scale': self.scale,
+            'iterations': iterations,
+            'mean_ms': round(statistics.mean(latencies), 3),
+            'min_ms': round(min(latencies), 3),
+            'p50_ms': round(percentile(latencies, 0.50), 3),
+            'p95_ms': round(percentile(latencies, 0.95), 3),
+            'p99_ms': round(percentile(latencies, 0.99), 3),
+            'max_ms': round(max(latencies), 3),
+            'queries_min': min(queries),
+            'queries_max': max(queries),
+            'queries_mean': round(statistics.mean(queries), 2),
+        }
+        self.config.bench_results.append(result)
+        return result
+
+
+@pytest.fixture
+def bench(request, dataset, db):
+    """
+    Benchmark runner named after the test, at the current dataset's scale
+    """
+    return Benchmark(request.config, request.node.originalname.removeprefix('test_'), dataset.scale.name)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def pytest_sessionfinish(session, exitstatus):
+    config = session.config
+    if not config.bench_results:
+        return
+    commit = git_commit()
+    path = Path(config.getoption('bench_json') or RESULTS_DIR / f'{commit}.json')
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({
+        'commit': commit,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'seed_seconds': config.bench_seed_seconds,
+        'results': config.bench_results,
+    }, indent=2))
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    if not config.bench_results:
+        return
+    terminalreporter.section('benchmarks')
+    terminalreporter.write_line(
+        f'{"benchmark":<28} {"scale":<7} {"p50_ms":>9} {"p95_ms":>9} {"p99_ms":>9} {"queries":>8}'
+    )
+    for result in config.bench_results:
+        terminalreporter.write_line(
+            f'{result["name"]:<28} {result["scale"]:<7} {result["p50_ms"]:>9.2f} '
+            f'{result["p95_ms"]:>9.2f} {result["p99_ms"]:>9.2f} {result["queries_max"]:>8}'
+        )
@@ -0,0 +1,113 @@
+"""
+Synthetic databases for the endpoint benchmarks.
+
+Rows are generated from a fixed seed, so every run at a given scale sees
+the same data, and inserted with chunked bulk_create; the DailySummary
+rollup is rebuilt once at the end instead of being maintained per row.
+"""
+import random
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from food_tracking.extractor import local_food_extractor
+from food_tracking.models import MEAL_TYPE_CHOICES, CalorieEntry, DailyGoal, DailySummary, FoodItem
+from food_tracking.rollups import rebuild_daily_summaries
+from food_tracking.search import food_search_index, normalize_name
+from food_tracking.synthetic import MEAL_MIX, explicit_created_at, food_name
+
+
+Scale = namedtuple('Scale', ['name', 'entries', 'food_items', 'days'])
+
+SCALES = {
+    'small': Scale('small', entries=1_000, food_items=100, days=30),
+    'medium': Scale('medium', entries=100_000, food_items=10_000, days=365),
+    'large': Scale('large', entries=1_000_000, food_items=500_000, days=3 * 365),
+}
+
+BATCH_SIZE = 5000
+
+Dataset = namedtuple('Dataset', ['scale', 'first_day', 'last_day', 'busy_day', 'food_item_ids', 'search_terms'])
+
+
+def clear():
+    """
+    Empty the benchmark tables without loading rows for the delete signals
+    """
+    with connection.cursor() as cursor:
+        for model in (CalorieEntry, DailySummary, DailyGoal, FoodItem):
+            cursor.execute(f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)}')
+    food_search_index.invalidate()
+    local_food_extractor.invalidate()
+
+
+def seed(scale, seed=0):
+    """
+    Replace the benchmark tables with a deterministic dataset of `scale`
+    and return a Dataset describing it
+    """
+    rng = random.Random(seed)
+    clear()
+
+    tz = timezone.get_current_timezone()
+    last_day = timezone.localdate()
+    first_day = last_day - timedelta(days=scale.days - 1)
+    created_at = datetime.combine(first_day, time.min, tzinfo=tz)
+
+    with transaction.atomic(), explicit_created_at(FoodItem, CalorieEntry):
+        food_items = []
+        for index in range(scale.food_items):
+            name = food_name(index)
+            food_items.append(FoodItem(
+                name=name,
+                normalized_name=normalize_name(name),
+                calories_per_100g=Decimal(rng.randint(10, 900)),
+                protein_per_100g=Decimal(rng.randint(0, 400)) / 10,
+                carbs_per_100g=Decimal(rng.randint(0, 900)) / 10,
+                fat_per_100g=Decimal(rng.randint(0, 500)) / 10,
+                created_at=created_at,
+            ))
+        FoodItem.objects.bulk_create(food_items, batch_size=BATCH_SIZE)
+        food_items = list(FoodItem.objects.only(
+            'id', 'calories_per_100g', 'protein_per_100g', 'carbs_per_100g', 'fat_per_100g'
+        ))
+
+        meal_types = [meal_type for meal_type, _ in MEAL_TYPE_CHOICES]
+        meal_weights = [MEAL_MIX[meal_type] for meal_type in meal_types]
+        cent = Decimal('0.01')
+        seconds = scale.days * 24 * 3600
+        entries = []
+        for _ in range(scale.entries):
+            food_item = rng.choice(food_items)
+            quantity = Decimal(rng.randint(20, 400))
+            multiplier = quantity / 100
+            entries.append(CalorieEntry(
+                food_item_id=food_item.id,
+                quantity_grams=quantity,
+                calories=(food_item.calories_per_100g * multiplier).quantize(cent),
+                protein=(food_item.protein_per_100g * multiplier).quantize(cent),
+                carbs=(food_item.carbs_per_100g * multiplier).quantize(cent),
+                fat=(food_item.fat_per_100g * multiplier).quantize(cent),
+                meal_type=rng.choices(meal_types, meal_weights)[0],
+                created_at=created_at + timedelta(seconds=rng.randrange(seconds)),
+            ))
+            if len(entries) == BATCH_SIZE:
+                CalorieEntry.objects.bulk_create(entries)
+                entries = []
+        CalorieEntry.objects.bulk_create(entries)
+
+        DailyGoal.objects.create()
+    rebuild_daily_summaries()
+
+    busy_day = DailySummary.objects.order_by('-entries_count', 'date').values_list('date', flat=True).first()
+    return Dataset(
+        scale=scale,
+        first_day=first_day,
+        last_day=last_day,
+        busy_day=busy_day or last_day,
+        food_item_ids=[food_item.id for food_item in food_items],
+        search_terms=['apple', 'rice', 'gri', 'chicken breast', 'baked sweet potato', 'yog'],
+    )
@@ -0,0 +1,64 @@
+"""
+Latency and SQL query benchmarks for the food tracking endpoints.
+
+    pytest benchmarks --bench-scales small,medium --bench-iterations 100
+
+Every benchmark runs once per selected scale (see datasets.SCALES). Results
+are written as JSON; compare two runs with `python -m benchmarks.compare`.
+"""
+from datetime import timedelta
+
+
+def test_food_search(bench, dataset, client):
+    terms = dataset.search_terms
+    bench(lambda i: client.get('/api/food-items/', {'search': terms[i % len(terms)]}))
+
+
+def test_entries_list(bench, client):
+    bench(lambda i: client.get('/api/entries/'))
+
+
+def test_entries_list_for_day(bench, dataset, client):
+    days = (dataset.last_day - dataset.first_day).days + 1
+
+    def request(i):
+        day = dataset.first_day + timedelta(days=i % days)
+        return client.get('/api/entries/', {'date': day.isoformat()})
+
+    bench(request)
+
+
+def test_entries_list_next_page(bench, client):
+    next_url = client.get('/api/entries/').json()['next']
+    bench(lambda i: client.get(next_url))
+
+
+def test_daily_summary(bench, dataset, client):
+    bench(lambda i: client.get('/api/summary/', {'date': dataset.busy_day.isoformat()}))
+
+
+def test_daily_summary_totals_only(bench, dataset, client):
+    bench(lambda i: client.get('/api/summary/', {'date': dataset.busy_day.isoformat(), 'entries': 'false'}))
+
+
+def test_goals_get(bench, client):
+    bench(lambda i: client.get('/api/goals/'))
+
+
+def test_goals_update(bench, client):
+    bench(lambda i: client.patch(
+        '/api/goals/', {'target_calories': 1800 + i % 400}, content_type='application/json'
+    ))
+
+
+def test_entry_create(bench, dataset, client):
+    food_item_ids = dataset.food_item_ids
+
+    def request(i):
+        return client.post('/api/entries/', {
+            'food_item': food_item_ids[i * 7919 % len(food_item_ids)],
+            'quantity_grams': 50 + i % 250,
+            'meal_type': 'lunch',
+        }, content_type='application/json')
+
+    bench(request, expected_status=(201,))
@@ -12,5 +12,12 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "calorie_tracker.settings")
+# Executor threads never close their connections; see settings.py
+os.environ["DB_PERSISTENT_CONNECTIONS"] = "false"
 
 application = get_asgi_application()
+
+# Recover audio jobs interrupted by a restart or a dead worker
+from food_tracking.jobs import audio_job_queue  # noqa: E402
+
+audio_job_queue.start()
@@ -12,11 +12,15 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 import environ
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# manage.py test or pytest
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -31,6 +35,20 @@ SECRET_KEY = env('SECRET_KEY')
 
 # OpenAI API Configuration
 OPENAI_API_KEY = env('OPENAI_API_KEY', default='')
+# Optional override, e.g. a local fake server for load tests
+OPENAI_BASE_URL = env('OPENAI_BASE_URL', default=None)
+# Shared client pool, timeouts (seconds), retries and circuit breaker
+# (see food_tracking/openai_client.py)
+OPENAI_MAX_CONNECTIONS = env.int('OPENAI_MAX_CONNECTIONS', default=20)
+OPENAI_ASYNC_MAX_CONNECTIONS = env.int('OPENAI_ASYNC_MAX_CONNECTIONS', default=200)
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = env.int('OPENAI_MAX_KEEPALIVE_CONNECTIONS', default=20)
+OPENAI_CONNECT_TIMEOUT = env.float('OPENAI_CONNECT_TIMEOUT', default=5.0)
+OPENAI_READ_TIMEOUT = env.float('OPENAI_READ_TIMEOUT', default=30.0)
+OPENAI_MAX_RETRIES = env.int('OPENAI_MAX_RETRIES', default=2)
+OPENAI_BACKOFF_BASE = env.float('OPENAI_BACKOFF_BASE', default=0.5)
+OPENAI_BACKOFF_MAX = env.float('OPENAI_BACKOFF_MAX', default=8.0)
+OPENAI_CIRCUIT_FAILURE_THRESHOLD = env.int('OPENAI_CIRCUIT_FAILURE_THRESHOLD', default=5)
+OPENAI_CIRCUIT_RESET_TIMEOUT = env.float('OPENAI_CIRCUIT_RESET_TIMEOUT', default=30.0)
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = env('DEBUG', default=True)
@@ -49,6 +67,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "food_tracking.instrumentation.RequestTimingMiddleware",
+    "food_tracking.profiling.ProfilingMiddleware",
+    "food_tracking.metrics.MetricsMiddleware",
+    "food_tracking.db.ReadReplicaMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -76,13 +98,65 @@ WSGI_APPLICATION = "calorie_tracker.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite tuning (see food_tracking/db.py), applied to every new connection.
+# WAL lets readers run alongside the one writer, synchronous=NORMAL only
+# syncs at checkpoints (safe with WAL), and IMMEDIATE transactions take the
+# write lock up front, waiting up to SQLITE_BUSY_TIMEOUT_MS for it instead
+# of failing with "database is locked" on the upgrade. SQLITE_TUNING=false
+# restores the defaults.
+#
+# Connections are kept for DB_CONN_MAX_AGE seconds only with
+# DB_PERSISTENT_CONNECTIONS, which calorie_tracker/wsgi.py turns on: under
+# WSGI every connection belongs to a request thread that closes it once it
+# expires. Under ASGI, sync_to_async executor threads and the audio job
+# threads would keep theirs open for good, so asgi.py turns it off.
+DATABASE_PATH = env('DATABASE_PATH', default=str(BASE_DIR / 'db.sqlite3'))
+SQLITE_TUNING = env.bool('SQLITE_TUNING', default=True)
+DB_PERSISTENT_CONNECTIONS = env.bool('DB_PERSISTENT_CONNECTIONS', default=False)
+SQLITE_BUSY_TIMEOUT_MS = env.int('SQLITE_BUSY_TIMEOUT_MS', default=5000)
+SQLITE_PRAGMAS = {
+    'journal_mode': env('SQLITE_JOURNAL_MODE', default='wal'),
+    'synchronous': env('SQLITE_SYNCHRONOUS', default='normal'),
+    'busy_timeout': SQLITE_BUSY_TIMEOUT_MS,
+    # Negative sizes are KiB: 64 MiB of page cache per connection
+    'cache_size': env.int('SQLITE_CACHE_SIZE', default=-64000),
+    'mmap_size': env.int('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024),
+    'temp_store': 'memory',
+} if SQLITE_TUNING else {}
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "NAME": DATABASE_PATH,
+        "CONN_MAX_AGE": (
+            env.int('DB_CONN_MAX_AGE', default=600 if SQLITE_TUNING else 0) if DB_PERSISTENT_CONNECTIONS else 0
+        ),
+        "CONN_HEALTH_CHECKS": SQLITE_TUNING,
+        "OPTIONS": {
+            "transaction_mode": "IMMEDIATE",
+            "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+        } if SQLITE_TUNING else {},
     }
 }
 
+# Optional read replica, e.g. a Litestream/LiteFS copy of the database or
+# the same file opened a second time. It is opened read-only, and
+# GET/HEAD requests to the REPLICA_VIEWS URL names read from it; everything
+# else, and every write, uses "default".
+DATABASE_REPLICA_PATH = env('DATABASE_REPLICA_PATH', default='')
+REPLICA_VIEWS = env.list('REPLICA_VIEWS', default=[
+    'food_items', 'calorie_entries', 'calorie_entry_detail', 'daily_summary', 'summary_range',
+])
+if DATABASE_REPLICA_PATH:
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "NAME": f"file:{DATABASE_REPLICA_PATH}?mode=ro",
+        # Read-only connections cannot BEGIN IMMEDIATE
+        "OPTIONS": {"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_ROUTERS = ["food_tracking.db.ReadReplicaRouter"]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -122,6 +196,135 @@ REST_FRAMEWORK = {
     'UNAUTHENTICATED_TOKEN': None,
 }
 
+# In-memory food search index (see food_tracking/search.py)
+FOOD_SEARCH_RESULT_LIMIT = env.int('FOOD_SEARCH_RESULT_LIMIT', default=50)
+FOOD_SEARCH_MAX_LIMIT = env.int('FOOD_SEARCH_MAX_LIMIT', default=200)
+# Seconds before the index is rebuilt to pick up other workers' writes (0 = never)
+FOOD_SEARCH_INDEX_MAX_AGE = env.int('FOOD_SEARCH_INDEX_MAX_AGE', default=300)
+
+# Longest span accepted by /api/summary/range/
+SUMMARY_RANGE_MAX_DAYS = env.int('SUMMARY_RANGE_MAX_DAYS', default=366)
+
+# Largest batch accepted by /api/entries/bulk/
+BULK_ENTRY_MAX_ITEMS = env.int('BULK_ENTRY_MAX_ITEMS', default=100)
+
+# Background audio jobs (POST /api/process-audio/?mode=background)
+AUDIO_JOB_WORKERS = env.int('AUDIO_JOB_WORKERS', default=4)
+AUDIO_JOB_MAX_PENDING = env.int('AUDIO_JOB_MAX_PENDING', default=100)
+AUDIO_JOB_STORAGE_DIR = env('AUDIO_JOB_STORAGE_DIR', default=str(BASE_DIR / 'audio_jobs'))
+# Seconds after which a job still marked processing is assumed abandoned
+AUDIO_JOB_STALE_AFTER = env.int('AUDIO_JOB_STALE_AFTER', default=600)
+# Seconds between sweeps for queued and abandoned jobs
+AUDIO_JOB_SWEEP_INTERVAL = env.int('AUDIO_JOB_SWEEP_INTERVAL', default=60)
+
+# Whisper transcription cache keyed by audio hash (see food_tracking/caches.py)
+TRANSCRIPTION_CACHE_MEMORY_ITEMS = env.int('TRANSCRIPTION_CACHE_MEMORY_ITEMS', default=256)
+# Set to an empty string to disable the on-disk tier
+TRANSCRIPTION_CACHE_DIR = env('TRANSCRIPTION_CACHE_DIR', default=str(BASE_DIR / 'cache' / 'transcriptions'))
+TRANSCRIPTION_CACHE_MAX_BYTES = env.int('TRANSCRIPTION_CACHE_MAX_BYTES', default=50 * 1024 * 1024)
+
+# ChatGPT extraction cache keyed by normalized transcript, shared through SQLite
+# (set EXTRACTION_CACHE_PATH to an empty string to disable)
+EXTRACTION_CACHE_PATH = env('EXTRACTION_CACHE_PATH', default=str(BASE_DIR / 'cache' / 'extractions.sqlite3'))
+EXTRACTION_CACHE_TTL = env.int('EXTRACTION_CACHE_TTL', default=7 * 24 * 3600)
+EXTRACTION_CACHE_MAX_ENTRIES = env.int('EXTRACTION_CACHE_MAX_ENTRIES', default=10000)
+
+# Optional micro-batching of ChatGPT extractions: requests arriving within
+# EXTRACTION_BATCH_WINDOW_MS share one completion, up to EXTRACTION_BATCH_MAX_SIZE
+EXTRACTION_BATCH_ENABLED = env.bool('EXTRACTION_BATCH_ENABLED', default=False)
+EXTRACTION_BATCH_WINDOW_MS = env.int('EXTRACTION_BATCH_WINDOW_MS', default=50)
+EXTRACTION_BATCH_MAX_SIZE = env.int('EXTRACTION_BATCH_MAX_SIZE', default=8)
+
+# Transcripts the local food extractor resolves with at least this confidence
+# skip ChatGPT (see food_tracking/extractor.py)
+LOCAL_EXTRACTION_MIN_CONFIDENCE = env.float('LOCAL_EXTRACTION_MIN_CONFIDENCE', default=0.8)
+
+# Per-request query counts, database and external call time, sent as a
+# Server-Timing header and logged as JSON on the food_tracking.requests
+# logger (see food_tracking/instrumentation.py). A query shape run this many
+# times in one request is logged as an N+1 suspect. Every request is logged
+# at INFO; set REQUEST_TIMING_LOG_LEVEL=WARNING to log only the suspects.
+REQUEST_TIMING_ENABLED = env.bool('REQUEST_TIMING_ENABLED', default=True)
+N_PLUS_ONE_THRESHOLD = env.int('N_PLUS_ONE_THRESHOLD', default=5)
+# Test runs keep to the suspects instead of a line per test request
+REQUEST_TIMING_LOG_LEVEL = env('REQUEST_TIMING_LOG_LEVEL', default='WARNING' if TESTING else 'INFO')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'food_tracking.requests': {
+            'handlers': ['console'],
+            'level': REQUEST_TIMING_LOG_LEVEL,
+            'propagate': False,
+        },
+    },
+}
+
+# Opt-in profiling (see food_tracking/profiling.py): a PROFILING_SAMPLE_RATE
+# fraction of requests under PROFILING_PATHS, plus any request sending an
+# X-Profile-Token header equal to PROFILING_SECRET, are profiled with the
+# "sample" (stack sampling every PROFILING_INTERVAL_MS) or "cprofile"
+# profiler. The aggregate is served at /api/internal/profile/ to holders of
+# the secret. With neither a rate nor a secret the middleware is removed.
+PROFILING_SAMPLE_RATE = env.float('PROFILING_SAMPLE_RATE', default=0.0)
+PROFILING_SECRET = env('PROFILING_SECRET', default='')
+PROFILING_MODE = env('PROFILING_MODE', default='sample')
+PROFILING_INTERVAL_MS = env.int('PROFILING_INTERVAL_MS', default=5)
+PROFILING_PATHS = env.list('PROFILING_PATHS', default=['/api/'])
+
+# Prometheus metrics (see food_tracking/metrics.py), served at /metrics to
+# scrapers sending "Authorization: Bearer <METRICS_TOKEN>" from
+# METRICS_ALLOWED_IPS ("*" for any); without a token /metrics is a 404.
+# Behind a reverse proxy every client comes from the proxy's address, so
+# the token is what keeps the endpoint private. With METRICS_DIR set (e.g. to
+# BASE_DIR / 'metrics'), every worker process writes its values to a file
+# there and /metrics sums them, so all workers of one server must share the
+# directory and no other deployment may use it; gunicorn.conf.py empties it
+# when the server starts. Empty, each process keeps its metrics to itself.
+METRICS_DIR = env('METRICS_DIR', default='')
+if TESTING:
+    # Tests never write to or sum a running server's metrics files
+    METRICS_DIR = ''
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
+METRICS_ALLOWED_IPS = env.list('METRICS_ALLOWED_IPS', default=['127.0.0.1', '::1'])
+
+# Speech and language model backends (see food_tracking/backends.py). The
+# StandIn* backends answer offline after STAND_IN_LATENCY_MS plus up to
+# STAND_IN_JITTER_MS and fail at STAND_IN_ERROR_RATE, for development and
+# load tests
+TRANSCRIPTION_BACKEND = env('TRANSCRIPTION_BACKEND', default='food_tracking.backends.OpenAITranscriptionBackend')
+EXTRACTION_BACKEND = env('EXTRACTION_BACKEND', default='food_tracking.backends.OpenAIExtractionBackend')
+STAND_IN_LATENCY_MS = env.int('STAND_IN_LATENCY_MS', default=0)
+STAND_IN_JITTER_MS = env.int('STAND_IN_JITTER_MS', default=0)
+STAND_IN_ERROR_RATE = env.float('STAND_IN_ERROR_RATE', default=0.0)
+
+# Audio uploads are kept in memory up to FILE_UPLOAD_MAX_MEMORY_SIZE and only
+# spooled to a temporary file above it; anything past AUDIO_UPLOAD_MAX_BYTES
+# (Whisper's own limit by default) is rejected with 413 while still streaming in
+AUDIO_UPLOAD_MAX_BYTES = env.int('AUDIO_UPLOAD_MAX_BYTES', default=25 * 1024 * 1024)
+FILE_UPLOAD_MAX_MEMORY_SIZE = env.int('FILE_UPLOAD_MAX_MEMORY_SIZE', default=5 * 1024 * 1024)
+FILE_UPLOAD_HANDLERS = [
+    'food_tracking.audio.AudioUploadLimitHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Audio preprocessing before Whisper upload (see food_tracking/audio.py):
+# mono, resampled, silence trimmed, capped at AUDIO_MAX_DURATION seconds and
+# re-encoded; encoding to anything but wav needs ffmpeg
+AUDIO_PREPROCESS_ENABLED = env.bool('AUDIO_PREPROCESS_ENABLED', default=True)
+AUDIO_PREPROCESS_FORMAT = env('AUDIO_PREPROCESS_FORMAT', default='ogg')
+AUDIO_PREPROCESS_CODEC = env('AUDIO_PREPROCESS_CODEC', default='libopus')
+AUDIO_PREPROCESS_BITRATE = env('AUDIO_PREPROCESS_BITRATE', default='24k')
+AUDIO_SAMPLE_RATE = env.int('AUDIO_SAMPLE_RATE', default=16000)
+AUDIO_SILENCE_THRESHOLD = env.float('AUDIO_SILENCE_THRESHOLD', default=-45.0)
+AUDIO_SILENCE_PADDING_MS = env.int('AUDIO_SILENCE_PADDING_MS', default=200)
+AUDIO_MAX_DURATION = env.int('AUDIO_MAX_DURATION', default=120)
+
 # CORS settings for frontend communication
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -16,6 +16,9 @@ Including another URLconf
 """
 from django.urls import path, include
 
+from food_tracking.views import metrics_view
+
 urlpatterns = [
+    path("metrics", metrics_view, name="metrics"),
     path("api/", include("food_tracking.urls")),
 ]
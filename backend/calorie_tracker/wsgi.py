@@ -12,5 +12,12 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "calorie_tracker.settings")
+# Request threads close their own connections, so they can be kept open
+os.environ.setdefault("DB_PERSISTENT_CONNECTIONS", "true")
 
 application = get_wsgi_application()
+
+# Recover audio jobs interrupted by a restart or a dead worker
+from food_tracking.jobs import audio_job_queue  # noqa: E402
+
+audio_job_queue.start()
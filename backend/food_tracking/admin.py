@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import FoodItem, CalorieEntry, DailyGoal
+from .models import FoodItem, CalorieEntry, DailyGoal, DailySummary, AudioJob
 
 
 @admin.register(FoodItem)
@@ -24,3 +24,19 @@ class DailyGoalAdmin(admin.ModelAdmin):
     list_display = ('user', 'target_calories', 'target_protein', 'target_carbs', 'target_fat', 'updated_at')
     search_fields = ('user__username', 'user__email')
     ordering = ('user__username',)
+
+
+@admin.register(DailySummary)
+class DailySummaryAdmin(admin.ModelAdmin):
+    list_display = ('date', 'meal_type', 'calories', 'protein', 'carbs', 'fat', 'entries_count')
+    list_filter = ('meal_type', 'date')
+    ordering = ('-date', 'meal_type')
+    readonly_fields = ('calories', 'protein', 'carbs', 'fat', 'entries_count')
+
+
+@admin.register(AudioJob)
+class AudioJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('status', 'created_at')
+    ordering = ('-created_at',)
+    readonly_fields = ('result', 'error', 'started_at', 'finished_at')
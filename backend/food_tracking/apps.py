@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class FoodTrackingConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "food_tracking"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,156 @@
+import io
+import os
+from collections import namedtuple
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+from pydub import AudioSegment
+from pydub.silence import detect_leading_silence
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+PreprocessedAudio = namedtuple(
+    'PreprocessedAudio',
+    ['name', 'data', 'format', 'original_bytes', 'original_duration_ms', 'duration_ms'],
+)
+
+# Formats pydub can read and write without ffmpeg
+NATIVE_FORMATS = ('wav',)
+
+
+def audio_format(file_name):
+    suffix = Path(file_name or '').suffix.lower().lstrip('.')
+    return suffix or None
+
+
+def trim_silence(segment, threshold, padding_ms, chunk_ms=10):
+    """
+    Drop leading and trailing audio quieter than `threshold` dBFS, keeping
+    `padding_ms` either side so the first and last words are not clipped.
+    An entirely silent clip is returned unchanged.
+    """
+    start = detect_leading_silence(segment, silence_threshold=threshold, chunk_size=chunk_ms)
+    if start >= len(segment):
+        return segment
+    end = len(segment) - detect_leading_silence(
+        segment.reverse(), silence_threshold=threshold, chunk_size=chunk_ms
+    )
+    return segment[max(0, start - padding_ms):min(len(segment), end + padding_ms)]
+
+
+def export_segment(segment, format=None):
+    """
+    Encode `segment` with the configured compact codec, falling back to WAV
+    when the encoder (ffmpeg) is not available. Returns (format, bytes).
+    """
+    format = format or getattr(settings, 'AUDIO_PREPROCESS_FORMAT', 'ogg')
+    if format not in NATIVE_FORMATS:
+        output = io.BytesIO()
+        try:
+            segment.export(
+                output,
+                format=format,
+                codec=getattr(settings, 'AUDIO_PREPROCESS_CODEC', 'libopus') or None,
+                bitrate=getattr(settings, 'AUDIO_PREPROCESS_BITRATE', '24k') or None,
+            )
+            return format, output.getvalue()
+        except Exception as e:
+            print(f"Audio encode error ({format}), falling back to wav: {e}")
+    output = io.BytesIO()
+    segment.export(output, format='wav')
+    return 'wav', output.getvalue()
+
+
+def stream_size(stream):
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    return size
+
+
+def preprocess_audio(source, file_name='audio.m4a', format=None):
+    """
+    Shrink a recording before it is sent to Whisper: downmix to mono,
+    resample to AUDIO_SAMPLE_RATE, trim leading/trailing silence, cap the
+    length at AUDIO_MAX_DURATION seconds and re-encode with a compact codec.
+
+    `source` is raw bytes or a seekable binary stream (an upload is decoded
+    straight from its buffer). Raises when the audio cannot be decoded
+    (e.g. m4a without ffmpeg).
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    original_bytes = stream_size(source)
+    segment = AudioSegment.from_file(source, format=audio_format(file_name))
+    original_duration_ms = len(segment)
+
+    segment = segment.set_channels(1).set_frame_rate(
+        getattr(settings, 'AUDIO_SAMPLE_RATE', 16000)
+    ).set_sample_width(2)
+    segment = trim_silence(
+        segment,
+        threshold=getattr(settings, 'AUDIO_SILENCE_THRESHOLD', -45.0),
+        padding_ms=getattr(settings, 'AUDIO_SILENCE_PADDING_MS', 200),
+    )
+    max_duration = getattr(settings, 'AUDIO_MAX_DURATION', 120)
+    if max_duration:
+        segment = segment[:int(max_duration * 1000)]
+
+    format, encoded = export_segment(segment, format)
+    return PreprocessedAudio(
+        name=f'{Path(file_name or "audio").stem}.{format}',
+        data=encoded,
+        format=format,
+        original_bytes=original_bytes,
+        original_duration_ms=original_duration_ms,
+        duration_ms=len(segment),
+    )
+
+
+def prepare_upload(audio_file, file_name='audio.m4a'):
+    """
+    Return the (name, stream) to upload to Whisper for a binary stream.
+
+    Preprocessing is best effort: when it is disabled, fails, or would only
+    make the upload bigger without shortening it, the original stream is
+    sent as is, without another copy.
+    """
+    if getattr(settings, 'AUDIO_PREPROCESS_ENABLED', True):
+        try:
+            processed = preprocess_audio(audio_file, file_name)
+        except Exception as e:
+            print(f"Audio preprocessing error: {e}")
+        else:
+            if (
+                len(processed.data) < processed.original_bytes
+                or processed.duration_ms < processed.original_duration_ms
+            ):
+                return processed.name, io.BytesIO(processed.data)
+    audio_file.seek(0)
+    return file_name, audio_file
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Audio file is too large'
+    default_code = 'upload_too_large'
+
+
+class AudioUploadLimitHandler(FileUploadHandler):
+    """
+    Abort an upload as soon as a file passes AUDIO_UPLOAD_MAX_BYTES, before
+    the rest of the body is read, spooled or written to disk. It sits in
+    front of Django's memory and temporary-file handlers, which keep small
+    uploads in memory and only spill ones above FILE_UPLOAD_MAX_MEMORY_SIZE.
+    """
+
+    def receive_data_chunk(self, raw_data, start):
+        max_bytes = getattr(settings, 'AUDIO_UPLOAD_MAX_BYTES', 25 * 1024 * 1024)
+        if start + len(raw_data) > max_bytes:
+            raise UploadTooLarge(f'Audio file is larger than {max_bytes // (1024 * 1024)} MB')
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
@@ -0,0 +1,222 @@
+import asyncio
+import json
+import random
+import time
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .caches import hash_stream
+from .extractor import local_food_extractor
+from .openai_client import openai_clients
+
+
+class TranscriptionError(Exception):
+    pass
+
+
+class StandInError(Exception):
+    pass
+
+
+class TranscriptionBackend:
+    """
+    Turns recorded speech into text.
+
+    Subclasses implement `transcribe(file_name, stream)` for a seekable
+    binary stream; `atranscribe` runs it in a worker thread unless
+    overridden. `model` is part of the transcription cache key.
+    """
+    model = None
+
+    def transcribe(self, file_name, stream):
+        raise NotImplementedError
+
+    async def atranscribe(self, file_name, stream):
+        return await sync_to_async(self.transcribe, thread_sensitive=False)(file_name, stream)
+
+
+class ExtractionBackend:
+    """
+    Answers a chat prompt with text.
+
+    Subclasses implement `complete(messages, max_tokens)`; `acomplete` runs
+    it in a worker thread and `astream` yields the whole reply as a single
+    piece unless overridden. `model` is part of the extraction cache key.
+    """
+    model = None
+
+    def complete(self, messages, max_tokens):
+        raise NotImplementedError
+
+    async def acomplete(self, messages, max_tokens):
+        return await sync_to_async(self.complete, thread_sensitive=False)(messages, max_tokens)
+
+    async def astream(self, messages, max_tokens):
+        yield await self.acomplete(messages, max_tokens)
+
+
+class OpenAITranscriptionBackend(TranscriptionBackend):
+    """
+    Whisper through the shared pooled clients, with timeouts, retries and a
+    circuit breaker (see openai_client.py)
+    """
+    model = 'whisper-1'
+
+    def request(self, file_name, stream):
+        def request_transcription(client):
+            # Rewind so a retried attempt uploads the whole file again
+            stream.seek(0)
+            return client.audio.transcriptions.create(
+                model=self.model,
+                file=(file_name, stream),
+                response_format='text'
+            )
+        return request_transcription
+
+    def transcribe(self, file_name, stream):
+        return openai_clients.call('transcription', self.request(file_name, stream))
+
+    async def atranscribe(self, file_name, stream):
+        return await openai_clients.acall('transcription', self.request(file_name, stream))
+
+
+class OpenAIExtractionBackend(ExtractionBackend):
+    """
+    ChatGPT through the shared pooled clients
+    """
+    model = 'gpt-3.5-turbo'
+    temperature = 0.3
+
+    def request(self, messages, max_tokens, **kwargs):
+        return lambda client: client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=self.temperature,
+            max_tokens=max_tokens,
+            **kwargs
+        )
+
+    def complete(self, messages, max_tokens):
+        response = openai_clients.call('chat', self.request(messages, max_tokens))
+        return response.choices[0].message.content
+
+    async def acomplete(self, messages, max_tokens):
+        response = await openai_clients.acall('chat', self.request(messages, max_tokens))
+        return response.choices[0].message.content
+
+    async def astream(self, messages, max_tokens):
+        stream = await openai_clients.acall('chat', self.request(messages, max_tokens, stream=True))
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+# What the stand-in transcription backend "hears", picked by a hash of the audio
+STAND_IN_TRANSCRIPTIONS = [
+    "I had a banana and a cup of coffee for breakfast",
+    "Had a chicken salad with olive oil dressing",
+    "Ate two slices of pizza for lunch",
+    "Had an apple and some almonds as a snack",
+    "I just finished eating grilled salmon with vegetables"
+]
+
+
+class StandInMixin:
+    """
+    Simulated upstream for offline development and load tests.
+
+    Every call waits STAND_IN_LATENCY_MS plus up to STAND_IN_JITTER_MS and
+    then fails with StandInError at STAND_IN_ERROR_RATE.
+    """
+
+    def delay(self):
+        latency = getattr(settings, 'STAND_IN_LATENCY_MS', 0)
+        jitter = getattr(settings, 'STAND_IN_JITTER_MS', 0)
+        return (latency + random.uniform(0, jitter)) / 1000
+
+    def maybe_fail(self):
+        if random.random() < getattr(settings, 'STAND_IN_ERROR_RATE', 0):
+            raise StandInError(f'Simulated {self.model} failure')
+
+    def simulate(self):
+        time.sleep(self.delay())
+        self.maybe_fail()
+
+    async def asimulate(self):
+        await asyncio.sleep(self.delay())
+        self.maybe_fail()
+
+
+class StandInTranscriptionBackend(StandInMixin, TranscriptionBackend):
+    """
+    Returns one of STAND_IN_TRANSCRIPTIONS, always the same one for the same
+    audio, without a network call
+    """
+    model = 'stand-in'
+
+    def pick(self, stream):
+        return STAND_IN_TRANSCRIPTIONS[int(hash_stream(stream)[:8], 16) % len(STAND_IN_TRANSCRIPTIONS)]
+
+    def transcribe(self, file_name, stream):
+        self.simulate()
+        return self.pick(stream)
+
+    async def atranscribe(self, file_name, stream):
+        await self.asimulate()
+        return await sync_to_async(self.pick, thread_sensitive=False)(stream)
+
+
+class StandInExtractionBackend(StandInMixin, ExtractionBackend):
+    """
+    Answers extraction prompts, single or batched, in the model's JSON
+    format using the local food extractor, without a network call
+    """
+    model = 'stand-in'
+    chunk_size = 16
+
+    def extract(self, transcription):
+        structured_data = local_food_extractor.extract(transcription) or {'meal': 'unknown', 'items': []}
+        # The model does not report a confidence; resolve_food_data derives one
+        structured_data.pop('confidence', None)
+        return structured_data
+
+    def reply(self, messages):
+        content = messages[-1]['content']
+        if content.startswith('Transcriptions:'):
+            transcriptions = [line.split('. ', 1)[-1] for line in content.splitlines()[1:]]
+            return json.dumps({'results': [self.extract(transcription) for transcription in transcriptions]})
+        return json.dumps(self.extract(content.removeprefix('Transcription: ')))
+
+    def complete(self, messages, max_tokens):
+        self.simulate()
+        return self.reply(messages)
+
+    async def acomplete(self, messages, max_tokens):
+        await self.asimulate()
+        # The extractor is built from the database on first use
+        return await sync_to_async(self.reply)(messages)
+
+    async def astream(self, messages, max_tokens):
+        reply = await self.acomplete(messages, max_tokens)
+        for start in range(0, len(reply), self.chunk_size):
+            yield reply[start:start + self.chunk_size]
+
+
+@lru_cache(maxsize=None)
+def load_backend(path):
+    return import_string(path)()
+
+
+def get_transcription_backend():
+    return load_backend(getattr(
+        settings, 'TRANSCRIPTION_BACKEND', 'food_tracking.backends.OpenAITranscriptionBackend'
+    ))
+
+
+def get_extraction_backend():
+    return load_backend(getattr(
+        settings, 'EXTRACTION_BACKEND', 'food_tracking.backends.OpenAIExtractionBackend'
+    ))
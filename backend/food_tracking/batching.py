@@ -0,0 +1,103 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+
+
+class MicroBatcher:
+    """
+    Groups calls that arrive close together into one batched call.
+
+    `submit(item)` returns a concurrent.futures.Future. Items are collected
+    until `window` seconds have passed since the first one or `max_size`
+    are pending, then `handler(items)` runs on a flush thread and must
+    return one result per item, in order. An exception from the handler is
+    set on every future of the batch. Identical items in one batch share a
+    single slot.
+
+    Async callers can await `asyncio.wrap_future(batcher.submit(item))`
+    without holding a thread while they wait.
+    """
+
+    def __init__(self, handler, window=None, max_size=None, max_workers=None, name='batch'):
+        self.handler = handler
+        self.name = name
+        self._window = window
+        self._max_size = max_size
+        self._max_workers = max_workers
+        self._lock = threading.Lock()
+        self._pending = []
+        self._timer = None
+        self._executor = None
+        self._executor_pid = None
+        self.batches = 0
+        self.items = 0
+
+    @property
+    def window(self):
+        if self._window is not None:
+            return self._window
+        return getattr(settings, 'EXTRACTION_BATCH_WINDOW_MS', 50) / 1000
+
+    @property
+    def max_size(self):
+        if self._max_size is not None:
+            return self._max_size
+        return getattr(settings, 'EXTRACTION_BATCH_MAX_SIZE', 8)
+
+    def submit(self, item):
+        future = Future()
+        batch = None
+        with self._lock:
+            self._pending.append((item, future))
+            if len(self._pending) >= self.max_size:
+                batch = self._take()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.window, self._flush_pending)
+                self._timer.daemon = True
+                self._timer.start()
+        if batch:
+            self._get_executor().submit(self._run, batch)
+        return future
+
+    def _take(self):
+        # Called with the lock held
+        batch, self._pending = self._pending, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _flush_pending(self):
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self._run(batch)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                max_workers = self._max_workers or getattr(settings, 'OPENAI_MAX_CONNECTIONS', 20)
+                self._executor = ThreadPoolExecutor(
+                    max_workers=max_workers, thread_name_prefix=self.name
+                )
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _run(self, batch):
+        unique = list(dict.fromkeys(item for item, _ in batch))
+        with self._lock:
+            self.batches += 1
+            self.items += len(batch)
+        try:
+            results = self.handler(unique)
+            if len(results) != len(unique):
+                raise ValueError(f'{self.name} handler returned {len(results)} results for {len(unique)} items')
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        by_item = dict(zip(unique, results))
+        for item, future in batch:
+            future.set_result(by_item[item])
@@ -0,0 +1,356 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from django.conf import settings
+
+from .metrics import CACHE_LOOKUPS
+
+
+def hash_stream(stream, chunk_size=1024 * 1024):
+    """
+    Hash a binary stream from the start, leaving it rewound for the next reader
+    """
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+class TranscriptionCache:
+    """
+    Two-tier cache of Whisper transcriptions keyed by a hash of the audio.
+
+    A bounded in-memory LRU sits in front of a directory of small text files
+    shared by every worker process. The directory is kept under a byte budget
+    by evicting the least recently used files (by mtime, refreshed on hits).
+    """
+
+    def __init__(self, memory_items=None, directory=None, max_bytes=None):
+        self._memory_items = memory_items
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._disk_bytes = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def memory_items(self):
+        if self._memory_items is not None:
+            return self._memory_items
+        return getattr(settings, 'TRANSCRIPTION_CACHE_MEMORY_ITEMS', 256)
+
+    @property
+    def directory(self):
+        directory = self._directory
+        if directory is None:
+            directory = getattr(settings, 'TRANSCRIPTION_CACHE_DIR', None)
+        return Path(directory) if directory else None
+
+    @property
+    def max_bytes(self):
+        if self._max_bytes is not None:
+            return self._max_bytes
+        return getattr(settings, 'TRANSCRIPTION_CACHE_MAX_BYTES', 50 * 1024 * 1024)
+
+    @staticmethod
+    def make_key(audio_hash, model):
+        return f'{model}-{audio_hash}'
+
+    def get(self, key):
+        """
+        Return the cached transcription for `key`, or None
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                CACHE_LOOKUPS.inc(cache='transcription', result='hit')
+                return self._memory[key]
+
+        text = self._read_disk(key)
+        CACHE_LOOKUPS.inc(cache='transcription', result='miss' if text is None else 'hit')
+        with self._lock:
+            if text is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, text)
+        return text
+
+    def set(self, key, text):
+        with self._lock:
+            self._remember(key, text)
+        self._write_disk(key, text)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._disk_bytes = None
+            self.memory_hits = self.disk_hits = self.misses = 0
+        directory = self.directory
+        if directory and directory.is_dir():
+            for path in directory.glob('*.txt'):
+                path.unlink(missing_ok=True)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_ratio': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                'memory_items': len(self._memory),
+            }
+
+    def _remember(self, key, text):
+        if self.memory_items <= 0:
+            return
+        self._memory[key] = text
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _path(self, key):
+        return self.directory / f'{key}.txt'
+
+    def _read_disk(self, key):
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            text = path.read_text(encoding='utf-8')
+            os.utime(path)
+        except OSError:
+            return None
+        return text
+
+    def _write_disk(self, key, text):
+        directory = self.directory
+        if not directory:
+            return
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            data = text.encode('utf-8')
+            # Write then rename so readers in other processes never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as stream:
+                stream.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print(f"Transcription cache write error: {e}")
+            return
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(path.stat().st_size for path in directory.glob('*.txt'))
+            else:
+                self._disk_bytes += len(data)
+            if self._disk_bytes > self.max_bytes:
+                self._evict_disk(directory)
+
+    def _evict_disk(self, directory):
+        # Evict down to 90% of the budget so eviction is not triggered on every write
+        entries = []
+        for path in directory.glob('*.txt'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+        self._disk_bytes = total
+
+
+transcription_cache = TranscriptionCache()
+
+
+NUMBER_WORDS = {
+    'zero': 0, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6,
+    'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12,
+    'thirteen': 13, 'fourteen': 14, 'fifteen': 15, 'sixteen': 16,
+    'seventeen': 17, 'eighteen': 18, 'nineteen': 19,
+}
+TENS_WORDS = {
+    'twenty': 20, 'thirty': 30, 'forty': 40, 'fifty': 50,
+    'sixty': 60, 'seventy': 70, 'eighty': 80, 'ninety': 90,
+}
+WORD_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+
+
+def normalize_transcript(text):
+    """
+    Reduce a transcript to a canonical form for cache lookups: lowercase,
+    no punctuation, single spaces and number words turned into digits
+    ("Two  Eggs, and twenty-five grams of oats!" -> "2 eggs and 25 grams of oats").
+    """
+    words = WORD_RE.findall(text.lower().replace('-', ' '))
+    normalized = []
+    index = 0
+    while index < len(words):
+        word = words[index]
+        if word in TENS_WORDS:
+            value = TENS_WORDS[word]
+            following = words[index + 1] if index + 1 < len(words) else None
+            if following in NUMBER_WORDS and 0 < NUMBER_WORDS[following] < 10:
+                value += NUMBER_WORDS[following]
+                index += 1
+            normalized.append(str(value))
+        elif word in NUMBER_WORDS:
+            normalized.append(str(NUMBER_WORDS[word]))
+        else:
+            normalized.append(word)
+        index += 1
+    return ' '.join(normalized)
+
+
+class ExtractionCache:
+    """
+    Cache of ChatGPT food extractions shared by all worker processes.
+
+    Entries live in a local SQLite file keyed on the normalized transcript,
+    the model and a hash of the prompt. They expire after
+    EXTRACTION_CACHE_TTL seconds, and the least recently used ones are
+    evicted once the table holds more than EXTRACTION_CACHE_MAX_ENTRIES.
+    """
+
+    def __init__(self, path=None, ttl=None, max_entries=None):
+        self._path = path
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def path(self):
+        path = self._path
+        if path is None:
+            path = getattr(settings, 'EXTRACTION_CACHE_PATH', None)
+        return Path(path) if path else None
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, 'EXTRACTION_CACHE_TTL', 7 * 24 * 3600)
+
+    @property
+    def max_entries(self):
+        if self._max_entries is not None:
+            return self._max_entries
+        return getattr(settings, 'EXTRACTION_CACHE_MAX_ENTRIES', 10000)
+
+    @staticmethod
+    def make_key(transcription, model, prompt):
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:16]
+        return f'{model}:{prompt_hash}:{normalize_transcript(transcription)}'
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            path = self.path
+            path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS extraction_cache ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                'created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS extraction_cache_accessed '
+                'ON extraction_cache (accessed_at)'
+            )
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        """
+        Return the cached extraction for `key`, or None if missing or expired
+        """
+        if not self.path:
+            return None
+        now = time.time()
+        try:
+            connection = self._connection()
+            row = connection.execute(
+                'SELECT value FROM extraction_cache WHERE key = ? AND created_at > ?',
+                (key, now - self.ttl)
+            ).fetchone()
+            if row is not None:
+                connection.execute(
+                    'UPDATE extraction_cache SET accessed_at = ? WHERE key = ?', (now, key)
+                )
+        except sqlite3.Error as e:
+            print(f"Extraction cache read error: {e}")
+            row = None
+
+        CACHE_LOOKUPS.inc(cache='extraction', result='miss' if row is None else 'hit')
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        if not self.path:
+            return
+        now = time.time()
+        try:
+            connection = self._connection()
+            connection.execute(
+                'INSERT OR REPLACE INTO extraction_cache (key, value, created_at, accessed_at) '
+                'VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value), now, now)
+            )
+            connection.execute(
+                'DELETE FROM extraction_cache WHERE created_at <= ?', (now - self.ttl,)
+            )
+            connection.execute(
+                'DELETE FROM extraction_cache WHERE key IN ('
+                'SELECT key FROM extraction_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+        except sqlite3.Error as e:
+            print(f"Extraction cache write error: {e}")
+
+    def clear(self):
+        with self._lock:
+            self.hits = self.misses = 0
+        if self.path and self.path.exists():
+            self._connection().execute('DELETE FROM extraction_cache')
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+
+extraction_cache = ExtractionCache()
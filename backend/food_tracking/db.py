@@ -0,0 +1,107 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import Resolver404, resolve
+
+
+REPLICA_ALIAS = 'replica'
+
+# Pragmas that change the database file; not applied to read-only connections
+WRITER_PRAGMAS = ('journal_mode', 'synchronous')
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def is_read_only(connection):
+    return 'mode=ro' in str(connection.settings_dict['NAME'])
+
+
+def apply_sqlite_pragmas(connection):
+    """
+    Run the SQLITE_PRAGMAS on a new SQLite connection.
+
+    They go to the driver connection directly, so they are not counted as
+    queries of the request that happened to open the connection.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    read_only = is_read_only(connection)
+    for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+        if read_only and name in WRITER_PRAGMAS:
+            continue
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+@contextmanager
+def replica_reads():
+    """
+    Send the reads made in this context to the read replica, if there is one
+    """
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReadReplicaRouter:
+    """
+    Reads go to the replica inside `replica_reads()`; everything else,
+    including all writes and migrations, to "default"
+    """
+
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get():
+            return REPLICA_ALIAS
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class ReadReplicaMiddleware:
+    """
+    Serves GET and HEAD requests to the REPLICA_VIEWS URL names from the
+    read replica. Removed at startup when no replica is configured.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if REPLICA_ALIAS not in settings.DATABASES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def use_replica(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return False
+        return match.url_name in getattr(settings, 'REPLICA_VIEWS', [])
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.use_replica(request):
+            return self.get_response(request)
+        with replica_reads():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if not self.use_replica(request):
+            return await self.get_response(request)
+        with replica_reads():
+            return await self.get_response(request)
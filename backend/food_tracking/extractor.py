@@ -0,0 +1,265 @@
+import re
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+from .caches import normalize_transcript
+from .nutrition import UNIT_GRAMS, piece_grams
+
+
+# Words that say nothing about what was eaten; anything else left unmatched
+# in a transcript may be a food we do not know, which lowers confidence
+FILLER_WORDS = {
+    'i', 'im', 'ive', 'id', 'we', 'me', 'my', 'it', 'its', 'just', 'also', 'then', 'and', 'plus',
+    'with', 'without', 'had', 'have', 'has', 'having', 'ate', 'eat', 'eaten', 'eating', 'drank',
+    'drink', 'drinking', 'finished', 'for', 'as', 'at', 'in', 'on', 'of', 'the', 'a', 'an', 'some',
+    'bit', 'little', 'today', 'this', 'was', 'is', 'got', 'grabbed', 'quick', 'like', 'about',
+    'around', 'approximately', 'roughly', 'to', 'so', 'far', 'um', 'uh', 'okay', 'ok', 'yeah',
+}
+MEAL_WORDS = {
+    'breakfast': 'breakfast', 'morning': 'breakfast', 'brunch': 'breakfast',
+    'lunch': 'lunch', 'noon': 'lunch', 'afternoon': 'lunch',
+    'dinner': 'dinner', 'supper': 'dinner', 'evening': 'dinner', 'tonight': 'dinner',
+    'snack': 'snack', 'snacks': 'snack',
+}
+QUANTITY_WORDS = {
+    'a': 1, 'an': 1, 'one': 1, 'single': 1, 'half': 0.5, 'couple': 2, 'pair': 2,
+    'few': 3, 'several': 3, 'dozen': 12,
+}
+PIECE_UNITS = {'piece', 'pieces', 'serving', 'servings', 'portion', 'portions', 'scoop', 'scoops'}
+UNIT_WORDS = set(UNIT_GRAMS) | PIECE_UNITS
+NUMBER_RE = re.compile(r"^\d+(?:\.\d+)?$")
+NUMBER_UNIT_RE = re.compile(r"^(\d+(?:\.\d+)?)([a-z]+)$")
+
+# Item confidence by how precisely the amount was stated
+EXPLICIT_AMOUNT_CONFIDENCE = 1.0
+COUNT_ONLY_CONFIDENCE = 0.9
+NO_AMOUNT_CONFIDENCE = 0.75
+# A count of a food with no known piece weight ("3 dumplings") is priced at
+# a default serving each, which is a guess; keep it below the threshold
+UNKNOWN_PIECE_CONFIDENCE = 0.7
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton over word sequences.
+
+    Patterns are tuples of words, so matches always fall on word boundaries.
+    Every occurrence in a text is found in a single pass, however many
+    patterns there are.
+    """
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+    def add(self, words, value):
+        state = 0
+        for word in words:
+            next_state = self._goto[state].get(word)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][word] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append((len(words), value))
+
+    def build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and word not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(word, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find(self, words):
+        """
+        Yield (start, end, value) for every pattern occurrence in `words`
+        """
+        state = 0
+        for index, word in enumerate(words):
+            while state and word not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(word, 0)
+            for length, value in self._output[state]:
+                yield index - length + 1, index + 1, value
+
+
+def singular(word):
+    if word.endswith('ies') and len(word) > 4:
+        return f'{word[:-3]}y'
+    if word.endswith('es') and word[:-2].endswith(('ch', 'sh', 'to')):
+        return word[:-2]
+    if word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def name_patterns(name):
+    """
+    Word sequences that should match a food name: the name itself without
+    any parenthetical ("Milk (2%)" -> "milk"), with the last word singular
+    or plural
+    """
+    words = normalize_transcript(re.sub(r'\(.*?\)', ' ', name)).split()
+    if not words:
+        return set()
+    last = words[-1]
+    variants = {last, singular(last), f'{singular(last)}s', f'{singular(last)}es'}
+    return {tuple(words[:-1] + [variant]) for variant in variants}
+
+
+class LocalFoodExtractor:
+    """
+    Extracts foods, amounts and the meal from a transcript without a network
+    call.
+
+    A word-level Aho-Corasick automaton compiled from every FoodItem name
+    (plus singular/plural forms and the last word of multi-word names when
+    that is unambiguous, e.g. "rice" for "Brown Rice") finds the foods. The
+    words just before each food are parsed as an amount ("two slices of",
+    "200 grams", "a cup of"). The automaton is built lazily, dropped by the
+    FoodItem signals and rebuilt after FOOD_SEARCH_INDEX_MAX_AGE seconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._automaton = None
+        self._built_at = None
+
+    def invalidate(self):
+        with self._lock:
+            self._automaton = None
+            self._built_at = None
+
+    def build(self):
+        from .models import FoodItem
+
+        automaton = AhoCorasick()
+        patterns = {}
+        aliases = {}
+        for food_item in FoodItem.objects.values('id', 'name').iterator(chunk_size=2000):
+            for pattern in name_patterns(food_item['name']):
+                patterns.setdefault(pattern, food_item)
+                if len(pattern) > 1:
+                    aliases.setdefault(pattern[-1:], []).append(food_item)
+        for alias, food_items in aliases.items():
+            if alias not in patterns and len({item['id'] for item in food_items}) == 1:
+                patterns[alias] = food_items[0]
+        for pattern, food_item in patterns.items():
+            automaton.add(pattern, food_item)
+        automaton.build()
+        return automaton
+
+    def automaton(self):
+        max_age = getattr(settings, 'FOOD_SEARCH_INDEX_MAX_AGE', 300)
+        with self._lock:
+            if self._automaton is None or (
+                max_age and time.monotonic() - self._built_at > max_age
+            ):
+                self._automaton = self.build()
+                self._built_at = time.monotonic()
+            return self._automaton
+
+    def extract(self, transcription):
+        """
+        Return structured food data in the shape the model produces (meal and
+        items with name, quantity and unit) plus a `confidence` in [0, 1], or
+        None when no known food is mentioned.
+        """
+        words = normalize_transcript(transcription).split()
+        matches = self._select(self.automaton().find(words))
+        if not matches:
+            return None
+
+        explained = set()
+        items = []
+        item_confidences = []
+        for start, end, food_item in matches:
+            quantity, unit, amount_start, confidence = self._parse_amount(words, start, explained)
+            if unit == 'pieces' and piece_grams(food_item['name']) is None:
+                confidence = min(confidence, UNKNOWN_PIECE_CONFIDENCE)
+            explained.update(range(amount_start, end))
+            items.append({'name': food_item['name'], 'quantity': quantity, 'unit': unit})
+            item_confidences.append(confidence)
+
+        meal = 'snack'
+        unexplained = 0
+        for index, word in enumerate(words):
+            if index in explained:
+                continue
+            if word in MEAL_WORDS:
+                meal = MEAL_WORDS[word]
+            elif word not in FILLER_WORDS and word not in UNIT_WORDS and not NUMBER_RE.match(word):
+                unexplained += 1
+
+        # Words we could not account for may be foods we do not know
+        coverage = len(matches) / (len(matches) + unexplained)
+        confidence = sum(item_confidences) / len(item_confidences) * coverage
+        return {'meal': meal, 'items': items, 'confidence': round(confidence, 2)}
+
+    def _select(self, matches):
+        # Leftmost-longest, non-overlapping
+        chosen = []
+        for start, end, food_item in sorted(matches, key=lambda match: (match[0], -match[1])):
+            if chosen and start < chosen[-1][1]:
+                continue
+            chosen.append((start, end, food_item))
+        return chosen
+
+    def _parse_amount(self, words, start, explained):
+        """
+        Parse "<quantity> <unit> of" immediately before words[start].
+        Returns (quantity, unit, index where the amount starts, confidence).
+        """
+        index = start
+        unit = None
+        if index > 0 and words[index - 1] == 'of':
+            index -= 1
+        if index > 0 and words[index - 1] in UNIT_WORDS and index - 1 not in explained:
+            unit = words[index - 1]
+            index -= 1
+
+        quantity = None
+        if index > 0 and index - 1 not in explained:
+            word = words[index - 1]
+            split = NUMBER_UNIT_RE.match(word)
+            if NUMBER_RE.match(word):
+                quantity = float(word)
+            elif split and split.group(2) in UNIT_WORDS and unit is None:
+                quantity, unit = float(split.group(1)), split.group(2)
+            elif word in QUANTITY_WORDS:
+                quantity = QUANTITY_WORDS[word]
+            if quantity is not None:
+                index -= 1
+                previous = words[index - 1] if index > 0 and index - 1 not in explained else None
+                if word in ('a', 'an') and previous == 'half':
+                    # "half a cup of"
+                    quantity = 0.5
+                    index -= 1
+                elif word in ('couple', 'pair', 'few', 'dozen', 'half') and previous == 'a':
+                    # "a couple of"
+                    index -= 1
+
+        if unit in PIECE_UNITS:
+            unit = 'pieces'
+        if quantity is not None and unit is not None:
+            confidence = EXPLICIT_AMOUNT_CONFIDENCE
+        elif quantity is not None or unit is not None:
+            # "3 eggs", "glass of milk"
+            confidence = COUNT_ONLY_CONFIDENCE
+        else:
+            confidence = NO_AMOUNT_CONFIDENCE
+        return quantity if quantity is not None else 1, unit or 'pieces', index, confidence
+
+
+local_food_extractor = LocalFoodExtractor()
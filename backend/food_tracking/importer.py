@@ -0,0 +1,274 @@
+"""
+Streaming import of food catalogs (USDA FoodData Central exports, CSV
+spreadsheets, NDJSON dumps) into FoodItem.
+
+Records are read one at a time through generators and upserted in batches
+of `batch_size` with one bulk INSERT ... ON CONFLICT per batch, each in its
+own transaction, so memory stays flat however large the input is.
+"""
+import csv
+import gzip
+import io
+import json
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.db import reset_queries, transaction
+
+from .extractor import local_food_extractor
+from .models import FoodItem
+from .search import food_search_index, normalize_name
+
+
+NUTRIENT_FIELDS = ['calories_per_100g', 'protein_per_100g', 'carbs_per_100g', 'fat_per_100g']
+
+# Column names accepted for each FoodItem field, after lowercasing and
+# turning spaces and dashes into underscores
+FIELD_ALIASES = {
+    'name': ('name', 'description', 'food_name', 'food'),
+    'calories_per_100g': ('calories_per_100g', 'calories', 'energy_kcal', 'energy_(kcal)', 'kcal', 'energy'),
+    'protein_per_100g': ('protein_per_100g', 'protein', 'protein_g'),
+    'carbs_per_100g': (
+        'carbs_per_100g', 'carbs', 'carbohydrates', 'carbohydrate', 'carbohydrate_by_difference', 'carbs_g'
+    ),
+    'fat_per_100g': ('fat_per_100g', 'fat', 'total_fat', 'total_lipid_(fat)', 'fat_g'),
+}
+
+# FoodData Central nutrient numbers, in order of preference per field
+# (958/957 are the Atwater energies some Foundation foods carry instead of 208)
+FDC_NUTRIENTS = [
+    ('208', 'calories_per_100g'),
+    ('958', 'calories_per_100g'),
+    ('957', 'calories_per_100g'),
+    ('203', 'protein_per_100g'),
+    ('205', 'carbs_per_100g'),
+    ('204', 'fat_per_100g'),
+]
+
+MAX_NUTRIENT = Decimal('999999.99')
+CENT = Decimal('0.01')
+
+FORMATS = ('csv', 'json', 'ndjson')
+
+
+def detect_format(path):
+    name = path.lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    if name.endswith('.json'):
+        return 'json'
+    raise ValueError(f'Cannot tell the format of {path}; pass it explicitly ({", ".join(FORMATS)})')
+
+
+def open_catalog(path):
+    """
+    Open `path` as text; "-" is stdin and *.gz files are decompressed on the fly
+    """
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig')
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8-sig', newline='')
+    return open(path, encoding='utf-8-sig', newline='')
+
+
+def read_csv(stream):
+    yield from csv.DictReader(stream)
+
+
+def read_ndjson(stream):
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def read_json(stream, chunk_size=64 * 1024):
+    """
+    Yield the objects of the first JSON array in `stream` without loading
+    the whole document, e.g. the foods of a FoodData Central export
+    ({"FoundationFoods": [...]}) or a plain top-level array
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    in_array = False
+    while True:
+        chunk = stream.read(chunk_size)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            if not in_array:
+                start = buffer.find('[', position)
+                if start < 0:
+                    position = len(buffer)
+                    break
+                in_array = True
+                position = start + 1
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position == len(buffer):
+                break
+            if buffer[position] == ']':
+                return
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                # The object continues in the next chunk
+                break
+            position = end
+            yield record
+        if not chunk:
+            return
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+    'ndjson': read_ndjson,
+}
+
+
+def read_catalog(path, format=None):
+    """
+    Yield the raw records of the catalog file at `path`
+    """
+    format = format or detect_format(path)
+    with open_catalog(path) as stream:
+        yield from READERS[format](stream)
+
+
+def field_key(key):
+    return str(key).strip().lower().replace(' ', '_').replace('-', '_')
+
+
+def to_nutrient(value):
+    if value is None or value == '':
+        return None
+    amount = Decimal(str(value).strip()).quantize(CENT)
+    if not amount.is_finite() or amount < 0 or amount > MAX_NUTRIENT:
+        raise ValueError(f'Nutrient value {value} out of range')
+    return amount
+
+
+def parse_record(record):
+    """
+    The FoodItem fields of one raw record, or None if it has no usable
+    name or calories. Flat records are matched through FIELD_ALIASES and
+    FoodData Central records through their foodNutrients list.
+    """
+    if not isinstance(record, dict):
+        return None
+    values = {field_key(key): value for key, value in record.items()}
+    fields = {}
+    for field, aliases in FIELD_ALIASES.items():
+        for alias in aliases:
+            if values.get(alias) not in (None, ''):
+                fields[field] = values[alias]
+                break
+
+    nutrients = {}
+    for nutrient in values.get('foodnutrients') or ():
+        number = str((nutrient.get('nutrient') or {}).get('number') or nutrient.get('number') or '')
+        nutrients[number] = nutrient.get('amount', nutrient.get('value'))
+    for number, field in FDC_NUTRIENTS:
+        if field not in fields and nutrients.get(number) is not None:
+            fields[field] = nutrients[number]
+
+    name = ' '.join(str(fields.get('name') or '').split())
+    if not name or len(name) > 255:
+        return None
+    try:
+        parsed = {field: to_nutrient(fields.get(field)) for field in NUTRIENT_FIELDS}
+    except (InvalidOperation, ValueError):
+        return None
+    if parsed['calories_per_100g'] is None:
+        return None
+    for field in NUTRIENT_FIELDS:
+        if parsed[field] is None:
+            parsed[field] = Decimal('0.00')
+    return {'name': name, **parsed}
+
+
+class ImportStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.read = 0
+        self.invalid = 0
+        self.duplicates = 0
+        self.written = 0
+        self.created = 0
+        self.batches = 0
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self):
+        elapsed = self.elapsed
+        return self.read / elapsed if elapsed else 0.0
+
+
+def write_batch(batch, update):
+    with transaction.atomic():
+        if update:
+            FoodItem.objects.bulk_create(
+                batch,
+                update_conflicts=True,
+                unique_fields=['normalized_name'],
+                update_fields=['name', *NUTRIENT_FIELDS],
+            )
+        else:
+            FoodItem.objects.bulk_create(batch, ignore_conflicts=True)
+    # With DEBUG on, Django keeps the SQL of recent queries, each a whole batch here
+    reset_queries()
+
+
+def import_food_items(records, batch_size=1000, update=True, progress=None):
+    """
+    Upsert FoodItems from an iterable of raw records and return ImportStats.
+
+    Records are keyed on the normalized name: a later record for a name
+    already in the database overwrites its nutrients (or, without `update`,
+    is skipped), and only the last of several records for one name inside a
+    batch is written. `progress(stats)` is called after every batch.
+    """
+    stats = ImportStats()
+    count_before = FoodItem.objects.count()
+    batch = {}
+    for record in records:
+        stats.read += 1
+        fields = parse_record(record)
+        if fields is None:
+            stats.invalid += 1
+            continue
+        normalized_name = normalize_name(fields['name'])
+        if normalized_name in batch:
+            stats.duplicates += 1
+        batch[normalized_name] = FoodItem(normalized_name=normalized_name, **fields)
+        if len(batch) >= batch_size:
+            write_batch(list(batch.values()), update)
+            stats.written += len(batch)
+            stats.batches += 1
+            batch = {}
+            if progress:
+                progress(stats)
+    if batch:
+        write_batch(list(batch.values()), update)
+        stats.written += len(batch)
+        stats.batches += 1
+        if progress:
+            progress(stats)
+
+    stats.created = FoodItem.objects.count() - count_before
+    # bulk_create sends no signals, so drop the indexes built from the old catalog
+    food_search_index.invalidate()
+    local_food_extractor.invalidate()
+    return stats
@@ -0,0 +1,221 @@
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+
+logger = logging.getLogger('food_tracking.requests')
+
+# Every RequestMetrics collecting in the current context, innermost last
+_active = ContextVar('request_metrics', default=())
+
+IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def query_shape(sql):
+    """
+    The SQL with literals and IN lists collapsed, so the same query run for
+    different rows has the same shape
+    """
+    return LITERAL_RE.sub('?', IN_LIST_RE.sub('IN (...)', sql))
+
+
+class RequestMetrics:
+    """
+    Database and external call timings collected while it is active.
+
+    Queries are recorded by `record_query`, installed as an execute wrapper
+    on every database connection; external calls (Whisper, ChatGPT) by the
+    `external_call` context manager. Both cost one context variable lookup
+    when nothing is collecting.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements = Counter()
+        self.external = {}
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def add_external(self, name, seconds):
+        calls, total = self.external.get(name, (0, 0.0))
+        self.external[name] = (calls + 1, total + seconds)
+
+    def repeated_queries(self, threshold=None):
+        """
+        Query shapes run at least `threshold` times (N_PLUS_ONE_THRESHOLD by
+        default), as (shape, count) pairs, most repeated first
+        """
+        if threshold is None:
+            threshold = getattr(settings, 'N_PLUS_ONE_THRESHOLD', 5)
+        shapes = Counter()
+        for sql, count in self.statements.items():
+            shapes[query_shape(sql)] += count
+        return [(shape, count) for shape, count in shapes.most_common() if count >= threshold]
+
+    def server_timing(self):
+        """
+        Value of the Server-Timing header: database, each external upstream,
+        the rest of the app and the total, in milliseconds
+        """
+        elapsed = self.elapsed
+        external_seconds = sum(total for _, total in self.external.values())
+        entries = [f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries"']
+        for name, (calls, total) in sorted(self.external.items()):
+            entries.append(f'{name};dur={total * 1000:.1f};desc="{calls} calls"')
+        app_seconds = max(0.0, elapsed - self.db_seconds - external_seconds)
+        entries.append(f'app;dur={app_seconds * 1000:.1f}')
+        entries.append(f'total;dur={elapsed * 1000:.1f}')
+        return ', '.join(entries)
+
+    def as_dict(self):
+        return {
+            'duration_ms': round(self.elapsed * 1000, 1),
+            'db_queries': self.queries,
+            'db_ms': round(self.db_seconds * 1000, 1),
+            'external': {
+                name: {'calls': calls, 'ms': round(total * 1000, 1)}
+                for name, (calls, total) in sorted(self.external.items())
+            },
+            'n_plus_one': [
+                {'sql': shape[:300], 'count': count} for shape, count in self.repeated_queries()
+            ],
+        }
+
+
+@contextmanager
+def collect_metrics(metrics=None):
+    """
+    Collect queries and external calls made in this context into `metrics`
+    (a new RequestMetrics by default), which is yielded
+    """
+    metrics = metrics or RequestMetrics()
+    token = _active.set(_active.get() + (metrics,))
+    try:
+        yield metrics
+    finally:
+        _active.reset(token)
+
+
+def record_query(execute, sql, params, many, context):
+    collectors = _active.get()
+    if not collectors:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        for metrics in collectors:
+            metrics.queries += 1
+            metrics.db_seconds += duration
+            metrics.statements[sql] += 1
+
+
+def instrument_connection(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def external_call(name):
+    """
+    Time a call to an external service (e.g. 'whisper', 'gpt') for the
+    active collectors
+    """
+    collectors = _active.get()
+    if not collectors:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - started
+        for metrics in collectors:
+            metrics.add_external(name, duration)
+
+
+class RequestTimingMiddleware:
+    """
+    Records the database queries, database time and external call time of
+    every request.
+
+    They are sent back as a Server-Timing header, logged as one JSON line on
+    the `food_tracking.requests` logger, and kept on the response as
+    `response.metrics`. Query shapes repeated N_PLUS_ONE_THRESHOLD times or
+    more are logged as N+1 suspects. For streaming responses only the work
+    done before the body starts is counted.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not getattr(settings, 'REQUEST_TIMING_ENABLED', True):
+            return self.get_response(request)
+        with collect_metrics() as metrics:
+            response = self.get_response(request)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        if not getattr(settings, 'REQUEST_TIMING_ENABLED', True):
+            return await self.get_response(request)
+        with collect_metrics() as metrics:
+            response = await self.get_response(request)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        response['Server-Timing'] = metrics.server_timing()
+        response.metrics = metrics
+        data = metrics.as_dict()
+        record = {'method': request.method, 'path': request.path, 'status': response.status_code, **data}
+        if data['n_plus_one']:
+            logger.warning(json.dumps(record))
+        else:
+            logger.info(json.dumps(record))
+        return response
+
+
+@contextmanager
+def query_budget(max_queries=None, max_db_ms=None, allow_repeated=False):
+    """
+    Fail a test when the code run inside makes more than `max_queries`
+    queries, spends more than `max_db_ms` in the database or, unless
+    `allow_repeated`, repeats a query shape N_PLUS_ONE_THRESHOLD times.
+
+        with query_budget(max_queries=3):
+            self.client.get('/api/summary/')
+    """
+    with collect_metrics() as metrics:
+        yield metrics
+    problems = []
+    if max_queries is not None and metrics.queries > max_queries:
+        problems.append(f'{metrics.queries} queries, budget {max_queries}')
+    if max_db_ms is not None and metrics.db_seconds * 1000 > max_db_ms:
+        problems.append(f'{metrics.db_seconds * 1000:.1f} ms in the database, budget {max_db_ms} ms')
+    if not allow_repeated:
+        for shape, count in metrics.repeated_queries():
+            problems.append(f'possible N+1, run {count} times: {shape}')
+    if problems:
+        statements = '\n'.join(
+            f'  {count}x {sql}' for sql, count in metrics.statements.most_common()
+        )
+        raise AssertionError('Query budget exceeded:\n' + '\n'.join(problems) + '\nQueries:\n' + statements)
@@ -0,0 +1,178 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+
+class QueueFull(Exception):
+    pass
+
+
+def audio_job_storage_dir():
+    path = Path(getattr(settings, 'AUDIO_JOB_STORAGE_DIR', settings.BASE_DIR / 'audio_jobs'))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def store_audio_upload(audio_file):
+    """
+    Write an uploaded file to the job storage directory and return its path
+    """
+    suffix = Path(audio_file.name or '').suffix or '.m4a'
+    path = audio_job_storage_dir() / f'{uuid.uuid4().hex}{suffix}'
+    with open(path, 'wb') as stored:
+        for chunk in audio_file.chunks():
+            stored.write(chunk)
+    return str(path)
+
+
+def run_audio_job(job_id):
+    """
+    Run the Whisper + ChatGPT pipeline for one stored AudioJob
+    """
+    from .models import AudioJob
+    from .views import build_audio_response, extract_food_data, transcribe_audio_whisper
+
+    close_old_connections()
+    try:
+        # Claim the job atomically so that only one worker process runs it;
+        # a job stuck in processing is only taken over once it looks abandoned
+        stale_after = getattr(settings, 'AUDIO_JOB_STALE_AFTER', 600)
+        now = timezone.now()
+        claimed = AudioJob.objects.filter(pk=job_id).filter(
+            Q(status=AudioJob.STATUS_QUEUED)
+            | Q(status=AudioJob.STATUS_PROCESSING, started_at__lt=now - timedelta(seconds=stale_after))
+        ).update(status=AudioJob.STATUS_PROCESSING, started_at=now)
+        if not claimed:
+            return
+        job = AudioJob.objects.get(pk=job_id)
+        try:
+            transcription = transcribe_audio_whisper(job.audio_path)
+            structured_data = extract_food_data(transcription)
+            job.result = build_audio_response(transcription, structured_data)
+            job.status = AudioJob.STATUS_COMPLETED
+        except Exception as e:
+            job.error = f'Audio processing failed: {str(e)}'
+            job.status = AudioJob.STATUS_FAILED
+        job.finished_at = timezone.now()
+        job.save(update_fields=['result', 'error', 'status', 'finished_at'])
+
+        if os.path.exists(job.audio_path):
+            os.unlink(job.audio_path)
+    finally:
+        close_old_connections()
+
+
+class AudioJobQueue:
+    """
+    Bounded in-process worker pool for AudioJobs.
+
+    Job state lives in the AudioJob table and the audio on local disk, so no
+    broker is needed. Once started, the pool sweeps the table every
+    AUDIO_JOB_SWEEP_INTERVAL seconds and re-submits jobs queued for longer
+    than that interval or stuck in processing for AUDIO_JOB_STALE_AFTER
+    seconds, e.g. by a worker that died before or during the job.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+        self._pending = set()
+
+    def start(self):
+        """
+        Start the pool and its sweeper if they are not running yet. The
+        server entry points call this so interrupted jobs are recovered
+        without waiting for the next upload.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._start()
+
+    def _start(self):
+        workers = getattr(settings, 'AUDIO_JOB_WORKERS', 4)
+        max_pending = getattr(settings, 'AUDIO_JOB_MAX_PENDING', 100)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='audio-job')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        threading.Thread(target=self._sweep_forever, name='audio-job-sweeper', daemon=True).start()
+
+    def _sweep_forever(self):
+        interval = getattr(settings, 'AUDIO_JOB_SWEEP_INTERVAL', 60)
+        while True:
+            try:
+                self.recover()
+            except Exception as e:
+                print(f"Audio job sweep error: {e}")
+            finally:
+                close_old_connections()
+            time.sleep(interval)
+
+    def recover(self):
+        """
+        Submit the queued and abandoned processing jobs that are not already
+        waiting on this pool, as far as pending slots allow. Returns how many
+        were submitted.
+        """
+        from .models import AudioJob
+
+        now = timezone.now()
+        stale_after = getattr(settings, 'AUDIO_JOB_STALE_AFTER', 600)
+        # A queued job younger than one sweep interval is most likely waiting
+        # on the pool of the worker that accepted it
+        grace = getattr(settings, 'AUDIO_JOB_SWEEP_INTERVAL', 60)
+        pending = AudioJob.objects.filter(
+            Q(status=AudioJob.STATUS_QUEUED, created_at__lt=now - timedelta(seconds=grace))
+            | Q(status=AudioJob.STATUS_PROCESSING, started_at__lt=now - timedelta(seconds=stale_after))
+        ).order_by('created_at').values_list('pk', flat=True)
+        submitted = 0
+        for job_id in pending:
+            with self._lock:
+                if job_id in self._pending:
+                    continue
+            if not self._slots.acquire(blocking=False):
+                break
+            self.submit(job_id)
+            submitted += 1
+        return submitted
+
+    def reserve(self):
+        """
+        Reserve a pending slot, raising QueueFull when none is left. Call
+        before storing a job so a full queue is rejected up front.
+        """
+        self.start()
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull('Too many audio jobs are pending')
+
+    def release(self):
+        self._slots.release()
+
+    def submit(self, job_id):
+        """
+        Run a job on the pool using a slot taken with reserve()
+        """
+        with self._lock:
+            self._pending.add(job_id)
+        self._executor.submit(self._run, job_id)
+
+    def _run(self, job_id):
+        try:
+            run_audio_job(job_id)
+        except Exception as e:
+            print(f"Audio job {job_id} error: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(job_id)
+            self._slots.release()
+
+
+audio_job_queue = AudioJobQueue()
@@ -0,0 +1,88 @@
+import io
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from pydub import AudioSegment
+from pydub.generators import Sine, WhiteNoise
+
+from food_tracking.audio import preprocess_audio
+
+
+AUDIO_EXTENSIONS = ('.wav', '.m4a', '.mp3', '.ogg', '.webm', '.flac', '.aac')
+
+
+def synthetic_clip(seconds, silence_ms=1500):
+    """
+    A stereo 44.1 kHz wav shaped like a phone recording: a voice-band tone
+    over light noise, with silence before and after
+    """
+    voice = Sine(220, sample_rate=44100).to_audio_segment(duration=seconds * 1000, volume=-12)
+    voice = voice.overlay(WhiteNoise(sample_rate=44100).to_audio_segment(duration=seconds * 1000, volume=-30))
+    silence = AudioSegment.silent(duration=silence_ms, frame_rate=44100)
+    clip = (silence + voice + silence).set_channels(2).set_sample_width(2)
+    output = io.BytesIO()
+    clip.export(output, format='wav')
+    return output.getvalue()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the Whisper audio preprocessing stage against local clips'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*',
+            help='Audio files or directories of clips (default: generated 3s/10s/30s clips)',
+        )
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per clip; the best time is reported')
+        parser.add_argument('--format', help='Output format, overriding AUDIO_PREPROCESS_FORMAT')
+
+    def clips(self, paths):
+        if not paths:
+            for seconds in (3, 10, 30):
+                yield f'synthetic-{seconds}s.wav', synthetic_clip(seconds)
+            return
+        for raw_path in paths:
+            path = Path(raw_path)
+            if not path.exists():
+                raise CommandError(f'{path} does not exist')
+            files = sorted(path.iterdir()) if path.is_dir() else [path]
+            for file in files:
+                if file.suffix.lower() in AUDIO_EXTENSIONS:
+                    yield file.name, file.read_bytes()
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"clip":<28} {"in_kb":>8} {"out_kb":>8} {"ratio":>6} '
+            f'{"in_s":>6} {"out_s":>6} {"fmt":>5} {"ms":>8}'
+        )
+        total_in = total_out = 0
+        for name, data in self.clips(options['paths']):
+            best = None
+            for _ in range(max(1, options['repeat'])):
+                started = time.perf_counter()
+                try:
+                    processed = preprocess_audio(data, name, format=options['format'])
+                except Exception as e:
+                    self.stdout.write(self.style.WARNING(f'{name:<28} could not be processed: {e}'))
+                    break
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            if best is None:
+                continue
+
+            total_in += processed.original_bytes
+            total_out += len(processed.data)
+            self.stdout.write(
+                f'{name[:28]:<28} {processed.original_bytes / 1024:>8.1f} '
+                f'{len(processed.data) / 1024:>8.1f} '
+                f'{len(processed.data) / processed.original_bytes:>6.2f} '
+                f'{processed.original_duration_ms / 1000:>6.1f} {processed.duration_ms / 1000:>6.1f} '
+                f'{processed.format:>5} {best * 1000:>8.1f}'
+            )
+
+        if total_in:
+            self.stdout.write(self.style.SUCCESS(
+                f'Uploaded bytes reduced by {(1 - total_out / total_in) * 100:.1f}% '
+                f'({total_in / 1024:.1f} KB -> {total_out / 1024:.1f} KB)'
+            ))
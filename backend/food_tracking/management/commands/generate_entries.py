@@ -0,0 +1,109 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from food_tracking.importer import import_food_items
+from food_tracking.models import CalorieEntry, DailySummary
+from food_tracking.rollups import rebuild_daily_summaries
+from food_tracking.synthetic import (
+    ENGINES, MEAL_MIX, EntryGenerator, generate_entries, load_foods, parse_meal_mix, synthetic_food_records
+)
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic calorie entries for load and scaling tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365, help='Number of days to fill')
+        parser.add_argument('--end', help='Last day to fill (YYYY-MM-DD, default: today)')
+        parser.add_argument('--entries-per-day', type=float, default=20, help='Mean entries per day (Poisson)')
+        parser.add_argument('--entries', type=int, help='Approximate total entries; sets --entries-per-day')
+        parser.add_argument(
+            '--meal-mix',
+            default=','.join(f'{meal_type}={round(weight * 100)}' for meal_type, weight in MEAL_MIX.items()),
+            help='Relative weight of each meal type (default: %(default)s)',
+        )
+        parser.add_argument('--portion-median', type=float, default=150, help='Median portion in grams')
+        parser.add_argument('--portion-spread', type=float, default=0.6, help='Log-normal sigma of portions')
+        parser.add_argument('--portion-min', type=int, default=5)
+        parser.add_argument('--portion-max', type=int, default=1000)
+        parser.add_argument(
+            '--food-skew', type=float, default=1.0,
+            help='Zipf exponent of food popularity; 0 picks every food equally often',
+        )
+        parser.add_argument('--foods', type=int, default=0, help='Create this many synthetic food items first')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows per INSERT and transaction')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--engine', choices=ENGINES, help='Default: numpy when installed')
+        parser.add_argument('--clear', action='store_true', help='Delete all calorie entries and summaries first')
+        parser.add_argument('--skip-rollup', action='store_true', help='Do not rebuild the daily summaries')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--days and --batch-size must be at least 1')
+        try:
+            meal_mix = parse_meal_mix(options['meal_mix'])
+            last_day = date.fromisoformat(options['end']) if options['end'] else timezone.localdate()
+        except ValueError as e:
+            raise CommandError(str(e))
+        entries_per_day = options['entries_per_day']
+        if options['entries'] is not None:
+            entries_per_day = options['entries'] / options['days']
+
+        if options['clear']:
+            # Raw deletes: loading millions of rows for the delete signals would take longer than generating them
+            with connection.cursor() as cursor:
+                for model in (CalorieEntry, DailySummary):
+                    cursor.execute(f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)}')
+        if options['foods']:
+            stats = import_food_items(
+                synthetic_food_records(options['foods'], seed=options['seed']), batch_size=5000, update=False
+            )
+            self.stdout.write(f'{stats.created} synthetic food items created')
+
+        foods = load_foods()
+        if not foods:
+            raise CommandError('There are no food items; pass --foods or import a catalog first')
+        try:
+            generator = EntryGenerator(
+                foods,
+                last_day=last_day,
+                days=options['days'],
+                entries_per_day=entries_per_day,
+                meal_mix=meal_mix,
+                portion_median=options['portion_median'],
+                portion_spread=options['portion_spread'],
+                portion_min=options['portion_min'],
+                portion_max=options['portion_max'],
+                food_skew=options['food_skew'],
+                seed=options['seed'],
+                engine=options['engine'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        started = time.perf_counter()
+        last_report = [started]
+
+        def report_progress(written):
+            now = time.perf_counter()
+            if now - last_report[0] >= 5:
+                last_report[0] = now
+                self.stderr.write(f'{written:,} entries, {written / (now - started):,.0f} rows/s')
+
+        written = generate_entries(generator, batch_size=options['batch_size'], progress=report_progress)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{written:,} entries from {generator.first_day} to {last_day} in {elapsed:.1f}s '
+            f'({written / elapsed if elapsed else 0:,.0f} rows/s, {generator.engine} engine)'
+        ))
+
+        if not options['skip_rollup']:
+            started = time.perf_counter()
+            count = rebuild_daily_summaries(start=generator.first_day, end=last_day)
+            self.stdout.write(self.style.SUCCESS(
+                f'Rebuilt {count} daily summary rows in {time.perf_counter() - started:.1f}s'
+            ))
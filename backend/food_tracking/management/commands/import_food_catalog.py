@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from food_tracking.importer import FORMATS, import_food_items, read_catalog
+
+
+class Command(BaseCommand):
+    help = 'Stream food items from CSV, JSON or NDJSON catalogs (e.g. USDA FoodData Central) into the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Catalog files; "-" reads stdin, *.gz is decompressed')
+        parser.add_argument('--format', choices=FORMATS, help='Input format (default: from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per INSERT and transaction')
+        parser.add_argument(
+            '--no-update',
+            action='store_true',
+            help='Keep the nutrients of food items that already exist instead of overwriting them',
+        )
+        parser.add_argument('--quiet', action='store_true', help='Only print the final summary')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        for path in options['paths']:
+            if path == '-' and not options['format']:
+                raise CommandError('--format is required when reading stdin')
+            try:
+                stats = import_food_items(
+                    read_catalog(path, options['format']),
+                    batch_size=options['batch_size'],
+                    update=not options['no_update'],
+                    progress=None if options['quiet'] else self.report_progress,
+                )
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Could not import {path}: {e}')
+
+            kept = 'updated' if not options['no_update'] else 'already existed'
+            self.stdout.write(self.style.SUCCESS(
+                f'{path}: {stats.read} rows in {stats.elapsed:.1f}s ({stats.rate:,.0f} rows/s); '
+                f'{stats.created} created, {stats.written - stats.created} {kept}, '
+                f'{stats.duplicates} duplicates, {stats.invalid} invalid'
+            ))
+
+    def report_progress(self, stats):
+        if stats.batches % 10 == 0:
+            self.stderr.write(f'{stats.read} rows, {stats.rate:,.0f} rows/s')
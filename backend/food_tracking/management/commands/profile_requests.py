@@ -0,0 +1,68 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from food_tracking.profiling import PROFILERS
+
+
+class Command(BaseCommand):
+    help = 'Profile API requests in-process and write collapsed stacks or pstats output'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Request paths, e.g. /api/summary/?date=2025-01-01')
+        parser.add_argument('--repeat', type=int, default=50, help='Requests per path')
+        parser.add_argument('--mode', choices=sorted(PROFILERS), default='sample')
+        parser.add_argument('--interval', type=float, default=1, help='Sampling interval in ms (sample mode)')
+        parser.add_argument('--method', default='GET', help='HTTP method, e.g. POST to profile entry creation')
+        parser.add_argument('--data', help='JSON request body for POST/PUT/PATCH')
+        parser.add_argument('--host', default='localhost', help='Host header; must be in ALLOWED_HOSTS')
+        parser.add_argument('--limit', type=int, help='Only write the heaviest stacks/functions')
+        parser.add_argument(
+            '--output',
+            help='File to write to (default: stdout); in cprofile mode a .prof file gets binary pstats',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            data = json.loads(options['data']) if options['data'] else None
+        except json.JSONDecodeError as e:
+            raise CommandError(f'--data is not valid JSON: {e}')
+
+        profiler = PROFILERS[options['mode']](
+            **({'interval': options['interval'] / 1000} if options['mode'] == 'sample' else {})
+        )
+        client = Client(HTTP_HOST=options['host'])
+        send = getattr(client, options['method'].lower(), None)
+        if send is None:
+            raise CommandError(f'Unsupported method {options["method"]}')
+
+        started = time.perf_counter()
+        statuses = {}
+        for path in options['paths']:
+            for _ in range(options['repeat']):
+                with profiler.profile():
+                    if data is None:
+                        response = send(path)
+                    else:
+                        response = send(path, data, content_type='application/json')
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        elapsed = time.perf_counter() - started
+
+        output = options['output']
+        if options['mode'] == 'cprofile' and output and output.endswith('.prof'):
+            profiler.dump(output)
+        else:
+            report = profiler.report(limit=options['limit'])
+            if output:
+                with open(output, 'w') as report_file:
+                    report_file.write(report)
+            else:
+                self.stdout.write(report, ending='')
+
+        samples = f', {profiler.samples} samples' if options['mode'] == 'sample' else ''
+        self.stderr.write(
+            f'{profiler.profiles} requests in {elapsed:.2f}s{samples}; statuses {statuses}'
+            + (f'; written to {output}' if output else '')
+        )
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from food_tracking.rollups import rebuild_daily_summaries, verify_daily_summaries
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or verify the DailySummary rollup from raw calorie entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First day to process (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last day to process (YYYY-MM-DD)')
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only compare the rollup with the entries and report mismatches',
+        )
+
+    def handle(self, *args, **options):
+        start = options['start']
+        end = options['end']
+
+        if options['verify']:
+            mismatches = verify_daily_summaries(start=start, end=end)
+            for day, meal_type, stored, expected in mismatches:
+                self.stdout.write(
+                    self.style.WARNING(f'{day} {meal_type}: stored={stored} expected={expected}')
+                )
+            if mismatches:
+                raise CommandError(f'{len(mismatches)} daily summary rows are out of date')
+            self.stdout.write(self.style.SUCCESS('Daily summaries match calorie entries'))
+            return
+
+        count = rebuild_daily_summaries(start=start, end=end)
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully rebuilt {count} daily summary rows!')
+        )
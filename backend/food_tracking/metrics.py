@@ -0,0 +1,388 @@
+import glob
+import hmac
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+HEADER = struct.Struct('<I4x')
+KEY_LENGTH = struct.Struct('<I')
+VALUE = struct.Struct('<d')
+
+
+class MmapValues:
+    """
+    Append-only map of string keys to float64 values in a memory-mapped
+    file written by a single process.
+
+    Each entry is the key length, the UTF-8 key padded to 8 bytes and the
+    value. The header holds the number of bytes in use and is only advanced
+    once an entry is complete, so other processes can read the file at any
+    time. Updating a value is a plain memory write.
+    """
+
+    def __init__(self, path, initial_size=64 * 1024):
+        self.path = path
+        self._file = open(path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size < HEADER.size:
+            self._file.truncate(initial_size)
+        self._map = mmap.mmap(self._file.fileno(), os.fstat(self._file.fileno()).st_size)
+        self._used = HEADER.unpack_from(self._map, 0)[0] or HEADER.size
+        self._positions = {}
+        for key, value, position in self._entries(self._map, self._used):
+            self._positions[key] = position
+
+    @staticmethod
+    def _entries(buffer, used):
+        position = HEADER.size
+        while position < used:
+            length = KEY_LENGTH.unpack_from(buffer, position)[0]
+            key = bytes(buffer[position + KEY_LENGTH.size:position + KEY_LENGTH.size + length]).decode()
+            position += KEY_LENGTH.size + length
+            position += -position % 8
+            yield key, VALUE.unpack_from(buffer, position)[0], position
+            position += VALUE.size
+
+    def items(self):
+        for key, position in self._positions.items():
+            yield key, VALUE.unpack_from(self._map, position)[0]
+
+    def set(self, key, value):
+        position = self._positions.get(key)
+        if position is None:
+            position = self._append(key)
+        VALUE.pack_into(self._map, position, value)
+
+    def _append(self, key):
+        encoded = key.encode()
+        value_position = self._used + KEY_LENGTH.size + len(encoded)
+        value_position += -value_position % 8
+        end = value_position + VALUE.size
+        if end > len(self._map):
+            size = len(self._map)
+            while size < end:
+                size *= 2
+            self._map.close()
+            self._file.truncate(size)
+            self._map = mmap.mmap(self._file.fileno(), size)
+        KEY_LENGTH.pack_into(self._map, self._used, len(encoded))
+        self._map[self._used + KEY_LENGTH.size:self._used + KEY_LENGTH.size + len(encoded)] = encoded
+        VALUE.pack_into(self._map, value_position, 0.0)
+        self._used = end
+        HEADER.pack_into(self._map, 0, self._used)
+        self._positions[key] = value_position
+        return value_position
+
+    @classmethod
+    def read(cls, path):
+        """
+        Yield (key, value) for every entry of a file written by any process
+        """
+        with open(path, 'rb') as values_file:
+            data = values_file.read()
+        if len(data) < HEADER.size:
+            return
+        for key, value, _ in cls._entries(data, min(HEADER.unpack_from(data, 0)[0], len(data))):
+            yield key, value
+
+
+class Metric:
+    type = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _labels(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} takes labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.registry.add(self.name, self._labels(labels), '', amount)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        labels = self._labels(labels)
+        for bound in self.buckets:
+            if value <= bound:
+                self.registry.add(self.name, labels, bound, 1)
+                break
+        self.registry.add(self.name, labels, 'sum', value)
+
+    def time(self, **labels):
+        return Timer(self, labels)
+
+
+class Timer:
+    """
+    Context manager observing the seconds spent in its block
+    """
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def format_labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms shared by every worker process.
+
+    Each process keeps its values in memory and, when METRICS_DIR is set,
+    mirrors them into its own memory-mapped file there (see MmapValues).
+    The Prometheus exposition sums the files of every process that has
+    written to the directory, so it is the same whichever worker serves
+    it. Files of exited workers are kept so counters never go backwards;
+    clear() empties the directory when the server starts.
+    """
+
+    def __init__(self, directory=None):
+        self._directory = directory
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._values = {}
+        self._store = None
+        self._store_pid = None
+
+    @property
+    def directory(self):
+        if self._directory is not None:
+            return self._directory
+        return getattr(settings, 'METRICS_DIR', '')
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'Metric {metric.name} is already registered')
+            self._metrics[metric.name] = metric
+        return metric
+
+    def _get_store(self):
+        # Called with the lock held; each process, including forked workers, gets its own file
+        if self._store_pid != os.getpid():
+            self._values = {}
+            self._store = None
+            self._store_pid = os.getpid()
+            directory = self.directory
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+                self._store = MmapValues(os.path.join(directory, f'{os.getpid()}.db'))
+                # A file left by an earlier process with the same pid is continued
+                self._values = dict(self._store.items())
+        return self._store
+
+    def add(self, name, labels, suffix, amount):
+        key = json.dumps([name, labels, suffix if suffix != math.inf else '+Inf'])
+        with self._lock:
+            store = self._get_store()
+            value = self._values.get(key, 0.0) + amount
+            self._values[key] = value
+            if store is not None:
+                store.set(key, value)
+
+    def reset(self):
+        """
+        Forget this process's values (for tests); other processes' files stay
+        """
+        with self._lock:
+            if self._store is not None:
+                os.unlink(self._store.path)
+            self._store = None
+            self._store_pid = None
+            self._values = {}
+
+    def clear(self):
+        """
+        Forget this process's values and delete every process's file. Call
+        in the server's master process before the workers start, so values
+        of an earlier run are not added to the new one.
+        """
+        with self._lock:
+            self._store = None
+            self._store_pid = None
+            self._values = {}
+            directory = self.directory
+        if not directory:
+            return
+        for path in glob.glob(os.path.join(directory, '*.db')):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def collect(self):
+        """
+        Return {key: value} summed over every process
+        """
+        with self._lock:
+            self._get_store()
+            directory = self.directory
+            if not directory:
+                return dict(self._values)
+        totals = defaultdict(float)
+        for path in glob.glob(os.path.join(directory, '*.db')):
+            try:
+                for key, value in MmapValues.read(path):
+                    totals[key] += value
+            except (OSError, ValueError, struct.error) as e:
+                print(f"Metrics read error ({path}): {e}")
+        return totals
+
+    def value(self, name, suffix='', **labels):
+        metric = self._metrics[name]
+        key = json.dumps([name, list(metric._labels(labels)), suffix])
+        return self.collect().get(key, 0.0)
+
+    def exposition(self):
+        """
+        All metrics in the Prometheus text format
+        """
+        samples = defaultdict(dict)
+        for key, value in self.collect().items():
+            name, labels, suffix = json.loads(key)
+            samples[name][(tuple(labels), suffix)] = value
+
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.type}')
+            values = samples.get(name, {})
+            if metric.type == 'counter':
+                for (labels, _), value in sorted(values.items()):
+                    pairs = list(zip(metric.labelnames, labels))
+                    lines.append(f'{name}_total{format_labels(pairs)} {format_value(value)}')
+                continue
+            for labels in sorted({labels for labels, _ in values}):
+                pairs = list(zip(metric.labelnames, labels))
+                cumulative = 0.0
+                for bound in metric.buckets:
+                    cumulative += values.get((labels, format_value(bound) if bound == math.inf else bound), 0.0)
+                    lines.append(
+                        f'{name}_bucket{format_labels(pairs + [("le", format_value(bound))])} {format_value(cumulative)}'
+                    )
+                lines.append(f'{name}_sum{format_labels(pairs)} {format_value(values.get((labels, "sum"), 0.0))}')
+                lines.append(f'{name}_count{format_labels(pairs)} {format_value(cumulative)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+REQUEST_LATENCY = registry.histogram(
+    'http_request_duration_seconds', 'Time to produce a response, by view', ['view', 'method']
+)
+REQUESTS = registry.counter('http_requests', 'Requests served, by view and status', ['view', 'method', 'status'])
+REQUEST_ERRORS = registry.counter('http_request_errors', 'Requests answered with a 5xx status', ['view'])
+OPENAI_LATENCY = registry.histogram(
+    'openai_request_duration_seconds', 'Duration of each OpenAI API attempt', ['upstream']
+)
+OPENAI_FAILURES = registry.counter(
+    'openai_request_failures', 'Failed OpenAI API attempts, by error', ['upstream', 'error']
+)
+FALLBACKS = registry.counter(
+    'food_extraction_fallbacks', 'create_fallback_food_data results, by what produced them', ['source']
+)
+CACHE_LOOKUPS = registry.counter('cache_lookups', 'Cache lookups by cache and result', ['cache', 'result'])
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match._func_path
+
+
+def scrape_token_matches(request):
+    """
+    True if the request carries "Authorization: Bearer <METRICS_TOKEN>"
+    """
+    secret = getattr(settings, 'METRICS_TOKEN', '')
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return bool(secret and token) and scheme.lower() == 'bearer' and hmac.compare_digest(token, secret)
+
+
+class MetricsMiddleware:
+    """
+    Counts requests and errors and records latency per view
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, seconds):
+        view = view_name(request)
+        REQUEST_LATENCY.observe(seconds, view=view, method=request.method)
+        REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        if response.status_code >= 500:
+            REQUEST_ERRORS.inc(view=view)
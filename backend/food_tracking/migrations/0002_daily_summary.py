@@ -0,0 +1,101 @@
+# Generated by Django 5.2.1 on 2026-10-17 01:03
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def build_daily_summaries(apps, schema_editor):
+    CalorieEntry = apps.get_model("food_tracking", "CalorieEntry")
+    DailySummary = apps.get_model("food_tracking", "DailySummary")
+    rows = (
+        CalorieEntry.objects.annotate(day=TruncDate("created_at"))
+        .values("day", "meal_type")
+        .annotate(
+            entries_count=Count("id"),
+            calories=Sum("calories"),
+            protein=Sum("protein"),
+            carbs=Sum("carbs"),
+            fat=Sum("fat"),
+        )
+        .order_by()
+    )
+    DailySummary.objects.bulk_create(
+        [
+            DailySummary(
+                date=row["day"],
+                meal_type=row["meal_type"],
+                entries_count=row["entries_count"],
+                calories=row["calories"] or 0,
+                protein=row["protein"] or 0,
+                carbs=row["carbs"] or 0,
+                fat=row["fat"] or 0,
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("food_tracking", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailySummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                (
+                    "meal_type",
+                    models.CharField(
+                        choices=[
+                            ("breakfast", "Breakfast"),
+                            ("lunch", "Lunch"),
+                            ("dinner", "Dinner"),
+                            ("snack", "Snack"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "calories",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                (
+                    "protein",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                (
+                    "carbs",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                (
+                    "fat",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                ("entries_count", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "ordering": ["-date", "meal_type"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("date", "meal_type"), name="unique_daily_summary"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(build_daily_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-17 01:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("food_tracking", "0002_daily_summary"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="calorieentry",
+            index=models.Index(
+                fields=["created_at", "id"], name="calorie_entry_created_id_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.1 on 2026-10-17 02:10
+
+from django.db import migrations, models
+
+
+def fill_normalized_names(apps, schema_editor):
+    # Names that only differ in case or spacing are merged into the oldest row
+    FoodItem = apps.get_model("food_tracking", "FoodItem")
+    CalorieEntry = apps.get_model("food_tracking", "CalorieEntry")
+    kept = {}
+    updated = []
+    for food_item in FoodItem.objects.order_by("id").only("id", "name").iterator(chunk_size=2000):
+        normalized_name = " ".join(food_item.name.lower().split())
+        if normalized_name in kept:
+            CalorieEntry.objects.filter(food_item_id=food_item.id).update(food_item_id=kept[normalized_name])
+            FoodItem.objects.filter(id=food_item.id).delete()
+            continue
+        kept[normalized_name] = food_item.id
+        food_item.normalized_name = normalized_name
+        updated.append(food_item)
+        if len(updated) >= 1000:
+            FoodItem.objects.bulk_update(updated, ["normalized_name"])
+            updated = []
+    FoodItem.objects.bulk_update(updated, ["normalized_name"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("food_tracking", "0004_audio_job"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="fooditem",
+            name="normalized_name",
+            field=models.CharField(editable=False, max_length=255, null=True),
+        ),
+        migrations.RunPython(fill_normalized_names, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="fooditem",
+            name="normalized_name",
+            field=models.CharField(editable=False, max_length=255, unique=True),
+        ),
+    ]
@@ -1,14 +1,26 @@
-from django.db import models
+import uuid
+from datetime import date, datetime, time, timedelta
+
+from django.db import models, transaction
+from django.utils import timezone
+
+from .search import normalize_name
 
 
 class FoodItem(models.Model):
     name = models.CharField(max_length=255)
+    # Case- and whitespace-insensitive name; the catalog importer upserts on it
+    normalized_name = models.CharField(max_length=255, unique=True, editable=False)
     calories_per_100g = models.DecimalField(max_digits=8, decimal_places=2)
     protein_per_100g = models.DecimalField(max_digits=8, decimal_places=2, default=0)
     carbs_per_100g = models.DecimalField(max_digits=8, decimal_places=2, default=0)
     fat_per_100g = models.DecimalField(max_digits=8, decimal_places=2, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    def save(self, *args, **kwargs):
+        self.normalized_name = normalize_name(self.name)
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         return self.name
     
@@ -16,6 +28,36 @@ class FoodItem(models.Model):
         ordering = ['name']
 
 
+MEAL_TYPE_CHOICES = [
+    ('breakfast', 'Breakfast'),
+    ('lunch', 'Lunch'),
+    ('dinner', 'Dinner'),
+    ('snack', 'Snack'),
+]
+
+
+class CalorieEntryQuerySet(models.QuerySet):
+    def between_days(self, start, end=None):
+        """
+        Filter to entries created from `start` through `end` (inclusive,
+        defaulting to `start`) in the current time zone.
+
+        Uses a half-open `created_at` range instead of `created_at__date` so
+        the lookup can be served by the created_at index.
+        """
+        if isinstance(start, str):
+            start = date.fromisoformat(start)
+        if end is None:
+            end = start
+        elif isinstance(end, str):
+            end = date.fromisoformat(end)
+        tz = timezone.get_current_timezone()
+        return self.filter(
+            created_at__gte=datetime.combine(start, time.min, tzinfo=tz),
+            created_at__lt=datetime.combine(end + timedelta(days=1), time.min, tzinfo=tz),
+        )
+
+
 class CalorieEntry(models.Model):
     food_item = models.ForeignKey(FoodItem, on_delete=models.CASCADE)
     quantity_grams = models.DecimalField(max_digits=8, decimal_places=2)
@@ -26,29 +68,36 @@ class CalorieEntry(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     meal_type = models.CharField(
         max_length=20,
-        choices=[
-            ('breakfast', 'Breakfast'),
-            ('lunch', 'Lunch'),
-            ('dinner', 'Dinner'),
-            ('snack', 'Snack'),
-        ],
+        choices=MEAL_TYPE_CHOICES,
         default='snack'
     )
     
-    def save(self, *args, **kwargs):
+    objects = CalorieEntryQuerySet.as_manager()
+    
+    def calculate_nutrition(self, food_item=None):
         # Calculate nutritional values based on quantity
+        food_item = food_item or self.food_item
         multiplier = self.quantity_grams / 100
-        self.calories = self.food_item.calories_per_100g * multiplier
-        self.protein = self.food_item.protein_per_100g * multiplier
-        self.carbs = self.food_item.carbs_per_100g * multiplier
-        self.fat = self.food_item.fat_per_100g * multiplier
-        super().save(*args, **kwargs)
+        self.calories = food_item.calories_per_100g * multiplier
+        self.protein = food_item.protein_per_100g * multiplier
+        self.carbs = food_item.carbs_per_100g * multiplier
+        self.fat = food_item.fat_per_100g * multiplier
+    
+    def save(self, *args, **kwargs):
+        self.calculate_nutrition()
+        # Keep the DailySummary rollup (updated from signals) in the same transaction
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.food_item.name} ({self.quantity_grams}g)"
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Serves keyset pagination and the created_at day/range filters
+            models.Index(fields=['created_at', 'id'], name='calorie_entry_created_id_idx'),
+        ]
 
 
 class DailyGoal(models.Model):
@@ -59,5 +108,84 @@ class DailyGoal(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    @classmethod
+    def current(cls):
+        """
+        The goals in effect: the first row, created with the defaults when
+        there is none.
+
+        Unlike get_or_create() without a lookup, this keeps working when
+        concurrent first requests have each created a row.
+        """
+        goal = cls.objects.order_by('pk').first()
+        if goal is None:
+            goal = cls.objects.create()
+        return goal
+    
     def __str__(self):
         return f"Daily Goals - {self.target_calories} calories"
+
+
+class DailySummary(models.Model):
+    """
+    Running totals of CalorieEntry rows per day and meal type.
+
+    Maintained incrementally by the CalorieEntry signals in signals.py; use
+    the `rebuild_daily_summaries` command to rebuild or verify it.
+    """
+    date = models.DateField()
+    meal_type = models.CharField(max_length=20, choices=MEAL_TYPE_CHOICES)
+    calories = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    protein = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    carbs = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    fat = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    entries_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.date} {self.meal_type} - {self.calories} calories"
+    
+    class Meta:
+        ordering = ['-date', 'meal_type']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'meal_type'], name='unique_daily_summary'),
+        ]
+
+
+class AudioJob(models.Model):
+    """
+    A process-audio request submitted in background mode.
+
+    The audio is kept on local disk until the job finishes; see jobs.py.
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_PROCESSING = 'processing'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            (STATUS_QUEUED, 'Queued'),
+            (STATUS_PROCESSING, 'Processing'),
+            (STATUS_COMPLETED, 'Completed'),
+            (STATUS_FAILED, 'Failed'),
+        ],
+        default=STATUS_QUEUED
+    )
+    audio_path = models.CharField(max_length=500)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"Audio job {self.id} ({self.status})"
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='audio_job_status_idx'),
+        ]
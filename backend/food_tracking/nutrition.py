@@ -0,0 +1,217 @@
+from decimal import Decimal, InvalidOperation
+
+from .search import TOKEN_RE, food_search_index, normalize_name
+
+
+# Grams per unit; mass units are exact, the rest are common serving sizes
+UNIT_GRAMS = {
+    'g': 1, 'gram': 1, 'grams': 1,
+    'kg': 1000, 'kilogram': 1000, 'kilograms': 1000,
+    'oz': 28.35, 'ounce': 28.35, 'ounces': 28.35,
+    'lb': 453.6, 'pound': 453.6, 'pounds': 453.6,
+    'ml': 1, 'milliliter': 1, 'milliliters': 1,
+    'l': 1000, 'liter': 1000, 'liters': 1000,
+    'cup': 240, 'cups': 240,
+    'glass': 250, 'glasses': 250,
+    'bowl': 250, 'bowls': 250,
+    'plate': 300, 'plates': 300,
+    'tbsp': 15, 'tablespoon': 15, 'tablespoons': 15,
+    'tsp': 5, 'teaspoon': 5, 'teaspoons': 5,
+    'slice': 30, 'slices': 30,
+    'handful': 30, 'handfuls': 30,
+}
+# Grams per piece of foods usually counted rather than weighed ("3 eggs"),
+# keyed by the singular of the food's main word
+PIECE_GRAMS = {
+    'egg': 50, 'banana': 118, 'apple': 182, 'orange': 131, 'pear': 178, 'peach': 150,
+    'kiwi': 75, 'mango': 200, 'avocado': 150, 'tomato': 123, 'potato': 173, 'carrot': 61,
+    'bagel': 105, 'muffin': 113, 'croissant': 57, 'donut': 60, 'cookie': 15, 'biscuit': 15,
+    'tortilla': 45, 'roti': 40, 'chapati': 40, 'naan': 90, 'idli': 40, 'dosa': 80,
+    'samosa': 60, 'sausage': 75, 'pancake': 40,
+}
+COUNT_UNITS = {'', 'piece', 'pieces'}
+MASS_UNITS = {'g', 'gram', 'grams', 'kg', 'kilogram', 'kilograms', 'oz', 'ounce', 'ounces', 'lb', 'pound', 'pounds'}
+DEFAULT_SERVING_GRAMS = 100
+NUTRIENT_FIELDS = (
+    ('calories', 'calories_per_100g'),
+    ('protein', 'protein_per_100g'),
+    ('carbs', 'carbs_per_100g'),
+    ('fat', 'fat_per_100g'),
+)
+# Confidence of an item resolved against the database vs. one left to the model
+DATABASE_CONFIDENCE = 0.9
+MODEL_CONFIDENCE = 0.6
+
+
+def to_decimal(value, default=None):
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, TypeError, ValueError):
+        return default
+
+
+def name_candidates(name):
+    """
+    Names to try for an extracted item, most specific first: the name as
+    given, its singular/plural form and its last word ("grilled salmon" ->
+    "salmon").
+    """
+    name = normalize_name(name)
+    candidates = [name]
+    candidates.append(name[:-1] if name.endswith('s') else f'{name}s')
+    words = TOKEN_RE.findall(name)
+    if len(words) > 1:
+        candidates.append(words[-1])
+    return [candidate for candidate in candidates if candidate]
+
+
+def same_word(query, word):
+    """
+    True if `word` is `query` or its singular/plural form
+    """
+    return word in (query, f'{query}s', f'{query}es') or query in (f'{word}s', f'{word}es')
+
+
+def match_food_item(name):
+    """
+    Return the serialized FoodItem best matching an extracted name, or None.
+
+    Uses the in-memory search index, and only accepts results where every
+    query word starts a word of the food name ("tea" does not match
+    "steak") and the last one is a whole word, give or take a plural ("egg"
+    matches "Eggs, boiled" but not "Eggplant").
+    """
+    for candidate in name_candidates(name):
+        words = TOKEN_RE.findall(candidate)
+        if not words:
+            continue
+        *leading_words, last_word = words
+        for food_item in food_search_index.search(candidate, limit=5):
+            food_words = TOKEN_RE.findall(normalize_name(food_item['name']))
+            if all(any(word.startswith(query) for word in food_words) for query in leading_words) \
+                    and any(same_word(last_word, word) for word in food_words):
+                return food_item
+    return None
+
+
+def piece_grams(name):
+    """
+    Grams per piece of a food name, or None when it is not a counted food.
+    The main word is the last one before any comma ("Eggs, boiled",
+    "boiled egg" -> "egg").
+    """
+    words = TOKEN_RE.findall(normalize_name(str(name).split(',')[0]))
+    if not words:
+        return None
+    word = words[-1]
+    for form in (word, word[:-1] if word.endswith('s') else None, word[:-2] if word.endswith('es') else None):
+        if form in PIECE_GRAMS:
+            return Decimal(str(PIECE_GRAMS[form]))
+    return None
+
+
+def item_weight_grams(item, food_name=None):
+    """
+    Weight of an extracted item: exact for mass units, otherwise the model's
+    estimate, otherwise the piece weight of counted foods (by the item's or
+    the matched `food_name`), otherwise a common serving size for the unit.
+    """
+    quantity = to_decimal(item.get('quantity'), Decimal(1)) or Decimal(1)
+    unit = str(item.get('unit') or '').lower().strip()
+    if unit in MASS_UNITS:
+        return quantity * Decimal(str(UNIT_GRAMS[unit]))
+    estimated = to_decimal(item.get('estimated_weight_g'))
+    if estimated:
+        return estimated
+    if unit in COUNT_UNITS:
+        grams = piece_grams(item.get('name') or '') or (food_name and piece_grams(food_name))
+        if grams:
+            return quantity * grams
+    return quantity * Decimal(str(UNIT_GRAMS.get(unit, DEFAULT_SERVING_GRAMS)))
+
+
+def resolve_item(item):
+    """
+    Attach weight, calories and macros to one extracted item, computed from
+    the matching FoodItem's per-100g values. Items with no match keep the
+    model's own calorie estimate.
+    """
+    resolved = dict(item)
+    food_item = match_food_item(str(item.get('name') or ''))
+    weight = item_weight_grams(item, food_item and food_item['name'])
+    resolved['estimated_weight_g'] = float(round(weight, 1))
+
+    if food_item is None:
+        calories = to_decimal(item.get('estimated_calories'), Decimal(0))
+        macros = item.get('macros') or {}
+        resolved.update({
+            'food_item': None,
+            'source': 'model',
+            'estimated_calories': float(round(calories, 1)),
+            'macros': {
+                'protein_g': float(round(to_decimal(macros.get('protein_g'), Decimal(0)), 1)),
+                'carbs_g': float(round(to_decimal(macros.get('carbs_g'), Decimal(0)), 1)),
+                'fat_g': float(round(to_decimal(macros.get('fat_g'), Decimal(0)), 1)),
+            },
+        })
+        return resolved
+
+    multiplier = weight / 100
+    values = {
+        key: round(to_decimal(food_item[field], Decimal(0)) * multiplier, 1)
+        for key, field in NUTRIENT_FIELDS
+    }
+    resolved.update({
+        'food_item': food_item['id'],
+        'matched_name': food_item['name'],
+        'source': 'database',
+        'estimated_calories': float(values['calories']),
+        'macros': {
+            'protein_g': float(values['protein']),
+            'carbs_g': float(values['carbs']),
+            'fat_g': float(values['fat']),
+        },
+    })
+    return resolved
+
+
+def resolve_food_data(structured_data):
+    """
+    Resolve every extracted item against the food database and fill in the
+    summary fields of the process-audio response (food, calories, details
+    and, unless already given, confidence). Data without an `items` list is
+    returned unchanged.
+    """
+    items = structured_data.get('items')
+    if not isinstance(items, list) or not items:
+        return structured_data
+
+    resolved_items = [resolve_item(item) for item in items if isinstance(item, dict)]
+    if not resolved_items:
+        return structured_data
+
+    def total(key):
+        return round(sum(item['macros'][key] for item in resolved_items), 1)
+
+    resolved = dict(structured_data)
+    resolved.update({
+        'items': resolved_items,
+        'food': ', '.join(
+            item.get('matched_name') or str(item.get('name') or 'unknown food') for item in resolved_items
+        ),
+        'calories': round(sum(item['estimated_calories'] for item in resolved_items), 1),
+        'details': {
+            'protein': total('protein_g'),
+            'carbs': total('carbs_g'),
+            'fat': total('fat_g'),
+        },
+    })
+    if 'confidence' not in structured_data:
+        resolved['confidence'] = round(sum(
+            DATABASE_CONFIDENCE if item['source'] == 'database' else MODEL_CONFIDENCE
+            for item in resolved_items
+        ) / len(resolved_items), 2)
+    if resolved.get('meal') == 'unknown':
+        resolved['meal'] = 'snack'
+    resolved.pop('total_estimated_calories', None)
+    return resolved
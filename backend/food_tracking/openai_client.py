@@ -0,0 +1,265 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+
+import httpx
+import openai
+from django.conf import settings
+
+from .metrics import OPENAI_FAILURES, OPENAI_LATENCY
+
+
+# Upstream errors worth retrying; anything else (bad request, auth) fails at once
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+def get_openai_api_key():
+    api_key = getattr(settings, 'OPENAI_API_KEY', os.environ.get('OPENAI_API_KEY'))
+    if not api_key:
+        raise Exception("OpenAI API key not configured")
+    return api_key
+
+
+class CircuitBreaker:
+    """
+    Fails fast after repeated upstream failures.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    are rejected for `reset_timeout` seconds. Then a single trial call is let
+    through (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name, failure_threshold=None, reset_timeout=None):
+        self.name = name
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial = None
+
+    @property
+    def failure_threshold(self):
+        if self._failure_threshold is not None:
+            return self._failure_threshold
+        return getattr(settings, 'OPENAI_CIRCUIT_FAILURE_THRESHOLD', 5)
+
+    @property
+    def reset_timeout(self):
+        if self._reset_timeout is not None:
+            return self._reset_timeout
+        return getattr(settings, 'OPENAI_CIRCUIT_RESET_TIMEOUT', 30)
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def allow(self):
+        """
+        Return False when the call must be rejected, True while the circuit
+        is closed, or, for the one half-open trial call, a token to hand to
+        release_trial()
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial is not None:
+                return False
+            self._trial = object()
+            return self._trial
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial = None
+
+    def release_trial(self, permit):
+        """
+        Give up the trial call that `permit` (from allow()) let through when
+        it ended without an outcome (e.g. it was cancelled), so the next call
+        can be the trial instead. Other calls leave the trial alone.
+        """
+        with self._lock:
+            if permit is self._trial:
+                self._trial = None
+
+    def reset(self):
+        self.record_success()
+
+
+def backoff_delay(attempt):
+    """
+    Full-jitter exponential backoff: uniform in [0, min(max, base * 2**attempt)]
+    """
+    base = getattr(settings, 'OPENAI_BACKOFF_BASE', 0.5)
+    cap = getattr(settings, 'OPENAI_BACKOFF_MAX', 8)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class OpenAIClientManager:
+    """
+    Process-wide OpenAI clients with pooled connections, timeouts, retries
+    and a circuit breaker per upstream (Whisper, chat).
+
+    The sync client is shared by every thread of the process and rebuilt
+    after a fork; async clients are kept per event loop. The SDK's own
+    retries are disabled so that `call` / `acall` own the retry budget.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client = None
+        self._client_pid = None
+        self._async_clients = weakref.WeakKeyDictionary()
+        self.breakers = {
+            'transcription': CircuitBreaker('transcription'),
+            'chat': CircuitBreaker('chat'),
+        }
+
+    def _timeout(self):
+        return httpx.Timeout(
+            getattr(settings, 'OPENAI_READ_TIMEOUT', 30),
+            connect=getattr(settings, 'OPENAI_CONNECT_TIMEOUT', 5),
+        )
+
+    def _limits(self, asynchronous=False):
+        if asynchronous:
+            # One event loop multiplexes many requests, so it needs a bigger pool
+            max_connections = getattr(settings, 'OPENAI_ASYNC_MAX_CONNECTIONS', 200)
+        else:
+            max_connections = getattr(settings, 'OPENAI_MAX_CONNECTIONS', 20)
+        # Idle connections above this are closed rather than pooled; a large
+        # idle pool makes httpx slower to pick a connection under load
+        keepalive = getattr(settings, 'OPENAI_MAX_KEEPALIVE_CONNECTIONS', 20)
+        return httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=min(keepalive, max_connections),
+        )
+
+    def _client_kwargs(self):
+        return {
+            'api_key': get_openai_api_key(),
+            'base_url': getattr(settings, 'OPENAI_BASE_URL', None),
+            'max_retries': 0,
+        }
+
+    def get_client(self):
+        with self._lock:
+            if self._client is None or self._client_pid != os.getpid():
+                self._client = openai.OpenAI(
+                    http_client=httpx.Client(timeout=self._timeout(), limits=self._limits()),
+                    **self._client_kwargs()
+                )
+                self._client_pid = os.getpid()
+            return self._client
+
+    def get_async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = openai.AsyncOpenAI(
+                http_client=httpx.AsyncClient(timeout=self._timeout(), limits=self._limits(asynchronous=True)),
+                **self._client_kwargs()
+            )
+            self._async_clients[loop] = client
+        return client
+
+    def reset(self):
+        with self._lock:
+            self._client = None
+            self._async_clients = weakref.WeakKeyDictionary()
+        for breaker in self.breakers.values():
+            breaker.reset()
+
+    def call(self, upstream, request):
+        """
+        Run `request(client)` with retries and the upstream's circuit breaker
+        """
+        breaker = self.breakers[upstream]
+        max_retries = getattr(settings, 'OPENAI_MAX_RETRIES', 2)
+        for attempt in range(max_retries + 1):
+            permit = breaker.allow()
+            if not permit:
+                OPENAI_FAILURES.inc(upstream=upstream, error='CircuitOpenError')
+                raise CircuitOpenError(f'OpenAI {upstream} circuit is open')
+            try:
+                with OPENAI_LATENCY.time(upstream=upstream):
+                    result = request(self.get_client())
+            except RETRYABLE_ERRORS as e:
+                OPENAI_FAILURES.inc(upstream=upstream, error=type(e).__name__)
+                breaker.record_failure()
+                if attempt == max_retries:
+                    raise
+                time.sleep(backoff_delay(attempt))
+                continue
+            except Exception as e:
+                # The upstream answered (e.g. a 4xx); that is not an outage
+                OPENAI_FAILURES.inc(upstream=upstream, error=type(e).__name__)
+                breaker.record_success()
+                raise
+            except BaseException:
+                # Cancelled (CancelledError, KeyboardInterrupt): no verdict on the upstream
+                breaker.release_trial(permit)
+                raise
+            breaker.record_success()
+            return result
+
+    async def acall(self, upstream, request):
+        """
+        Async counterpart of `call`; `request(client)` must return an awaitable
+        """
+        breaker = self.breakers[upstream]
+        max_retries = getattr(settings, 'OPENAI_MAX_RETRIES', 2)
+        for attempt in range(max_retries + 1):
+            permit = breaker.allow()
+            if not permit:
+                OPENAI_FAILURES.inc(upstream=upstream, error='CircuitOpenError')
+                raise CircuitOpenError(f'OpenAI {upstream} circuit is open')
+            try:
+                with OPENAI_LATENCY.time(upstream=upstream):
+                    result = await request(self.get_async_client())
+            except RETRYABLE_ERRORS as e:
+                OPENAI_FAILURES.inc(upstream=upstream, error=type(e).__name__)
+                breaker.record_failure()
+                if attempt == max_retries:
+                    raise
+                await asyncio.sleep(backoff_delay(attempt))
+                continue
+            except Exception as e:
+                OPENAI_FAILURES.inc(upstream=upstream, error=type(e).__name__)
+                breaker.record_success()
+                raise
+            except BaseException:
+                # Cancelled (CancelledError, KeyboardInterrupt): no verdict on the upstream
+                breaker.release_trial(permit)
+                raise
+            breaker.record_success()
+            return result
+
+
+openai_clients = OpenAIClientManager()
@@ -0,0 +1,253 @@
+import cProfile
+import hmac
+import io
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+
+PROFILE_HEADER = 'X-Profile-Token'
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f'{frame.f_globals.get("__name__", "?")}.{getattr(code, "co_qualname", code.co_name)}'
+
+
+def collapse(frame):
+    """
+    The stack of `frame` in collapsed format, outermost call first:
+    "module.func;module.func;..."
+    """
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler that aggregates the stacks of profiled threads.
+
+    While at least one thread is being profiled, a daemon thread wakes up
+    every `interval` seconds and counts the current stack of each of them;
+    with none, it sleeps until one is added. The aggregate is reported in
+    collapsed-stack format ("a;b;c 42" per line), which flamegraph.pl and
+    speedscope read directly.
+
+    For async views the event loop thread is sampled, so concurrent
+    requests on the same loop show up as well.
+    """
+    formats = ('collapsed',)
+
+    def __init__(self, interval=None):
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._threads = Counter()
+        self._wake = threading.Event()
+        self._sampler = None
+        self.stacks = Counter()
+        self.samples = 0
+        self.profiles = 0
+
+    @property
+    def interval(self):
+        if self._interval is not None:
+            return self._interval
+        return getattr(settings, 'PROFILING_INTERVAL_MS', 5) / 1000
+
+    def start(self):
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._threads[thread_id] += 1
+            self.profiles += 1
+            if self._sampler is None or not self._sampler.is_alive():
+                self._sampler = threading.Thread(target=self._run, name='profiler', daemon=True)
+                self._sampler.start()
+        self._wake.set()
+        return thread_id
+
+    def stop(self, thread_id):
+        with self._lock:
+            self._threads[thread_id] -= 1
+            if self._threads[thread_id] <= 0:
+                del self._threads[thread_id]
+            if not self._threads:
+                self._wake.clear()
+
+    @contextmanager
+    def profile(self):
+        token = self.start()
+        try:
+            yield
+        finally:
+            self.stop(token)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            with self._lock:
+                thread_ids = list(self._threads)
+            frames = sys._current_frames()
+            stacks = [collapse(frames[thread_id]) for thread_id in thread_ids if thread_id in frames]
+            with self._lock:
+                self.stacks.update(stacks)
+                self.samples += len(stacks)
+
+    def reset(self):
+        with self._lock:
+            self.stacks = Counter()
+            self.samples = 0
+            self.profiles = 0
+
+    def report(self, format='collapsed', limit=None):
+        with self._lock:
+            stacks = self.stacks.most_common(limit)
+        return ''.join(f'{stack} {count}\n' for stack, count in stacks)
+
+
+class CProfileProfiler:
+    """
+    Deterministic profiler: every function call of a profiled request is
+    traced with cProfile and the results are merged into one pstats.Stats.
+
+    Much slower than sampling while active, but exact. Only one request per
+    thread is traced at a time; overlapping ones on the same thread (async
+    views) are not profiled.
+    """
+    formats = ('pstats',)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = set()
+        self.stats = None
+        self.profiles = 0
+
+    def start(self):
+        thread_id = threading.get_ident()
+        with self._lock:
+            if thread_id in self._active:
+                return None
+            self._active.add(thread_id)
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return thread_id, profiler
+
+    def stop(self, token):
+        if token is None:
+            return
+        thread_id, profiler = token
+        profiler.disable()
+        with self._lock:
+            self._active.discard(thread_id)
+            if self.stats is None:
+                self.stats = pstats.Stats(profiler)
+            else:
+                self.stats.add(profiler)
+            self.profiles += 1
+
+    @contextmanager
+    def profile(self):
+        token = self.start()
+        try:
+            yield
+        finally:
+            self.stop(token)
+
+    def reset(self):
+        with self._lock:
+            self.stats = None
+            self.profiles = 0
+
+    def report(self, format='pstats', limit=50):
+        with self._lock:
+            if self.stats is None:
+                return ''
+            output = io.StringIO()
+            self.stats.stream = output
+            self.stats.sort_stats('cumulative').print_stats(limit)
+            return output.getvalue()
+
+    def dump(self, path):
+        with self._lock:
+            if self.stats is not None:
+                self.stats.dump_stats(path)
+
+
+PROFILERS = {
+    'sample': SamplingProfiler,
+    'cprofile': CProfileProfiler,
+}
+
+_profilers = {}
+_profilers_lock = threading.Lock()
+
+
+def get_profiler(mode=None):
+    """
+    The process-wide profiler for `mode` (PROFILING_MODE by default)
+    """
+    mode = mode or getattr(settings, 'PROFILING_MODE', 'sample')
+    with _profilers_lock:
+        if mode not in _profilers:
+            _profilers[mode] = PROFILERS[mode]()
+        return _profilers[mode]
+
+
+def token_matches(token):
+    secret = getattr(settings, 'PROFILING_SECRET', '')
+    return bool(secret and token) and hmac.compare_digest(token, secret)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a sample of requests with the PROFILING_MODE profiler.
+
+    A request is profiled when its path starts with one of PROFILING_PATHS
+    and either it wins the PROFILING_SAMPLE_RATE draw or it carries an
+    X-Profile-Token header equal to PROFILING_SECRET. With neither a rate
+    nor a secret configured the middleware removes itself at startup, so it
+    costs nothing. Read the aggregate from /api/internal/profile/.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_SAMPLE_RATE', 0) and not getattr(settings, 'PROFILING_SECRET', ''):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def should_profile(self, request):
+        if not request.path.startswith(tuple(getattr(settings, 'PROFILING_PATHS', ['/api/']))):
+            return False
+        if request.path.startswith('/api/internal/'):
+            return False
+        if token_matches(request.headers.get(PROFILE_HEADER, '')):
+            return True
+        return random.random() < getattr(settings, 'PROFILING_SAMPLE_RATE', 0)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.should_profile(request):
+            return self.get_response(request)
+        with get_profiler().profile():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if not self.should_profile(request):
+            return await self.get_response(request)
+        with get_profiler().profile():
+            return await self.get_response(request)
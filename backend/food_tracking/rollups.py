@@ -0,0 +1,151 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+NUTRIENTS = ('calories', 'protein', 'carbs', 'fat')
+CENT = Decimal('0.01')
+
+
+def entry_snapshot(entry):
+    """
+    Return the (date, meal_type, nutrients) an entry contributes to the rollup.
+
+    Values are quantized the same way the database stores them so that
+    incremental updates agree with a full re-aggregation.
+    """
+    values = {
+        nutrient: Decimal(getattr(entry, nutrient) or 0).quantize(CENT)
+        for nutrient in NUTRIENTS
+    }
+    return timezone.localdate(entry.created_at), entry.meal_type, values
+
+
+def apply_delta(day, meal_type, values, sign, count=1):
+    """
+    Add (sign=1) or subtract (sign=-1) the summed values of `count` entries
+    from a rollup row.
+    """
+    from .models import DailySummary
+
+    lookup = {'date': day, 'meal_type': meal_type}
+    updates = {
+        nutrient: F(nutrient) + sign * values[nutrient]
+        for nutrient in NUTRIENTS
+    }
+    updates['entries_count'] = F('entries_count') + sign * count
+    updates['updated_at'] = timezone.now()
+
+    if DailySummary.objects.filter(**lookup).update(**updates):
+        return
+    if sign < 0:
+        # Nothing to subtract from; rebuild_daily_summaries will reconcile.
+        return
+    try:
+        with transaction.atomic():
+            DailySummary.objects.create(entries_count=count, **values, **lookup)
+    except IntegrityError:
+        # Another writer created the row first
+        DailySummary.objects.filter(**lookup).update(**updates)
+
+
+def add_entries(entries):
+    """
+    Add entries that bypassed the signals (e.g. bulk_create) to the rollup,
+    with one update per (date, meal_type) rather than one per entry.
+    """
+    groups = {}
+    for entry in entries:
+        day, meal_type, values = entry_snapshot(entry)
+        group = groups.setdefault((day, meal_type), [dict.fromkeys(NUTRIENTS, Decimal(0)), 0])
+        for nutrient in NUTRIENTS:
+            group[0][nutrient] += values[nutrient]
+        group[1] += 1
+    for (day, meal_type), (values, count) in groups.items():
+        apply_delta(day, meal_type, values, 1, count=count)
+
+
+def aggregate_entries(entries):
+    """
+    Re-aggregate CalorieEntry rows into {(date, meal_type): totals}.
+    """
+    rows = (
+        entries
+        .annotate(day=TruncDate('created_at'))
+        .values('day', 'meal_type')
+        .annotate(
+            entries_count=Count('id'),
+            **{nutrient: Sum(nutrient) for nutrient in NUTRIENTS}
+        )
+        .order_by()
+    )
+    return {
+        (row['day'], row['meal_type']): {
+            'entries_count': row['entries_count'],
+            **{
+                nutrient: Decimal(row[nutrient] or 0).quantize(CENT)
+                for nutrient in NUTRIENTS
+            },
+        }
+        for row in rows
+    }
+
+
+def rebuild_daily_summaries(start=None, end=None):
+    """
+    Replace the rollup rows between `start` and `end` (inclusive) with totals
+    recomputed from CalorieEntry. Returns the number of rows written.
+    """
+    from .models import CalorieEntry, DailySummary
+
+    entries = CalorieEntry.objects.all()
+    summaries = DailySummary.objects.all()
+    if start:
+        entries = entries.filter(created_at__date__gte=start)
+        summaries = summaries.filter(date__gte=start)
+    if end:
+        entries = entries.filter(created_at__date__lte=end)
+        summaries = summaries.filter(date__lte=end)
+
+    with transaction.atomic():
+        computed = aggregate_entries(entries)
+        summaries.delete()
+        DailySummary.objects.bulk_create([
+            DailySummary(date=day, meal_type=meal_type, **totals)
+            for (day, meal_type), totals in computed.items()
+        ], batch_size=1000)
+    return len(computed)
+
+
+def verify_daily_summaries(start=None, end=None):
+    """
+    Compare the rollup with CalorieEntry and return a list of mismatches as
+    (date, meal_type, stored, expected) tuples.
+    """
+    from .models import CalorieEntry, DailySummary
+
+    entries = CalorieEntry.objects.all()
+    summaries = DailySummary.objects.exclude(entries_count=0)
+    if start:
+        entries = entries.filter(created_at__date__gte=start)
+        summaries = summaries.filter(date__gte=start)
+    if end:
+        entries = entries.filter(created_at__date__lte=end)
+        summaries = summaries.filter(date__lte=end)
+
+    expected = aggregate_entries(entries)
+    stored = {
+        (summary.date, summary.meal_type): {
+            'entries_count': summary.entries_count,
+            **{nutrient: getattr(summary, nutrient) for nutrient in NUTRIENTS},
+        }
+        for summary in summaries
+    }
+    mismatches = []
+    for key in sorted(set(expected) | set(stored)):
+        if expected.get(key) != stored.get(key):
+            mismatches.append((key[0], key[1], stored.get(key), expected.get(key)))
+    return mismatches
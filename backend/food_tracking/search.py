@@ -0,0 +1,193 @@
+import bisect
+import heapq
+import re
+import threading
+import time
+
+from django.conf import settings
+
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_name(value):
+    """
+    Lowercase and collapse whitespace so lookups are case-insensitive.
+    """
+    return " ".join(value.lower().split())
+
+
+def trigrams(value):
+    """
+    Return the set of 3-character substrings of an already normalized value.
+    """
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+class FoodSearchIndex:
+    """
+    Process-local search index over FoodItem names.
+
+    Queries of three or more characters are answered from a trigram index and
+    keep the `name__icontains` semantics of the old database search. Shorter
+    queries match the start of any word in the name. Results are ranked by
+    exact match, name prefix, word prefix and then plain substring, with
+    shorter names first inside each tier.
+
+    The index holds the serialized FoodItem payloads, so a search never
+    touches the database once the index is built. It is built lazily on the
+    first search, kept current by the FoodItem save/delete signals and rebuilt
+    after FOOD_SEARCH_INDEX_MAX_AGE seconds so that other worker processes'
+    writes are eventually picked up.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built_at = None
+        self._items = {}
+        self._names = {}
+        self._grams = {}
+        self._words = []
+
+    @property
+    def is_built(self):
+        return self._built_at is not None
+
+    def invalidate(self):
+        """
+        Drop the index; it is rebuilt from the database on the next search.
+        """
+        with self._lock:
+            self._built_at = None
+            self._items = {}
+            self._names = {}
+            self._grams = {}
+            self._words = []
+
+    def build(self):
+        """
+        Load every FoodItem from the database and rebuild the index.
+        """
+        from .models import FoodItem
+        from .serializers import FoodItemSerializer
+
+        with self._lock:
+            self._items = {}
+            self._names = {}
+            self._grams = {}
+            self._words = []
+            for food_item in FoodItem.objects.all().iterator(chunk_size=2000):
+                self._add(food_item.pk, FoodItemSerializer(food_item).data)
+            self._words.sort()
+            self._built_at = time.monotonic()
+
+    def ensure_built(self):
+        max_age = getattr(settings, 'FOOD_SEARCH_INDEX_MAX_AGE', 300)
+        with self._lock:
+            if self._built_at is None or (
+                max_age and time.monotonic() - self._built_at > max_age
+            ):
+                self.build()
+
+    def upsert(self, food_item):
+        """
+        Add or replace a single FoodItem. Ignored until the index is built.
+        """
+        from .serializers import FoodItemSerializer
+
+        with self._lock:
+            if not self.is_built:
+                return
+            self._remove(food_item.pk)
+            self._add(food_item.pk, FoodItemSerializer(food_item).data, sort_words=True)
+
+    def remove(self, pk):
+        """
+        Remove a single FoodItem. Ignored until the index is built.
+        """
+        with self._lock:
+            if self.is_built:
+                self._remove(pk)
+
+    def search(self, query, limit=None):
+        """
+        Return up to `limit` serialized FoodItems matching `query`, best first.
+        """
+        if limit is None:
+            limit = getattr(settings, 'FOOD_SEARCH_RESULT_LIMIT', 50)
+        query = normalize_name(query)
+        if not query or limit <= 0:
+            return []
+
+        self.ensure_built()
+        with self._lock:
+            candidates = self._candidates(query)
+            ranked = heapq.nsmallest(
+                limit,
+                candidates,
+                key=lambda pk: self._rank(pk, query),
+            )
+            return [self._items[pk] for pk in ranked]
+
+    def _add(self, pk, data, sort_words=False):
+        name = normalize_name(data['name'])
+        self._items[pk] = data
+        self._names[pk] = name
+        for gram in trigrams(name):
+            self._grams.setdefault(gram, set()).add(pk)
+        for word in set(TOKEN_RE.findall(name)):
+            if sort_words:
+                bisect.insort(self._words, (word, pk))
+            else:
+                self._words.append((word, pk))
+
+    def _remove(self, pk):
+        name = self._names.pop(pk, None)
+        if name is None:
+            return
+        del self._items[pk]
+        for gram in trigrams(name):
+            ids = self._grams.get(gram)
+            if ids is not None:
+                ids.discard(pk)
+                if not ids:
+                    del self._grams[gram]
+        for word in set(TOKEN_RE.findall(name)):
+            position = bisect.bisect_left(self._words, (word, pk))
+            if position < len(self._words) and self._words[position] == (word, pk):
+                del self._words[position]
+
+    def _candidates(self, query):
+        if len(query) < 3:
+            matches = set()
+            position = bisect.bisect_left(self._words, (query,))
+            while position < len(self._words) and self._words[position][0].startswith(query):
+                matches.add(self._words[position][1])
+                position += 1
+            return matches
+
+        gram_sets = []
+        for gram in trigrams(query):
+            ids = self._grams.get(gram)
+            if not ids:
+                return set()
+            gram_sets.append(ids)
+        gram_sets.sort(key=len)
+        matches = set(gram_sets[0]).intersection(*gram_sets[1:])
+        # Trigram hits are only candidates; confirm the real substring match.
+        return {pk for pk in matches if query in self._names[pk]}
+
+    def _rank(self, pk, query):
+        name = self._names[pk]
+        if name == query:
+            tier = 0
+        elif name.startswith(query):
+            tier = 1
+        elif any(word.startswith(query) for word in TOKEN_RE.findall(name)):
+            tier = 2
+        else:
+            tier = 3
+        return (tier, len(name), name, pk)
+
+
+food_search_index = FoodSearchIndex()
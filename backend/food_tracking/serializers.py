@@ -1,11 +1,11 @@
 from rest_framework import serializers
-from .models import FoodItem, CalorieEntry, DailyGoal
+from .models import FoodItem, CalorieEntry, DailyGoal, AudioJob, MEAL_TYPE_CHOICES
 
 
 class FoodItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = FoodItem
-        fields = '__all__'
+        exclude = ['normalized_name']
 
 
 class CalorieEntrySerializer(serializers.ModelSerializer):
@@ -18,7 +18,25 @@ class CalorieEntrySerializer(serializers.ModelSerializer):
         read_only_fields = ['calories', 'protein', 'carbs', 'fat']
 
 
+class CalorieEntryBulkItemSerializer(serializers.Serializer):
+    """
+    Validates one item of a bulk entry request. `food_item` is a plain id so
+    the view can resolve every item's FoodItem with a single query.
+    """
+    food_item = serializers.IntegerField()
+    quantity_grams = serializers.DecimalField(max_digits=8, decimal_places=2)
+    meal_type = serializers.ChoiceField(choices=MEAL_TYPE_CHOICES, default='snack')
+
+
 class DailyGoalSerializer(serializers.ModelSerializer):
     class Meta:
         model = DailyGoal
         fields = ['target_calories', 'target_protein', 'target_carbs', 'target_fat']
+
+
+class AudioJobSerializer(serializers.ModelSerializer):
+    job_id = serializers.UUIDField(source='id', read_only=True)
+    
+    class Meta:
+        model = AudioJob
+        fields = ['job_id', 'status', 'result', 'error', 'created_at', 'started_at', 'finished_at']
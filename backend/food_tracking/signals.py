@@ -0,0 +1,71 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .db import apply_sqlite_pragmas
+from .extractor import local_food_extractor
+from .instrumentation import instrument_connection
+from .models import CalorieEntry, FoodItem
+from .rollups import apply_delta, entry_snapshot
+from .search import food_search_index
+
+
+@receiver(post_save, sender=FoodItem)
+def index_food_item(sender, instance, **kwargs):
+    transaction.on_commit(lambda: food_search_index.upsert(instance))
+    transaction.on_commit(local_food_extractor.invalidate)
+
+
+@receiver(post_delete, sender=FoodItem)
+def unindex_food_item(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: food_search_index.remove(pk))
+    transaction.on_commit(local_food_extractor.invalidate)
+
+
+@receiver(pre_save, sender=CalorieEntry)
+def remember_previous_entry(sender, instance, raw=False, using=None, **kwargs):
+    # Capture what the stored row contributed so post_save can move it
+    instance._rollup_previous = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    previous = (
+        CalorieEntry.objects.using(using)
+        .filter(pk=instance.pk)
+        .only('created_at', 'meal_type', 'calories', 'protein', 'carbs', 'fat')
+        .first()
+    )
+    if previous is not None:
+        instance._rollup_previous = entry_snapshot(previous)
+
+
+@receiver(post_save, sender=CalorieEntry)
+def update_daily_summary(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_rollup_previous', None)
+    current = entry_snapshot(instance)
+    if previous == current:
+        return
+    if previous is not None:
+        apply_delta(previous[0], previous[1], previous[2], -1)
+    apply_delta(current[0], current[1], current[2], 1)
+
+
+@receiver(post_delete, sender=CalorieEntry)
+def remove_from_daily_summary(sender, instance, **kwargs):
+    day, meal_type, values = entry_snapshot(instance)
+    apply_delta(day, meal_type, values, -1)
+
+
+@receiver(connection_created)
+def time_queries(sender, connection, **kwargs):
+    # Per-request query counts and timings, see instrumentation.py
+    instrument_connection(connection)
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    # WAL, busy timeout and cache sizes from SQLITE_PRAGMAS, see db.py
+    apply_sqlite_pragmas(connection)
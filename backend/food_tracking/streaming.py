@@ -0,0 +1,103 @@
+import json
+
+
+def sse_event(event, data):
+    """
+    Format one server-sent event with a JSON payload
+    """
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+class FoodDataStreamParser:
+    """
+    Incremental parser for the food extraction JSON as ChatGPT streams it.
+
+    `feed` takes each chunk of text and returns the entries of the top-level
+    "items" array completed by it, so items can be shown before the reply
+    is finished. Anything before the first "{" or after the top-level
+    object closes (such as a markdown code fence) is ignored. Strings are
+    tracked so braces inside them do not count.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None
+        self._key = None
+        self._items_depth = None
+        self._item_start = None
+        self._start = None
+        self._end = None
+
+    def feed(self, chunk):
+        items = []
+        offset = len(self.text)
+        self.text += chunk
+        if self._end is not None:
+            return items
+
+        for index, char in enumerate(chunk, offset):
+            if self._start is None:
+                if char == '{':
+                    self._start = index
+                else:
+                    continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        self._last_string = self.text[self._string_start + 1:index]
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = index
+            elif char == ':' and len(self._stack) == 1:
+                self._key = self._last_string
+            elif char in '{[':
+                if char == '[' and len(self._stack) == 1 and self._key == 'items':
+                    self._items_depth = 2
+                elif char == '{' and self._items_depth and len(self._stack) == self._items_depth:
+                    self._item_start = index
+                self._stack.append(char)
+            elif char in '}]':
+                if self._stack:
+                    self._stack.pop()
+                if self._item_start is not None and len(self._stack) == self._items_depth:
+                    item = self._loads(self.text[self._item_start:index + 1])
+                    if isinstance(item, dict):
+                        items.append(item)
+                    self._item_start = None
+                elif char == ']' and self._items_depth and len(self._stack) == 1:
+                    self._items_depth = None
+                if not self._stack:
+                    self._end = index + 1
+                    break
+            elif char == ',' and len(self._stack) == 1:
+                self._key = None
+        return items
+
+    def result(self):
+        """
+        The whole parsed object once the reply is complete, or None when it
+        is not valid JSON
+        """
+        if self._start is None or self._end is None:
+            return None
+        data = self._loads(self.text[self._start:self._end])
+        return data if isinstance(data, dict) else None
+
+    @staticmethod
+    def _loads(text):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            return None
@@ -0,0 +1,295 @@
+"""
+Synthetic CalorieEntry data for load and scaling tests.
+
+Entries are generated a chunk of days at a time: a Poisson number of
+entries per day, a meal type from the meal mix with a time of day inside
+that meal's window, a food drawn with Zipf-like popularity and a log-normal
+portion size. Nutrients are computed for the whole chunk at once in integer
+hundredths, with NumPy when it is installed and plain Python otherwise.
+
+Rows are written a chunk per transaction with the multi-row INSERT that
+bulk_create would run, but from plain tuples: building model instances and
+preparing every value through its field costs six times as much as the
+insert itself. CalorieEntry.save() and its signals are bypassed, so the
+DailySummary rollup has to be rebuilt afterwards.
+"""
+import bisect
+import itertools
+import math
+import random
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+
+from django.db import connection, reset_queries, transaction
+from django.utils import timezone
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .models import CalorieEntry, FoodItem
+
+
+BASE_FOODS = [
+    'apple', 'banana', 'orange', 'mango', 'grapes', 'strawberries', 'blueberries', 'avocado',
+    'rice', 'brown rice', 'quinoa', 'oats', 'bread', 'pasta', 'noodles', 'tortilla',
+    'chicken breast', 'salmon', 'tuna', 'beef', 'pork chop', 'tofu', 'paneer', 'eggs',
+    'milk', 'yogurt', 'cheddar cheese', 'butter', 'almonds', 'peanut butter', 'lentils', 'chickpeas',
+    'broccoli', 'spinach', 'carrots', 'potato', 'sweet potato', 'tomato', 'salad', 'soup',
+]
+QUALIFIERS = [
+    '', 'raw', 'grilled', 'baked', 'boiled', 'fried', 'steamed', 'roasted', 'organic', 'low fat',
+    'whole grain', 'spicy', 'smoked', 'homemade', 'frozen', 'canned', 'dried', 'fresh', 'sweetened',
+    'unsweetened',
+]
+
+# Share of entries per meal type
+MEAL_MIX = {'breakfast': 0.25, 'lunch': 0.3, 'dinner': 0.3, 'snack': 0.15}
+# Local hours [start, end) in which each meal is logged
+MEAL_HOURS = {'breakfast': (6, 10), 'lunch': (11, 15), 'dinner': (17, 22), 'snack': (9, 23)}
+
+# CalorieEntry columns in the order of the generated rows
+ENTRY_FIELDS = (
+    'food_item', 'quantity_grams', 'calories', 'protein', 'carbs', 'fat', 'meal_type', 'created_at'
+)
+ENGINES = ('numpy', 'python')
+
+
+def food_name(index):
+    qualifier = QUALIFIERS[index % len(QUALIFIERS)]
+    base = BASE_FOODS[(index // len(QUALIFIERS)) % len(BASE_FOODS)]
+    name = f'{qualifier} {base}'.strip().title()
+    round_ = index // (len(QUALIFIERS) * len(BASE_FOODS))
+    return f'{name} {round_ + 1}' if round_ else name
+
+
+def synthetic_food_records(count, seed=0):
+    """
+    Yield `count` importer records (see importer.py) for made-up foods
+    """
+    rng = random.Random(seed)
+    for index in range(count):
+        yield {
+            'name': food_name(index),
+            'calories_per_100g': rng.randint(10, 900),
+            'protein_per_100g': rng.randint(0, 400) / 10,
+            'carbs_per_100g': rng.randint(0, 900) / 10,
+            'fat_per_100g': rng.randint(0, 500) / 10,
+        }
+
+
+@contextmanager
+def explicit_created_at(*models):
+    """
+    Let bulk_create keep the created_at values we set instead of stamping
+    every row with the current time
+    """
+    fields = [model._meta.get_field('created_at') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def parse_meal_mix(value):
+    """
+    Parse "breakfast=25,lunch=30,..." into normalized weights
+    """
+    mix = {}
+    for part in value.split(','):
+        meal_type, _, weight = part.partition('=')
+        meal_type = meal_type.strip()
+        if meal_type not in MEAL_HOURS:
+            raise ValueError(f'Unknown meal type {meal_type!r}')
+        mix[meal_type] = float(weight)
+    total = sum(mix.values())
+    if total <= 0 or any(weight < 0 for weight in mix.values()):
+        raise ValueError('Meal weights must be non-negative and not all zero')
+    return {meal_type: weight / total for meal_type, weight in mix.items()}
+
+
+class EntryGenerator:
+    """
+    Generates batches of CalorieEntry rows over `days` days ending on
+    `last_day`.
+
+    `foods` are (id, calories, protein, carbs, fat) per 100 g; food number i
+    (in that order) is picked with weight 1 / (i + 1) ** `food_skew`, so 0
+    is uniform. Portions are log-normal around `portion_median` grams with
+    shape `portion_spread`, rounded to whole grams and clipped to
+    [`portion_min`, `portion_max`].
+    """
+
+    def __init__(self, foods, last_day, days, entries_per_day, meal_mix=MEAL_MIX, portion_median=150,
+                 portion_spread=0.6, portion_min=5, portion_max=1000, food_skew=1.0, seed=0, engine=None):
+        if not foods:
+            raise ValueError('There are no food items to log')
+        if engine is None:
+            engine = 'numpy' if np is not None else 'python'
+        if engine == 'numpy' and np is None:
+            raise ValueError('NumPy is not installed')
+        self.engine = engine
+        self.last_day = last_day
+        self.days = days
+        self.entries_per_day = entries_per_day
+        self.meal_types = list(meal_mix)
+        self.meal_weights = [meal_mix[meal_type] for meal_type in self.meal_types]
+        self.portion_median = portion_median
+        self.portion_spread = portion_spread
+        self.portion_min = portion_min
+        self.portion_max = portion_max
+        self.tz = timezone.get_current_timezone()
+
+        self.food_ids = [food[0] for food in foods]
+        # Nutrients per 100 g in hundredths, so portions are computed exactly
+        self.per_100g = [[round(float(food[1 + index]) * 100) for food in foods] for index in range(4)]
+        weights = [1 / (rank + 1) ** food_skew for rank in range(len(foods))]
+        self.food_cum_weights = list(itertools.accumulate(weights))
+
+        if engine == 'numpy':
+            self.rng = np.random.default_rng(seed)
+            self.np_food_ids = np.array(self.food_ids, dtype=np.int64)
+            self.np_per_100g = np.array(self.per_100g, dtype=np.int64)
+            self.np_food_p = np.array(weights) / sum(weights)
+        else:
+            self.rng = random.Random(seed)
+
+    @property
+    def first_day(self):
+        return self.last_day - timedelta(days=self.days - 1)
+
+    def day_start(self, day):
+        return datetime.combine(day, time.min, tzinfo=self.tz).timestamp()
+
+    def chunks(self, batch_size):
+        """
+        Yield lists of about `batch_size` rows (see ENTRY_FIELDS), a whole
+        number of days at a time
+        """
+        days_per_chunk = max(1, int(batch_size / max(self.entries_per_day, 1)))
+        day = self.first_day
+        while day <= self.last_day:
+            days = [day + timedelta(days=offset) for offset in range(days_per_chunk)]
+            days = [chunk_day for chunk_day in days if chunk_day <= self.last_day]
+            day = days[-1] + timedelta(days=1)
+            columns = self.numpy_columns(days) if self.engine == 'numpy' else self.python_columns(days)
+            yield self.build_rows(*columns)
+
+    def numpy_columns(self, days):
+        rng = self.rng
+        counts = rng.poisson(self.entries_per_day, size=len(days))
+        total = int(counts.sum())
+        starts = np.repeat(np.array([self.day_start(day) for day in days]), counts)
+
+        meals = rng.choice(len(self.meal_types), size=total, p=self.meal_weights)
+        hours = np.array([MEAL_HOURS[meal_type] for meal_type in self.meal_types], dtype=np.float64)
+        window_start, window_end = hours[meals, 0], hours[meals, 1]
+        seconds = (window_start + rng.random(total) * (window_end - window_start)) * 3600
+
+        foods = rng.choice(len(self.food_ids), size=total, p=self.np_food_p)
+        grams = np.clip(
+            np.rint(rng.lognormal(math.log(self.portion_median), self.portion_spread, size=total)),
+            self.portion_min, self.portion_max,
+        ).astype(np.int64)
+        # per-100g hundredths * grams / 100, rounded half to even like Decimal.quantize
+        nutrients = np.rint(self.np_per_100g[:, foods] * grams / 100).astype(np.int64)
+
+        return (
+            self.np_food_ids[foods].tolist(),
+            grams.tolist(),
+            [column.tolist() for column in nutrients],
+            [self.meal_types[meal] for meal in meals.tolist()],
+            (starts + seconds).tolist(),
+        )
+
+    def python_columns(self, days):
+        rng = self.rng
+        food_ids, grams, meals, timestamps = [], [], [], []
+        nutrients = [[], [], [], []]
+        log_median = math.log(self.portion_median)
+        food_total = self.food_cum_weights[-1]
+        last_food = len(self.food_ids) - 1
+        for day in days:
+            start = self.day_start(day)
+            for _ in range(poisson(rng, self.entries_per_day)):
+                meal_type = rng.choices(self.meal_types, self.meal_weights)[0]
+                window_start, window_end = MEAL_HOURS[meal_type]
+                food = min(bisect.bisect(self.food_cum_weights, rng.random() * food_total), last_food)
+                portion = min(max(round(rng.lognormvariate(log_median, self.portion_spread)),
+                                  self.portion_min), self.portion_max)
+                food_ids.append(self.food_ids[food])
+                grams.append(portion)
+                for index in range(4):
+                    nutrients[index].append(round(self.per_100g[index][food] * portion / 100))
+                meals.append(meal_type)
+                timestamps.append(start + rng.uniform(window_start, window_end) * 3600)
+        return food_ids, grams, nutrients, meals, timestamps
+
+    def build_rows(self, food_ids, grams, nutrients, meals, timestamps):
+        tz = self.tz
+        adapt_datetime = connection.ops.adapt_datetimefield_value
+        calories, protein, carbs, fat = nutrients
+        return [
+            (
+                food_ids[index],
+                grams[index],
+                calories[index] / 100,
+                protein[index] / 100,
+                carbs[index] / 100,
+                fat[index] / 100,
+                meals[index],
+                adapt_datetime(datetime.fromtimestamp(timestamps[index], tz)),
+            )
+            for index in range(len(food_ids))
+        ]
+
+
+def poisson(rng, mean):
+    """
+    A Poisson-distributed count; normal approximation for large means
+    """
+    if mean > 50:
+        return max(0, round(rng.gauss(mean, math.sqrt(mean))))
+    limit = math.exp(-mean)
+    count = 0
+    product = rng.random()
+    while product > limit:
+        count += 1
+        product *= rng.random()
+    return count
+
+
+def load_foods():
+    return list(FoodItem.objects.order_by('id').values_list(
+        'id', 'calories_per_100g', 'protein_per_100g', 'carbs_per_100g', 'fat_per_100g'
+    ))
+
+
+def insert_sql():
+    meta = CalorieEntry._meta
+    columns = ', '.join(connection.ops.quote_name(meta.get_field(name).column) for name in ENTRY_FIELDS)
+    placeholders = ', '.join(['%s'] * len(ENTRY_FIELDS))
+    return f'INSERT INTO {connection.ops.quote_name(meta.db_table)} ({columns}) VALUES ({placeholders})'
+
+
+def generate_entries(generator, batch_size=10000, progress=None):
+    """
+    Insert the generator's entries in chunks, one transaction per chunk,
+    and return how many were written. `progress(written)` is called after
+    every chunk.
+    """
+    sql = insert_sql()
+    written = 0
+    for rows in generator.chunks(batch_size):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+        written += len(rows)
+        # With DEBUG on, Django keeps the SQL of recent queries
+        reset_queries()
+        if progress:
+            progress(written)
+    return written
@@ -1,3 +1,1165 @@
-from django.test import TestCase
+import asyncio
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import skipIf
+from unittest.mock import AsyncMock, Mock, patch
 
-# Create your tests here.
+import httpx
+import openai
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.conf import settings
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from pydub import AudioSegment
+from pydub.generators import Sine
+
+from .audio import prepare_upload, preprocess_audio
+from .backends import STAND_IN_TRANSCRIPTIONS, StandInExtractionBackend
+from .batching import MicroBatcher
+from .caches import ExtractionCache, TranscriptionCache
+from .db import ReadReplicaMiddleware, ReadReplicaRouter
+from .extractor import local_food_extractor
+from .importer import import_food_items, read_catalog, read_json
+from .instrumentation import collect_metrics, query_budget
+from .jobs import AudioJobQueue, QueueFull, run_audio_job
+from .metrics import FALLBACKS, MmapValues, registry
+from .nutrition import resolve_food_data
+from .models import AudioJob, CalorieEntry, DailyGoal, DailySummary, FoodItem
+from .openai_client import CircuitBreaker, CircuitOpenError, OpenAIClientManager
+from .profiling import ProfilingMiddleware, SamplingProfiler, get_profiler
+from .rollups import verify_daily_summaries
+from .search import food_search_index
+from .streaming import FoodDataStreamParser
+from .synthetic import EntryGenerator, load_foods, np, parse_meal_mix
+from .views import (
+    create_fallback_food_data, extract_food_data_with_gpt, food_extraction_batch_messages, request_food_extraction_batch,
+    transcribe_audio_whisper
+)
+
+
+class FoodItemSearchTests(TestCase):
+    def setUp(self):
+        food_search_index.invalidate()
+        for name in ['Apple', 'Apple Pie', 'Pineapple', 'Green Apple', 'Banana']:
+            FoodItem.objects.create(name=name, calories_per_100g=50)
+
+    def tearDown(self):
+        food_search_index.invalidate()
+
+    def test_search_is_ranked_and_limited(self):
+        response = self.client.get('/api/food-items/', {'search': 'apple'})
+        names = [item['name'] for item in response.json()]
+        self.assertEqual(names, ['Apple', 'Apple Pie', 'Green Apple', 'Pineapple'])
+
+        response = self.client.get('/api/food-items/', {'search': 'apple', 'limit': 2})
+        self.assertEqual([item['name'] for item in response.json()], ['Apple', 'Apple Pie'])
+
+    def test_short_query_matches_word_prefix(self):
+        names = [item['name'] for item in food_search_index.search('gr')]
+        self.assertEqual(names, ['Green Apple'])
+
+    def test_search_does_not_query_database_once_built(self):
+        food_search_index.build()
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/food-items/', {'search': 'ban'})
+        self.assertEqual(response.json()[0]['name'], 'Banana')
+
+    def test_index_follows_save_and_delete(self):
+        food_search_index.build()
+        with self.captureOnCommitCallbacks(execute=True):
+            mango = FoodItem.objects.create(name='Mango', calories_per_100g=60)
+        self.assertEqual([item['name'] for item in food_search_index.search('mango')], ['Mango'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            mango.name = 'Ripe Mango'
+            mango.save()
+        self.assertEqual([item['name'] for item in food_search_index.search('mango')], ['Ripe Mango'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            mango.delete()
+        self.assertEqual(food_search_index.search('mango'), [])
+
+
+class DailySummaryTests(TestCase):
+    def setUp(self):
+        DailyGoal.objects.create()
+        self.banana = FoodItem.objects.create(
+            name='Banana', calories_per_100g=89, protein_per_100g=1.1,
+            carbs_per_100g=23, fat_per_100g=0.3
+        )
+
+    def log(self, count, meal_type):
+        for _ in range(count):
+            CalorieEntry.objects.create(
+                food_item=self.banana, quantity_grams=100, meal_type=meal_type
+            )
+
+    def test_totals_are_split_by_meal(self):
+        self.log(2, 'breakfast')
+        self.log(1, 'snack')
+        data = self.client.get('/api/summary/').json()
+
+        self.assertEqual(data['entries_count'], 3)
+        self.assertEqual(Decimal(str(data['totals']['total_calories'])), Decimal('267'))
+        self.assertEqual(len(data['meal_breakdown']['breakfast']['entries']), 2)
+        self.assertEqual(Decimal(str(data['meal_breakdown']['snack']['totals']['carbs'])), Decimal('23'))
+        self.assertIsNone(data['meal_breakdown']['dinner']['totals']['calories'])
+        self.assertEqual(data['meal_breakdown']['breakfast']['entries'][0]['food_item_name'], 'Banana')
+
+    def test_query_count_does_not_grow_with_entries(self):
+        self.log(1, 'lunch')
+        with self.assertNumQueries(3):
+            self.client.get('/api/summary/')
+
+        self.log(20, 'dinner')
+        with self.assertNumQueries(3):
+            self.client.get('/api/summary/')
+        with self.assertNumQueries(2):
+            data = self.client.get('/api/summary/', {'entries': 'false'}).json()
+        self.assertEqual(data['entries_count'], 21)
+
+
+class DailySummaryRollupTests(TestCase):
+    def setUp(self):
+        self.apple = FoodItem.objects.create(name='Apple', calories_per_100g=52, carbs_per_100g=14)
+        self.oats = FoodItem.objects.create(name='Oats', calories_per_100g=389, protein_per_100g=17)
+
+    def test_rollup_follows_create_update_and_delete(self):
+        entry = CalorieEntry.objects.create(food_item=self.apple, quantity_grams=150, meal_type='snack')
+        CalorieEntry.objects.create(food_item=self.oats, quantity_grams=40, meal_type='breakfast')
+        self.assertEqual(DailySummary.objects.get(meal_type='snack').calories, Decimal('78.00'))
+
+        response = self.client.put(
+            f'/api/entries/{entry.pk}/',
+            {'food_item': self.oats.pk, 'quantity_grams': '60', 'meal_type': 'breakfast'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        breakfast = DailySummary.objects.get(meal_type='breakfast')
+        self.assertEqual(breakfast.entries_count, 2)
+        self.assertEqual(breakfast.calories, Decimal('389.00'))
+        self.assertEqual(DailySummary.objects.get(meal_type='snack').entries_count, 0)
+
+        self.client.delete(f'/api/entries/{entry.pk}/')
+        self.assertEqual(DailySummary.objects.get(meal_type='breakfast').calories, Decimal('155.60'))
+        self.assertEqual(verify_daily_summaries(), [])
+
+    def test_command_rebuilds_stale_rollup(self):
+        CalorieEntry.objects.create(food_item=self.apple, quantity_grams=100, meal_type='lunch')
+        DailySummary.objects.update(calories=0)
+        self.assertEqual(len(verify_daily_summaries()), 1)
+
+        call_command('rebuild_daily_summaries', stdout=StringIO())
+        self.assertEqual(verify_daily_summaries(), [])
+
+
+class SummaryRangeTests(TestCase):
+    def setUp(self):
+        DailyGoal.objects.create(target_calories=1000)
+        rice = FoodItem.objects.create(name='Rice', calories_per_100g=100)
+        for day in (1, 2, 9, 15):
+            entry = CalorieEntry.objects.create(food_item=rice, quantity_grams=500)
+            CalorieEntry.objects.filter(pk=entry.pk).update(
+                created_at=datetime(2025, 9, day, 12, tzinfo=timezone.utc)
+            )
+
+    def test_weekly_buckets_use_one_grouped_query(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                '/api/summary/range/',
+                {'start': '2025-09-01', 'end': '2025-09-14', 'granularity': 'week'}
+            )
+        buckets = response.json()['buckets']
+        self.assertEqual([bucket['period'] for bucket in buckets], ['2025-09-01', '2025-09-08'])
+        self.assertEqual(buckets[0]['entries_count'], 2)
+        self.assertEqual(buckets[0]['adherence']['calories'], round(1000 / 7000, 3))
+        self.assertEqual(buckets[1]['entries_count'], 1)
+
+    def test_monthly_bucket_is_clipped_to_range(self):
+        data = self.client.get(
+            '/api/summary/range/',
+            {'start': '2025-09-02', 'end': '2025-09-30', 'granularity': 'month'}
+        ).json()
+        self.assertEqual(len(data['buckets']), 1)
+        self.assertEqual(data['buckets'][0]['days'], 29)
+        self.assertEqual(data['buckets'][0]['entries_count'], 3)
+
+    def test_rejects_invalid_parameters(self):
+        response = self.client.get('/api/summary/range/', {'start': '2025-09-01', 'granularity': 'year'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/summary/range/', {'start': '2025-09-10', 'end': '2025-09-01'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CalorieEntryPaginationTests(TestCase):
+    def setUp(self):
+        egg = FoodItem.objects.create(name='Eggs', calories_per_100g=155)
+        same_time = datetime(2025, 9, 1, 8, tzinfo=timezone.utc)
+        for _ in range(5):
+            entry = CalorieEntry.objects.create(food_item=egg, quantity_grams=50)
+            # Identical timestamps must still page without gaps or repeats
+            CalorieEntry.objects.filter(pk=entry.pk).update(created_at=same_time)
+
+    def test_cursor_walks_every_entry_once(self):
+        seen = []
+        url = '/api/entries/?page_size=2'
+        while url:
+            with self.assertNumQueries(1):
+                data = self.client.get(url).json()
+            seen.extend(entry['id'] for entry in data['results'])
+            url = data['next']
+        self.assertEqual(seen, sorted(CalorieEntry.objects.values_list('id', flat=True), reverse=True))
+
+    def test_date_filter(self):
+        data = self.client.get('/api/entries/', {'date': '2025-09-01'}).json()
+        self.assertEqual(len(data['results']), 5)
+        data = self.client.get('/api/entries/', {'date': '2025-09-02'}).json()
+        self.assertEqual(data['results'], [])
+        response = self.client.get('/api/entries/', {'date': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+
+class BulkEntryCreateTests(TestCase):
+    def setUp(self):
+        self.apple = FoodItem.objects.create(name='Apple', calories_per_100g=52, carbs_per_100g=14)
+        self.oats = FoodItem.objects.create(name='Oats', calories_per_100g=389, protein_per_100g=17)
+
+    def post(self, entries):
+        return self.client.post('/api/entries/bulk/', entries, content_type='application/json')
+
+    def test_valid_rows_are_saved_and_errors_reported_by_index(self):
+        response = self.post([
+            {'food_item': self.apple.pk, 'quantity_grams': '150', 'meal_type': 'snack'},
+            {'food_item': 999, 'quantity_grams': '100'},
+            {'food_item': self.oats.pk, 'quantity_grams': '40', 'meal_type': 'breakfast'},
+            {'food_item': self.oats.pk, 'quantity_grams': 'lots'},
+        ])
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual([entry['food_item_name'] for entry in data['created']], ['Apple', 'Oats'])
+        self.assertEqual(data['created'][0]['calories'], '78.00')
+        self.assertEqual([error['index'] for error in data['errors']], [1, 3])
+        self.assertEqual(CalorieEntry.objects.count(), 2)
+        self.assertEqual(verify_daily_summaries(), [])
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        def batch(size):
+            return [{'food_item': self.apple.pk, 'quantity_grams': '100', 'meal_type': 'lunch'}] * size
+
+        self.post(batch(1))
+        with self.assertNumQueries(5):
+            self.post(batch(2))
+        with self.assertNumQueries(5):
+            self.post(batch(20))
+        self.assertEqual(DailySummary.objects.get(meal_type='lunch').entries_count, 23)
+
+    def test_rejects_empty_batch(self):
+        self.assertEqual(self.post([]).status_code, 400)
+
+
+class ProcessAudioAsyncTests(TestCase):
+    def test_requires_audio_file(self):
+        response = self.client.post('/api/process-audio/async/')
+        self.assertEqual(response.status_code, 400)
+
+    @patch('food_tracking.views.async_extract_food_data_with_gpt', new_callable=AsyncMock)
+    @patch('food_tracking.views.async_transcribe_audio_whisper', new_callable=AsyncMock)
+    def test_runs_pipeline_on_uploaded_bytes(self, transcribe, extract):
+        transcribe.return_value = 'an apple for lunch'
+        extract.return_value = {'food': 'apple', 'meal': 'lunch', 'calories': 95}
+        audio = SimpleUploadedFile('clip.m4a', b'fake-audio', content_type='audio/m4a')
+
+        response = self.client.post('/api/process-audio/async/', {'file': audio})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['food'], 'apple')
+        self.assertEqual(transcribe.await_args.args[1], 'clip.m4a')
+        extract.assert_awaited_once_with('an apple for lunch')
+
+    @override_settings(AUDIO_UPLOAD_MAX_BYTES=4)
+    def test_rejects_oversized_upload(self):
+        audio = SimpleUploadedFile('clip.m4a', b'fake-audio', content_type='audio/m4a')
+        response = self.client.post('/api/process-audio/async/', {'file': audio})
+        self.assertEqual(response.status_code, 413)
+
+
+class ProcessAudioUploadTests(TestCase):
+    @patch('food_tracking.views.extract_food_data_with_gpt')
+    @patch('food_tracking.views.transcribe_audio_stream')
+    def test_upload_is_transcribed_in_place(self, transcribe, extract):
+        transcribe.side_effect = lambda audio_file, file_name: audio_file.read().decode()
+        extract.return_value = {'food': 'apple', 'meal': 'lunch', 'calories': 95}
+        audio = SimpleUploadedFile('clip.m4a', b'an apple', content_type='audio/m4a')
+
+        with patch('tempfile.NamedTemporaryFile') as named_temporary_file:
+            response = self.client.post('/api/process-audio/', {'file': audio})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['transcription'], 'an apple')
+        named_temporary_file.assert_not_called()
+
+    @override_settings(AUDIO_UPLOAD_MAX_BYTES=4)
+    @patch('food_tracking.views.transcribe_audio_stream')
+    def test_rejects_oversized_upload(self, transcribe):
+        audio = SimpleUploadedFile('clip.m4a', b'fake-audio', content_type='audio/m4a')
+        response = self.client.post('/api/process-audio/', {'file': audio})
+
+        self.assertEqual(response.status_code, 413)
+        self.assertIn('error', response.json())
+        transcribe.assert_not_called()
+
+
+class AudioJobTests(TestCase):
+    def setUp(self):
+        self.storage = tempfile.TemporaryDirectory()
+        self.addCleanup(self.storage.cleanup)
+        self.settings_override = override_settings(AUDIO_JOB_STORAGE_DIR=self.storage.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def submit(self):
+        audio = SimpleUploadedFile('clip.m4a', b'fake-audio', content_type='audio/m4a')
+        return self.client.post('/api/process-audio/?mode=background', {'file': audio})
+
+    @patch('food_tracking.views.audio_job_queue')
+    def test_background_mode_returns_job_id(self, queue):
+        response = self.submit()
+
+        self.assertEqual(response.status_code, 202)
+        job = AudioJob.objects.get(pk=response.json()['job_id'])
+        self.assertEqual(job.status, AudioJob.STATUS_QUEUED)
+        self.assertTrue(os.path.exists(job.audio_path))
+        queue.submit.assert_called_once_with(job.pk)
+
+    @patch('food_tracking.views.audio_job_queue')
+    def test_full_queue_is_rejected(self, queue):
+        queue.reserve.side_effect = QueueFull
+        self.assertEqual(self.submit().status_code, 503)
+        self.assertFalse(AudioJob.objects.exists())
+
+    @patch('food_tracking.views.AudioJob.objects.create', side_effect=RuntimeError('database is locked'))
+    @patch('food_tracking.views.audio_job_queue')
+    def test_stored_audio_is_removed_when_the_job_cannot_be_created(self, queue, create):
+        self.assertEqual(self.submit().status_code, 500)
+        queue.release.assert_called_once_with()
+        self.assertEqual(os.listdir(self.storage.name), [])
+
+    @patch('food_tracking.views.extract_food_data_with_gpt')
+    @patch('food_tracking.views.transcribe_audio_whisper')
+    @patch('food_tracking.views.audio_job_queue')
+    def test_job_result_can_be_polled(self, queue, transcribe, extract):
+        transcribe.return_value = 'an apple for lunch'
+        extract.return_value = {'food': 'apple', 'meal': 'lunch', 'calories': 95}
+        job_id = self.submit().json()['job_id']
+
+        run_audio_job(job_id)
+
+        data = self.client.get(f'/api/process-audio/{job_id}/').json()
+        self.assertEqual(data['status'], AudioJob.STATUS_COMPLETED)
+        self.assertEqual(data['result']['food'], 'apple')
+        self.assertFalse(os.path.exists(AudioJob.objects.get(pk=job_id).audio_path))
+
+        # A finished job is not run again
+        run_audio_job(job_id)
+        self.assertEqual(transcribe.call_count, 1)
+
+    def test_sweep_recovers_queued_and_abandoned_jobs(self):
+        now = datetime.now(timezone.utc)
+        queued = AudioJob.objects.create(audio_path='queued.m4a')
+        AudioJob.objects.filter(pk=queued.pk).update(created_at=now - timedelta(minutes=5))
+        # Just queued, probably still waiting on another worker's pool
+        AudioJob.objects.create(audio_path='fresh.m4a')
+        abandoned = AudioJob.objects.create(
+            audio_path='abandoned.m4a', status=AudioJob.STATUS_PROCESSING, started_at=now - timedelta(hours=1)
+        )
+        AudioJob.objects.create(audio_path='running.m4a', status=AudioJob.STATUS_PROCESSING, started_at=now)
+        AudioJob.objects.create(audio_path='done.m4a', status=AudioJob.STATUS_COMPLETED)
+
+        queue = AudioJobQueue()
+        queue._executor = Mock()
+        queue._slots = threading.BoundedSemaphore(10)
+
+        self.assertEqual(queue.recover(), 2)
+        submitted = [call.args[1] for call in queue._executor.submit.call_args_list]
+        self.assertEqual(submitted, [queued.pk, abandoned.pk])
+
+        # Jobs already waiting on this pool are not submitted twice
+        self.assertEqual(queue.recover(), 0)
+
+
+class TranscriptionCacheTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def test_memory_tier_is_bounded_and_backed_by_disk(self):
+        cache = TranscriptionCache(memory_items=1, directory=self.directory)
+        cache.set('a', 'first')
+        cache.set('b', 'second')
+
+        self.assertEqual(cache.get('b'), 'second')
+        self.assertEqual(cache.get('a'), 'first')
+        self.assertIsNone(cache.get('c'))
+        self.assertEqual(cache.stats()['memory_hits'], 1)
+        self.assertEqual(cache.stats()['disk_hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_disk_tier_evicts_least_recently_used(self):
+        cache = TranscriptionCache(memory_items=0, directory=self.directory, max_bytes=250)
+        for index, key in enumerate('abc'):
+            cache.set(key, 'x' * 100)
+            os.utime(self.directory / f'{key}.txt', (index, index))
+
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('c'))
+
+    @patch('food_tracking.backends.openai_clients.get_client')
+    def test_duplicate_audio_skips_whisper(self, get_client):
+        get_client.return_value.audio.transcriptions.create.return_value = 'two eggs'
+        audio = self.directory / 'clip.m4a'
+        audio.write_bytes(b'same-audio')
+
+        with patch('food_tracking.views.transcription_cache', TranscriptionCache(directory=self.directory)):
+            self.assertEqual(transcribe_audio_whisper(str(audio)), 'two eggs')
+            self.assertEqual(transcribe_audio_whisper(str(audio)), 'two eggs')
+
+        self.assertEqual(get_client.return_value.audio.transcriptions.create.call_count, 1)
+
+
+class AudioPreprocessingTests(TestCase):
+    def make_clip(self, speech_ms, silence_ms=1000):
+        silence = AudioSegment.silent(duration=silence_ms, frame_rate=44100)
+        speech = Sine(300, sample_rate=44100).to_audio_segment(duration=speech_ms, volume=-10)
+        clip = (silence + speech + silence).set_channels(2)
+        output = BytesIO()
+        clip.export(output, format='wav')
+        return output.getvalue()
+
+    @override_settings(AUDIO_SILENCE_PADDING_MS=100)
+    def test_downmixes_resamples_and_trims_silence(self):
+        processed = preprocess_audio(self.make_clip(2000), 'clip.wav', format='wav')
+        segment = AudioSegment.from_file(BytesIO(processed.data), format='wav')
+
+        self.assertEqual(segment.channels, 1)
+        self.assertEqual(segment.frame_rate, 16000)
+        self.assertEqual(processed.original_duration_ms, 4000)
+        self.assertAlmostEqual(processed.duration_ms, 2200, delta=30)
+        self.assertLess(len(processed.data), processed.original_bytes)
+
+    @override_settings(AUDIO_MAX_DURATION=1)
+    def test_caps_duration(self):
+        processed = preprocess_audio(self.make_clip(5000, silence_ms=0), 'clip.wav', format='wav')
+        self.assertEqual(processed.duration_ms, 1000)
+
+    def test_undecodable_audio_is_uploaded_unchanged(self):
+        with patch('food_tracking.audio.AudioSegment.from_file', side_effect=Exception('no decoder')):
+            name, upload = prepare_upload(BytesIO(b'raw-m4a'), 'clip.m4a')
+        self.assertEqual((name, upload.read()), ('clip.m4a', b'raw-m4a'))
+
+    @override_settings(AUDIO_PREPROCESS_ENABLED=False)
+    def test_can_be_disabled(self):
+        clip = BytesIO(self.make_clip(500))
+        self.assertEqual(prepare_upload(clip, 'clip.wav'), ('clip.wav', clip))
+
+
+class NutritionResolverTests(TestCase):
+    def setUp(self):
+        food_search_index.invalidate()
+        self.banana = FoodItem.objects.create(
+            name='Banana', calories_per_100g=89, protein_per_100g='1.1', carbs_per_100g=23, fat_per_100g='0.3'
+        )
+        FoodItem.objects.create(name='Steak', calories_per_100g=271, protein_per_100g=25, fat_per_100g=19)
+        FoodItem.objects.create(name='Salmon', calories_per_100g=208, protein_per_100g=25, fat_per_100g=12)
+
+    def test_macros_are_computed_from_food_items(self):
+        data = resolve_food_data({'meal': 'breakfast', 'items': [
+            {'name': 'bananas', 'quantity': 2, 'unit': 'pieces', 'estimated_weight_g': 236, 'estimated_calories': 999},
+            {'name': 'grilled salmon', 'quantity': 150, 'unit': 'grams'},
+        ]})
+
+        banana, salmon = data['items']
+        self.assertEqual(banana['food_item'], self.banana.pk)
+        self.assertEqual(banana['estimated_calories'], 210.0)
+        self.assertEqual(salmon['matched_name'], 'Salmon')
+        self.assertEqual(salmon['macros'], {'protein_g': 37.5, 'carbs_g': 0.0, 'fat_g': 18.0})
+        self.assertEqual(data['food'], 'Banana, Salmon')
+        self.assertEqual(data['calories'], 522.0)
+        self.assertEqual(data['details']['protein'], 40.1)
+
+    def test_unmatched_items_keep_model_estimate(self):
+        data = resolve_food_data({'meal': 'unknown', 'items': [
+            {'name': 'tea', 'quantity': 1, 'unit': 'cup', 'estimated_calories': 30,
+             'macros': {'protein_g': 1, 'carbs_g': 5.5, 'fat_g': 1}},
+        ]})
+
+        item = data['items'][0]
+        self.assertEqual(item['source'], 'model')
+        self.assertIsNone(item['food_item'])
+        self.assertEqual(item['estimated_weight_g'], 240.0)
+        self.assertEqual(data['calories'], 30.0)
+        self.assertEqual(data['details'], {'protein': 1.0, 'carbs': 5.5, 'fat': 1.0})
+        self.assertEqual(data['meal'], 'snack')
+
+    def test_last_word_must_match_a_whole_word(self):
+        FoodItem.objects.create(name='Eggplant', calories_per_100g=25)
+        FoodItem.objects.create(name='Peanut butter', calories_per_100g=588)
+        food_search_index.invalidate()
+
+        data = resolve_food_data({'meal': 'lunch', 'items': [
+            {'name': 'egg', 'quantity': 1, 'unit': 'pieces', 'estimated_calories': 70},
+            {'name': 'pea', 'quantity': 50, 'unit': 'grams', 'estimated_calories': 40},
+            {'name': 'peanut butter', 'quantity': 1, 'unit': 'tbsp'},
+        ]})
+
+        egg, pea, peanut_butter = data['items']
+        self.assertEqual(egg['source'], 'model')
+        self.assertEqual(pea['source'], 'model')
+        self.assertEqual(peanut_butter['matched_name'], 'Peanut butter')
+
+
+class LocalFoodExtractorTests(TestCase):
+    def setUp(self):
+        for name, calories in [('Cheddar Cheese', 403), ('Brown Rice', 111), ('Eggs', 155), ('Milk (2%)', 50)]:
+            FoodItem.objects.create(name=name, calories_per_100g=calories)
+        local_food_extractor.invalidate()
+        food_search_index.invalidate()
+
+    def test_parses_amounts_and_meal(self):
+        data = local_food_extractor.extract('Two slices of cheddar cheese and half a cup of rice for lunch')
+
+        self.assertEqual(data['meal'], 'lunch')
+        self.assertEqual(data['items'], [
+            {'name': 'Cheddar Cheese', 'quantity': 2, 'unit': 'slices'},
+            {'name': 'Brown Rice', 'quantity': 0.5, 'unit': 'cup'},
+        ])
+        self.assertEqual(data['confidence'], 1.0)
+
+    def test_matches_plurals_and_mass_units(self):
+        data = local_food_extractor.extract('an egg and 200g of milk')
+        self.assertEqual(data['items'], [
+            {'name': 'Eggs', 'quantity': 1, 'unit': 'pieces'},
+            {'name': 'Milk (2%)', 'quantity': 200, 'unit': 'g'},
+        ])
+
+    def test_unknown_words_lower_confidence(self):
+        data = local_food_extractor.extract('eggs with grilled asparagus and hollandaise')
+        self.assertLess(data['confidence'], 0.5)
+        self.assertIsNone(local_food_extractor.extract('a cup of coffee'))
+
+    @patch('food_tracking.views.extract_food_data_with_gpt')
+    @patch('food_tracking.views.transcribe_audio_stream', return_value='3 eggs for breakfast')
+    def test_confident_transcripts_skip_chatgpt(self, transcribe, extract):
+        audio = SimpleUploadedFile('clip.m4a', b'fake-audio', content_type='audio/m4a')
+        data = self.client.post('/api/process-audio/', {'file': audio}).json()
+
+        self.assertEqual(data['food'], 'Eggs')
+        self.assertEqual(data['meal'], 'breakfast')
+        # 3 x 50 g, not 3 default 100 g servings
+        self.assertEqual(data['items'][0]['estimated_weight_g'], 150.0)
+        self.assertEqual(data['calories'], 232.5)
+        extract.assert_not_called()
+
+    def test_counts_of_foods_without_piece_weight_are_not_confident(self):
+        FoodItem.objects.create(name='Dumplings', calories_per_100g=220)
+        local_food_extractor.invalidate()
+
+        data = local_food_extractor.extract('3 dumplings for dinner')
+        self.assertEqual(data['items'], [{'name': 'Dumplings', 'quantity': 3, 'unit': 'pieces'}])
+        self.assertLess(data['confidence'], settings.LOCAL_EXTRACTION_MIN_CONFIDENCE)
+
+
+class FoodDataStreamParserTests(TestCase):
+    def test_items_are_emitted_as_they_close(self):
+        reply = '```json\n{"meal": "lunch", "note": "a } \\" {", "items": [{"name": "rice", "macros": {"protein_g": 2}}, {"name": "dal"}]}\n```'
+        parser = FoodDataStreamParser()
+
+        emitted = [[item['name'] for item in parser.feed(reply[i:i + 5])] for i in range(0, len(reply), 5)]
+
+        names = [name for batch in emitted for name in batch]
+        self.assertEqual(names, ['rice', 'dal'])
+        self.assertEqual(sum(1 for batch in emitted if batch), 2)
+        self.assertEqual(parser.result()['meal'], 'lunch')
+
+    def test_incomplete_reply_has_no_result(self):
+        parser = FoodDataStreamParser()
+        parser.feed('{"items": [{"name": "rice"}')
+        self.assertIsNone(parser.result())
+
+
+class ProcessAudioStreamTests(TestCase):
+    def parse_events(self, body):
+        events = []
+        for block in body.strip().split('\n\n'):
+            lines = dict(line.split(': ', 1) for line in block.splitlines())
+            events.append((lines['event'], json.loads(lines['data'])))
+        return events
+
+    @patch('food_tracking.backends.openai_clients.acall', new_callable=AsyncMock)
+    @patch('food_tracking.views.async_transcribe_audio_whisper', new_callable=AsyncMock)
+    async def test_streams_transcription_items_and_totals(self, transcribe, acall):
+        transcribe.return_value = 'a bowl of dal and rice'
+        reply = json.dumps({'meal': 'dinner', 'items': [
+            {'name': 'dal', 'quantity': 1, 'unit': 'bowl', 'estimated_calories': 180},
+            {'name': 'rice', 'quantity': 1, 'unit': 'cup', 'estimated_calories': 200},
+        ]})
+
+        async def stream():
+            for start in range(0, len(reply), 10):
+                yield Mock(choices=[Mock(delta=Mock(content=reply[start:start + 10]))])
+
+        acall.return_value = stream()
+        audio = SimpleUploadedFile('clip.m4a', b'fake-audio', content_type='audio/m4a')
+
+        with override_settings(EXTRACTION_CACHE_PATH=''):
+            response = await self.async_client.post('/api/process-audio/stream/', {'file': audio})
+            body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = self.parse_events(body)
+        self.assertEqual([event for event, _ in events], ['accepted', 'transcription', 'item', 'item', 'done'])
+        self.assertEqual(events[1][1]['transcription'], 'a bowl of dal and rice')
+        self.assertEqual(events[2][1]['name'], 'dal')
+        self.assertEqual(events[-1][1]['calories'], 380.0)
+        self.assertEqual(events[-1][1]['meal'], 'dinner')
+
+
+class MicroBatcherTests(TestCase):
+    def test_calls_within_window_share_one_batch(self):
+        handler = Mock(side_effect=lambda items: [item.upper() for item in items])
+        batcher = MicroBatcher(handler, window=0.05, max_size=10)
+
+        futures = [batcher.submit(item) for item in ['egg', 'rice', 'egg']]
+
+        self.assertEqual([future.result(timeout=1) for future in futures], ['EGG', 'RICE', 'EGG'])
+        handler.assert_called_once_with(['egg', 'rice'])
+
+    def test_full_batch_is_sent_without_waiting(self):
+        handler = Mock(side_effect=lambda items: items)
+        batcher = MicroBatcher(handler, window=60, max_size=2)
+
+        futures = [batcher.submit('a'), batcher.submit('b')]
+
+        self.assertEqual([future.result(timeout=1) for future in futures], ['a', 'b'])
+
+    def test_handler_errors_reach_every_caller(self):
+        batcher = MicroBatcher(Mock(side_effect=CircuitOpenError('open')), window=0.01)
+        future = batcher.submit('a')
+        with self.assertRaises(CircuitOpenError):
+            future.result(timeout=1)
+
+    @override_settings(EXTRACTION_BATCH_ENABLED=True, EXTRACTION_CACHE_PATH='', OPENAI_API_KEY='test')
+    @patch('food_tracking.backends.openai_clients.get_client')
+    def test_concurrent_extractions_are_sent_as_one_request(self, get_client):
+        create = get_client.return_value.chat.completions.create
+        create.return_value.choices = [Mock(message=Mock(content=json.dumps({'results': [
+            {'meal': 'lunch', 'items': [{'name': 'tofu', 'estimated_calories': 150}]},
+            {'meal': 'dinner', 'items': [{'name': 'kale', 'estimated_calories': 30}]},
+        ]})))]
+
+        with patch('food_tracking.views.extraction_batcher', MicroBatcher(request_food_extraction_batch, window=0.2)):
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                first, second = pool.map(extract_food_data_with_gpt, ['tofu for lunch', 'kale for dinner'])
+
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual((first['food'], first['meal']), ('tofu', 'lunch'))
+        self.assertEqual((second['food'], second['meal']), ('kale', 'dinner'))
+
+
+@override_settings(EXTRACTION_CACHE_PATH='', OPENAI_API_KEY='test')
+class FoodExtractionRequestTests(TestCase):
+    def setUp(self):
+        FoodItem.objects.create(name='Eggs', calories_per_100g=155, protein_per_100g=13, fat_per_100g=11)
+        FoodItem.objects.create(name='Bacon', calories_per_100g=541, protein_per_100g=37, fat_per_100g=42)
+        food_search_index.invalidate()
+
+    def reply(self, content):
+        return Mock(choices=[Mock(message=Mock(content=json.dumps(content, separators=(',', ':'))))])
+
+    @patch('food_tracking.backends.openai_clients.get_client')
+    def test_five_item_meal_fits_and_unknown_foods_are_estimated(self, get_client):
+        extraction = {'meal': 'breakfast', 'items': [
+            {'name': 'eggs', 'quantity': 2, 'unit': 'pieces', 'estimated_weight_g': 100},
+            {'name': 'toast', 'quantity': 2, 'unit': 'slices', 'estimated_weight_g': 60},
+            {'name': 'bacon', 'quantity': 3, 'unit': 'slices', 'estimated_weight_g': 30},
+            {'name': 'hash browns', 'quantity': 1, 'unit': 'cup', 'estimated_weight_g': 150},
+            {'name': 'orange juice', 'quantity': 1, 'unit': 'glass', 'estimated_weight_g': 250},
+        ]}
+        estimates = {'items': [
+            {'calories': 160, 'protein_g': 5, 'carbs_g': 30, 'fat_g': 2},
+            {'calories': 280, 'protein_g': 3, 'carbs_g': 35, 'fat_g': 15},
+            {'calories': 110, 'protein_g': 2, 'carbs_g': 26, 'fat_g': 0.5},
+        ]}
+        create = get_client.return_value.chat.completions.create
+        create.side_effect = [self.reply(extraction), self.reply(estimates)]
+
+        data = extract_food_data_with_gpt(
+            'two eggs, toast, bacon, hash browns and orange juice for breakfast'
+        )
+
+        self.assertEqual(len(data['items']), 5)
+        self.assertEqual(data['calories'], 155 + 160 + 162.3 + 280 + 110)
+        self.assertEqual(data['details']['carbs'], 91.0)
+
+        extraction_call, nutrition_call = create.call_args_list
+        # At least one token per three characters of the compact reply
+        reply_length = len(json.dumps(extraction, separators=(',', ':')))
+        self.assertGreaterEqual(extraction_call.kwargs['max_tokens'], reply_length / 3)
+        self.assertNotIn('macros', extraction_call.kwargs['messages'][0]['content'])
+        self.assertEqual(
+            nutrition_call.kwargs['messages'][-1]['content'],
+            'Foods:\n1. toast, 60.0 g\n2. hash browns, 150.0 g\n3. orange juice, 250.0 g',
+        )
+        self.assertLess(nutrition_call.kwargs['max_tokens'], extraction_call.kwargs['max_tokens'])
+
+
+class ExtractionCacheTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / 'extractions.sqlite3'
+
+    def test_key_ignores_case_punctuation_and_number_words(self):
+        first = ExtractionCache.make_key('Two eggs, and a coffee!', 'gpt', 'prompt')
+        second = ExtractionCache.make_key('2 eggs and a   coffee', 'gpt', 'prompt')
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, ExtractionCache.make_key('2 eggs and a coffee', 'gpt', 'other prompt'))
+
+    def test_entries_expire_and_least_recently_used_are_evicted(self):
+        cache = ExtractionCache(path=self.path, ttl=60, max_entries=2)
+        cache.set('a', {'meal': 'breakfast'})
+        cache.set('b', {'meal': 'lunch'})
+        self.assertEqual(cache.get('a'), {'meal': 'breakfast'})
+        cache.set('c', {'meal': 'dinner'})
+        self.assertIsNone(cache.get('b'))
+
+        with patch('food_tracking.caches.time.time', return_value=time.time() + 120):
+            self.assertIsNone(cache.get('a'))
+
+    @patch('food_tracking.backends.openai_clients.get_client')
+    def test_repeated_phrase_skips_chatgpt(self, get_client):
+        create = get_client.return_value.chat.completions.create
+        create.return_value.choices = [Mock(message=Mock(content='{"meal": "breakfast", "items": []}'))]
+
+        with patch('food_tracking.views.extraction_cache', ExtractionCache(path=self.path)):
+            first = extract_food_data_with_gpt('I had two eggs for breakfast')
+            second = extract_food_data_with_gpt('i had 2 eggs for breakfast.')
+
+        self.assertEqual(first, second)
+        self.assertEqual(create.call_count, 1)
+
+
+@override_settings(OPENAI_MAX_RETRIES=2, OPENAI_BACKOFF_BASE=0)
+class OpenAIClientManagerTests(TestCase):
+    def setUp(self):
+        self.manager = OpenAIClientManager()
+        self.manager.breakers['chat'] = CircuitBreaker('chat', failure_threshold=3, reset_timeout=60)
+        patcher = patch.object(self.manager, 'get_client')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def failing_request(self):
+        return Mock(side_effect=openai.APIConnectionError(request=httpx.Request('POST', 'http://test')))
+
+    def test_retries_transient_errors_then_succeeds(self):
+        request = Mock(side_effect=[
+            openai.APIConnectionError(request=httpx.Request('POST', 'http://test')),
+            'ok',
+        ])
+        self.assertEqual(self.manager.call('chat', request), 'ok')
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(self.manager.breakers['chat'].state, 'closed')
+
+    def test_circuit_opens_and_fails_fast(self):
+        request = self.failing_request()
+        with self.assertRaises(openai.APIConnectionError):
+            self.manager.call('chat', request)
+        self.assertEqual(request.call_count, 3)
+        self.assertEqual(self.manager.breakers['chat'].state, 'open')
+
+        with self.assertRaises(CircuitOpenError):
+            self.manager.call('chat', request)
+        self.assertEqual(request.call_count, 3)
+
+    async def test_cancelled_half_open_trial_releases_the_circuit(self):
+        breaker = self.manager.breakers['chat']
+        for _ in range(3):
+            breaker.record_failure()
+        breaker._opened_at -= breaker.reset_timeout
+        self.assertEqual(breaker.state, 'half-open')
+
+        async def hang(client):
+            await asyncio.Event().wait()
+
+        with patch.object(self.manager, 'get_async_client'):
+            task = asyncio.create_task(self.manager.acall('chat', hang))
+            await asyncio.sleep(0)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+            self.assertTrue(breaker.allow())
+
+    def test_cancelled_call_that_was_not_the_trial_keeps_the_trial(self):
+        breaker = self.manager.breakers['chat']
+        permit = breaker.allow()
+        for _ in range(3):
+            breaker.record_failure()
+        breaker._opened_at -= breaker.reset_timeout
+        self.assertTrue(breaker.allow())
+
+        # A call let through while the circuit was closed is cancelled
+        breaker.release_trial(permit)
+
+        self.assertFalse(breaker.allow())
+
+    def test_extraction_falls_back_while_circuit_is_open(self):
+        with patch('food_tracking.backends.openai_clients', self.manager), \
+                patch('food_tracking.views.extraction_cache', ExtractionCache(path='')):
+            with self.assertRaises(openai.APIConnectionError):
+                self.manager.call('chat', self.failing_request())
+            data = extract_food_data_with_gpt('a banana for breakfast')
+
+        self.assertEqual(data['food'], 'fruit')
+        self.assertEqual(self.manager.get_client.call_count, 3)
+
+
+@override_settings(
+    TRANSCRIPTION_BACKEND='food_tracking.backends.StandInTranscriptionBackend',
+    EXTRACTION_BACKEND='food_tracking.backends.StandInExtractionBackend',
+    TRANSCRIPTION_CACHE_MEMORY_ITEMS=0,
+    TRANSCRIPTION_CACHE_DIR='',
+    EXTRACTION_CACHE_PATH='',
+)
+class StandInBackendTests(TestCase):
+    def setUp(self):
+        for name, calories in [('Banana', 89), ('Pizza', 266), ('Apple', 52)]:
+            FoodItem.objects.create(name=name, calories_per_100g=calories)
+        local_food_extractor.invalidate()
+        food_search_index.invalidate()
+
+    def post(self):
+        audio = SimpleUploadedFile('clip.m4a', b'fake-audio', content_type='audio/m4a')
+        return self.client.post('/api/process-audio/', {'file': audio})
+
+    def test_pipeline_runs_offline(self):
+        response = self.post()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(response.json()['transcription'], STAND_IN_TRANSCRIPTIONS)
+        self.assertEqual(self.post().json()['transcription'], response.json()['transcription'])
+
+    @override_settings(STAND_IN_ERROR_RATE=1)
+    def test_transcription_failure_is_reported(self):
+        response = self.post()
+
+        self.assertEqual(response.status_code, 502)
+        self.assertIn('Transcription failed', response.json()['error'])
+
+    def test_answers_batched_prompts(self):
+        messages = food_extraction_batch_messages(['two slices of pizza for lunch', 'an apple'])
+        reply = json.loads(StandInExtractionBackend().complete(messages, 300))
+
+        self.assertEqual([result['items'][0]['name'] for result in reply['results']], ['Pizza', 'Apple'])
+        self.assertEqual(reply['results'][0]['items'][0]['quantity'], 2)
+        self.assertEqual(reply['results'][0]['meal'], 'lunch')
+
+
+class RequestTimingTests(TestCase):
+    def setUp(self):
+        self.rice = FoodItem.objects.create(name='Rice', calories_per_100g=130)
+        for _ in range(3):
+            CalorieEntry.objects.create(food_item=self.rice, quantity_grams=100)
+
+    def test_server_timing_header(self):
+        response = self.client.get('/api/entries/')
+
+        timing = response['Server-Timing']
+        self.assertIn('db;dur=', timing)
+        self.assertIn(f'desc="{response.metrics.queries} queries"', timing)
+        self.assertIn('total;dur=', timing)
+
+    @override_settings(
+        TRANSCRIPTION_BACKEND='food_tracking.backends.StandInTranscriptionBackend',
+        EXTRACTION_BACKEND='food_tracking.backends.StandInExtractionBackend',
+        TRANSCRIPTION_CACHE_MEMORY_ITEMS=0,
+        TRANSCRIPTION_CACHE_DIR='',
+        EXTRACTION_CACHE_PATH='',
+        LOCAL_EXTRACTION_MIN_CONFIDENCE=2,
+    )
+    def test_external_calls_are_timed_separately(self):
+        audio = SimpleUploadedFile('clip.m4a', b'fake-audio', content_type='audio/m4a')
+        response = self.client.post('/api/process-audio/', {'file': audio})
+
+        self.assertEqual(set(response.metrics.external), {'whisper', 'gpt'})
+        self.assertIn('whisper;dur=', response['Server-Timing'])
+
+    def test_repeated_query_shapes_are_flagged(self):
+        with collect_metrics() as metrics:
+            for entry in CalorieEntry.objects.all():
+                entry.food_item.name
+            FoodItem.objects.filter(pk__in=[1, 2]).count()
+            FoodItem.objects.filter(pk__in=[1, 2, 3]).count()
+
+        repeated = metrics.repeated_queries(threshold=2)
+        self.assertEqual(len(repeated), 2)
+        self.assertEqual(repeated[0][1], 3)
+        self.assertIn('IN (...)', repeated[1][0])
+
+    def test_query_budget(self):
+        with query_budget(max_queries=1):
+            self.client.get('/api/entries/')
+        with query_budget(max_queries=2):
+            self.client.get('/api/food-items/', {'search': 'rice'})
+
+        with self.assertRaisesMessage(AssertionError, 'possible N+1'):
+            with override_settings(N_PLUS_ONE_THRESHOLD=3), query_budget(max_queries=10):
+                for entry in CalorieEntry.objects.all():
+                    entry.food_item.name
+
+
+def spin(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class ProfilingTests(TestCase):
+    def test_middleware_is_removed_when_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: None)
+
+    def test_sampler_aggregates_stacks(self):
+        profiler = SamplingProfiler(interval=0.001)
+        with profiler.profile():
+            spin(0.05)
+
+        self.assertGreater(profiler.samples, 0)
+        stack = profiler.report().splitlines()[0].rsplit(' ', 1)[0]
+        self.assertTrue(stack.endswith('food_tracking.tests.spin'))
+
+    @override_settings(PROFILING_SECRET='s3cret', PROFILING_MODE='cprofile')
+    def test_token_profiles_request_and_guards_report(self):
+        profiler = get_profiler('cprofile')
+        profiler.reset()
+        self.client.get('/api/goals/')
+        self.client.get('/api/goals/', headers={'X-Profile-Token': 's3cret'})
+
+        self.assertEqual(self.client.get('/api/internal/profile/').status_code, 403)
+        response = self.client.get(
+            '/api/internal/profile/?reset=true', headers={'X-Profile-Token': 's3cret'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Profile-Requests'], '1')
+        self.assertIn('get_object', response.content.decode())
+        self.assertEqual(profiler.profiles, 0)
+
+
+def count_fallback():
+    FALLBACKS.inc(source='keywords')
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(METRICS_DIR=directory.name, METRICS_TOKEN='scrape-secret')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        registry.reset()
+        self.addCleanup(registry.reset)
+        self.directory = directory.name
+
+    def test_requests_are_counted_and_exposed(self):
+        self.client.get('/api/goals/')
+        self.client.get('/api/goals/')
+
+        self.assertEqual(registry.value('http_requests', view='daily_goals', method='GET', status=200), 2)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_requests_total{view="daily_goals",method="GET",status="200"} 2', body)
+        self.assertIn('http_request_duration_seconds_bucket{view="daily_goals",method="GET",le="+Inf"} 2', body)
+        self.assertIn('http_request_duration_seconds_count{view="daily_goals",method="GET"} 2', body)
+
+    def test_endpoint_requires_the_token(self):
+        # A request forwarded by a proxy on the same host comes from loopback too
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        with override_settings(METRICS_ALLOWED_IPS=['10.0.0.1']):
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret')
+            self.assertEqual(response.status_code, 403)
+        with override_settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    def test_values_are_summed_across_processes(self):
+        count_fallback()
+        child = multiprocessing.get_context('fork').Process(target=count_fallback)
+        child.start()
+        child.join()
+
+        self.assertEqual(child.exitcode, 0)
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+        self.assertEqual(registry.value('food_extraction_fallbacks', source='keywords'), 2)
+
+        values = MmapValues(os.path.join(self.directory, 'grow.db'), initial_size=64)
+        for i in range(100):
+            values.set(f'key-{i}', i)
+        self.assertEqual(dict(MmapValues.read(values.path))['key-99'], 99)
+
+    def test_clear_drops_every_process_file(self):
+        count_fallback()
+        child = multiprocessing.get_context('fork').Process(target=count_fallback)
+        child.start()
+        child.join()
+
+        registry.clear()
+
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertEqual(registry.value('food_extraction_fallbacks', source='keywords'), 0)
+
+    def test_fallbacks_and_cache_lookups_are_counted(self):
+        local_food_extractor.invalidate()
+        food_search_index.invalidate()
+        create_fallback_food_data('I ate a sandwich')
+        cache = ExtractionCache(path=os.path.join(self.directory, 'extractions.sqlite3'))
+        cache.get('two eggs')
+
+        self.assertEqual(registry.value('food_extraction_fallbacks', source='keywords'), 1)
+        self.assertEqual(registry.value('cache_lookups', cache='extraction', result='miss'), 1)
+
+
+class FoodCatalogImportTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_csv_is_upserted_on_normalized_name(self):
+        apple = FoodItem.objects.create(name='Apple', calories_per_100g=40)
+        path = os.path.join(self.directory, 'foods.csv')
+        with open(path, 'w') as catalog:
+            catalog.write(
+                'Description,Energy (kcal),Protein,Total Fat\n'
+                'APPLE ,52,0.3,0.2\n'
+                'Pear,57,0.4,0.1\n'
+                'pear,58,0.4,0.1\n'
+                'Mystery,,1,1\n'
+            )
+
+        stats = import_food_items(read_catalog(path), batch_size=2)
+
+        self.assertEqual((stats.read, stats.invalid, stats.duplicates, stats.created), (4, 1, 0, 1))
+        apple.refresh_from_db()
+        self.assertEqual(apple.name, 'APPLE')
+        self.assertEqual(apple.calories_per_100g, Decimal('52.00'))
+        self.assertEqual(FoodItem.objects.get(normalized_name='pear').calories_per_100g, Decimal('58.00'))
+        self.assertEqual(FoodItem.objects.count(), 2)
+
+    def test_json_export_is_streamed(self):
+        foods = [
+            {
+                'description': f'Food {index}',
+                'foodNutrients': [
+                    {'nutrient': {'number': '208'}, 'amount': 100 + index},
+                    {'nutrient': {'number': '203'}, 'amount': 2.5},
+                ],
+            }
+            for index in range(50)
+        ]
+        stream = StringIO(json.dumps({'FoundationFoods': foods}))
+
+        records = list(read_json(stream, chunk_size=64))
+        stats = import_food_items(records, update=False)
+
+        self.assertEqual(len(records), 50)
+        self.assertEqual(stats.created, 50)
+        food_item = FoodItem.objects.get(name='Food 7')
+        self.assertEqual((food_item.calories_per_100g, food_item.protein_per_100g), (107, Decimal('2.5')))
+
+    def test_populate_food_db_is_idempotent(self):
+        call_command('populate_food_db', stdout=StringIO())
+        output = StringIO()
+        call_command('populate_food_db', stdout=output)
+
+        self.assertEqual(FoodItem.objects.count(), 18)
+        self.assertIn('0 created, 18 already existed', output.getvalue())
+
+
+class SyntheticEntryTests(TestCase):
+    def test_command_generates_entries_matching_their_foods(self):
+        output = StringIO()
+        call_command(
+            'generate_entries', '--days', '10', '--entries-per-day', '8', '--foods', '20',
+            '--meal-mix', 'lunch=3,dinner=1', '--engine', 'python', '--batch-size', '16', stdout=output,
+        )
+
+        entries = list(CalorieEntry.objects.select_related('food_item'))
+        self.assertGreater(len(entries), 40)
+        self.assertEqual({entry.meal_type for entry in entries}, {'lunch', 'dinner'})
+        for entry in entries[:20]:
+            expected = CalorieEntry(food_item=entry.food_item, quantity_grams=entry.quantity_grams)
+            expected.calculate_nutrition()
+            self.assertEqual(entry.calories, expected.calories.quantize(Decimal('0.01')))
+            self.assertEqual(entry.fat, expected.fat.quantize(Decimal('0.01')))
+        self.assertEqual(verify_daily_summaries(), [])
+        self.assertIn(f'{len(entries):,} entries', output.getvalue())
+
+    @skipIf(np is None, 'NumPy is not installed')
+    def test_numpy_engine_follows_the_distributions(self):
+        FoodItem.objects.create(name='Rice', calories_per_100g=130)
+        FoodItem.objects.create(name='Beans', calories_per_100g=347)
+        generator = EntryGenerator(
+            load_foods(), last_day=datetime(2025, 1, 31).date(), days=31, entries_per_day=100,
+            meal_mix=parse_meal_mix('breakfast=1,snack=1'), food_skew=2, engine='numpy',
+        )
+
+        rows = [row for chunk in generator.chunks(500) for row in chunk]
+
+        self.assertAlmostEqual(len(rows) / 3100, 1, delta=0.1)
+        self.assertEqual({row[6] for row in rows}, {'breakfast', 'snack'})
+        rice = sum(1 for row in rows if row[0] == FoodItem.objects.get(name='Rice').id)
+        self.assertAlmostEqual(rice / len(rows), 0.8, delta=0.05)
+        self.assertTrue(all(5 <= row[1] <= 1000 for row in rows))
+
+
+class DatabaseTuningTests(TestCase):
+    def test_pragmas_are_applied_to_new_connections(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            busy_timeout = cursor.fetchone()[0]
+            cursor.execute('PRAGMA cache_size')
+            cache_size = cursor.fetchone()[0]
+
+        self.assertEqual(busy_timeout, settings.SQLITE_PRAGMAS['busy_timeout'])
+        self.assertEqual(cache_size, settings.SQLITE_PRAGMAS['cache_size'])
+
+    def test_middleware_routes_read_only_views_to_replica(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ReadReplicaMiddleware(lambda request: None)
+
+        router = ReadReplicaRouter()
+        seen = []
+        with patch.dict(settings.DATABASES, {'replica': {}}):
+            middleware = ReadReplicaMiddleware(lambda request: seen.append(router.db_for_read(FoodItem)))
+        factory = RequestFactory()
+        middleware(factory.get('/api/food-items/'))
+        middleware(factory.get('/api/goals/'))
+        middleware(factory.post('/api/entries/'))
+
+        self.assertEqual(seen, ['replica', 'default', 'default'])
+        self.assertEqual(router.db_for_write(FoodItem), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'food_tracking'))
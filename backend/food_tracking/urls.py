@@ -5,8 +5,14 @@ urlpatterns = [
     path('', views.health_check, name='health_check'),
     path('food-items/', views.FoodItemListView.as_view(), name='food_items'),
     path('entries/', views.CalorieEntryListCreateView.as_view(), name='calorie_entries'),
+    path('entries/bulk/', views.bulk_create_entries_view, name='calorie_entries_bulk'),
     path('entries/<int:pk>/', views.CalorieEntryDetailView.as_view(), name='calorie_entry_detail'),
     path('summary/', views.daily_summary_view, name='daily_summary'),
+    path('summary/range/', views.summary_range_view, name='summary_range'),
     path('goals/', views.DailyGoalDetailView.as_view(), name='daily_goals'),
     path('process-audio/', views.process_audio_view, name='process_audio'),
+    path('process-audio/async/', views.process_audio_async_view, name='process_audio_async'),
+    path('process-audio/stream/', views.process_audio_stream_view, name='process_audio_stream'),
+    path('process-audio/<uuid:job_id>/', views.AudioJobDetailView.as_view(), name='audio_job_detail'),
+    path('internal/profile/', views.profile_report_view, name='profile_report'),
 ]
@@ -1,47 +1,86 @@
-from datetime import date
-from django.db.models import Sum
+from datetime import date, timedelta
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
 from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from rest_framework import status, generics
 from rest_framework.decorators import api_view
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-import tempfile
+import asyncio
 import os
-import json
-import openai
-import re
-from pydub import AudioSegment
-from .models import FoodItem, CalorieEntry, DailyGoal
-from .serializers import FoodItemSerializer, CalorieEntrySerializer, DailyGoalSerializer
+from .models import FoodItem, CalorieEntry, DailyGoal, DailySummary, AudioJob
+from .serializers import (
+    FoodItemSerializer, CalorieEntrySerializer, CalorieEntryBulkItemSerializer, DailyGoalSerializer,
+    AudioJobSerializer
+)
+from .audio import UploadTooLarge, prepare_upload
+from .backends import TranscriptionError, get_extraction_backend, get_transcription_backend
+from .batching import MicroBatcher
+from .caches import extraction_cache, hash_stream, normalize_transcript, transcription_cache
+from .extractor import (
+    FILLER_WORDS, MEAL_WORDS, NUMBER_RE, QUANTITY_WORDS, UNIT_WORDS, local_food_extractor
+)
+from .instrumentation import external_call
+from .metrics import FALLBACKS, registry, scrape_token_matches
+from .nutrition import item_weight_grams, match_food_item, resolve_food_data, resolve_item
+from .jobs import QueueFull, audio_job_queue, store_audio_upload
+from .rollups import add_entries
+from .pagination import CreatedAtCursorPagination
+from .profiling import PROFILE_HEADER, PROFILERS, get_profiler, token_matches
+from .search import food_search_index
+from .streaming import FoodDataStreamParser, sse_event
 
 
 class FoodItemListView(generics.ListAPIView):
     """
     List all available food items for searching.
+
+    `?search=` is answered from the in-memory search index, ranked by
+    relevance and capped by `?limit=`.
     """
     queryset = FoodItem.objects.all()
     serializer_class = FoodItemSerializer
     
-    def get_queryset(self):
-        queryset = FoodItem.objects.all()
-        search = self.request.query_params.get('search', None)
-        if search:
-            queryset = queryset.filter(name__icontains=search)
-        return queryset
+    def list(self, request, *args, **kwargs):
+        search = request.query_params.get('search', None)
+        if not search:
+            return super().list(request, *args, **kwargs)
+
+        limit = getattr(settings, 'FOOD_SEARCH_RESULT_LIMIT', 50)
+        max_limit = getattr(settings, 'FOOD_SEARCH_MAX_LIMIT', 200)
+        try:
+            limit = int(request.query_params.get('limit', limit))
+        except ValueError:
+            return Response(
+                {'error': 'limit must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = max(0, min(limit, max_limit))
+        return Response(food_search_index.search(search, limit=limit))
 
 
 class CalorieEntryListCreateView(generics.ListCreateAPIView):
     """
     List calorie entries or create a new one.
+
+    The list is cursor paginated on (created_at, id), newest first.
     """
     queryset = CalorieEntry.objects.all()
     serializer_class = CalorieEntrySerializer
+    pagination_class = CreatedAtCursorPagination
     
     def get_queryset(self):
-        queryset = CalorieEntry.objects.all()
+        queryset = CalorieEntry.objects.select_related('food_item')
         date_filter = self.request.query_params.get('date', None)
         if date_filter:
-            queryset = queryset.filter(created_at__date=date_filter)
-        return queryset.order_by('-created_at')
+            try:
+                queryset = queryset.between_days(date_filter)
+            except ValueError:
+                raise ValidationError({'date': 'Use the YYYY-MM-DD format.'})
+        return queryset.order_by('-created_at', '-id')
 
 
 class CalorieEntryDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -52,58 +91,253 @@ class CalorieEntryDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = CalorieEntrySerializer
 
 
+# Computed nutrients must fit CalorieEntry's DecimalField(max_digits=8, decimal_places=2)
+MAX_ENTRY_NUTRIENT_VALUE = 10 ** 6
+
+
+@api_view(['POST'])
+def bulk_create_entries_view(request):
+    """
+    Create several calorie entries in one request.
+
+    Food items for the whole batch are loaded with one query, nutrients are
+    computed in memory and the valid entries are inserted with a single
+    bulk_create. Invalid items are reported by index and do not prevent the
+    valid ones from being saved.
+    """
+    items = request.data
+    if isinstance(items, dict):
+        items = items.get('entries')
+    if not isinstance(items, list) or not items:
+        return Response(
+            {'error': 'Expected a non-empty list of entries'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    max_items = getattr(settings, 'BULK_ENTRY_MAX_ITEMS', 100)
+    if len(items) > max_items:
+        return Response(
+            {'error': f'At most {max_items} entries can be created at once'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    errors = []
+    valid = []
+    for index, item in enumerate(items):
+        serializer = CalorieEntryBulkItemSerializer(data=item)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors.append({'index': index, 'errors': serializer.errors})
+    
+    food_items = FoodItem.objects.in_bulk({data['food_item'] for _, data in valid})
+    
+    entries = []
+    for index, data in valid:
+        food_item = food_items.get(data['food_item'])
+        if food_item is None:
+            errors.append({
+                'index': index,
+                'errors': {'food_item': [f'Invalid pk "{data["food_item"]}" - object does not exist.']}
+            })
+            continue
+        entry = CalorieEntry(
+            food_item=food_item,
+            quantity_grams=data['quantity_grams'],
+            meal_type=data['meal_type']
+        )
+        entry.calculate_nutrition(food_item)
+        if any(abs(getattr(entry, nutrient)) >= MAX_ENTRY_NUTRIENT_VALUE
+               for nutrient in ('calories', 'protein', 'carbs', 'fat')):
+            errors.append({'index': index, 'errors': {'quantity_grams': ['Quantity is too large.']}})
+            continue
+        entries.append(entry)
+    
+    if entries:
+        with transaction.atomic():
+            created = CalorieEntry.objects.bulk_create(entries)
+            # bulk_create skips the signals that maintain the rollup
+            add_entries(created)
+    else:
+        created = []
+    
+    errors.sort(key=lambda error: error['index'])
+    return Response(
+        {
+            'created': CalorieEntrySerializer(created, many=True).data,
+            'errors': errors
+        },
+        status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST
+    )
+
+
 @api_view(['GET'])
 def daily_summary_view(request):
     """
     Get daily nutrition summary.
+
+    Totals come from the DailySummary rollup; pass `?entries=false` to skip
+    listing the individual entries.
     """
     try:
         today = date.today()
         date_filter = request.query_params.get('date', today)
         
-        # Get today's entries
-        entries = CalorieEntry.objects.filter(created_at__date=date_filter)
-        
-        # Calculate totals
-        totals = entries.aggregate(
-            total_calories=Sum('calories') or 0,
-            total_protein=Sum('protein') or 0,
-            total_carbs=Sum('carbs') or 0,
-            total_fat=Sum('fat') or 0
-        )
-        
         # Get daily goals (first one or create default)
-        goals, created = DailyGoal.objects.get_or_create(
-            defaults={
-                'target_calories': 2000,
-                'target_protein': 150,
-                'target_carbs': 250,
-                'target_fat': 65
-            }
-        )
+        goals = DailyGoal.current()
         goals_data = DailyGoalSerializer(goals).data
         
-        # Group entries by meal type
-        meal_breakdown = {}
-        for meal_type, _ in CalorieEntry._meta.get_field('meal_type').choices:
-            meal_entries = entries.filter(meal_type=meal_type)
-            meal_totals = meal_entries.aggregate(
-                calories=Sum('calories') or 0,
-                protein=Sum('protein') or 0,
-                carbs=Sum('carbs') or 0,
-                fat=Sum('fat') or 0
-            )
-            meal_breakdown[meal_type] = {
-                'totals': meal_totals,
-                'entries': CalorieEntrySerializer(meal_entries, many=True).data
+        # Read overall and per-meal totals from the DailySummary rollup
+        nutrients = ('calories', 'protein', 'carbs', 'fat')
+        totals = {f'total_{nutrient}': None for nutrient in nutrients}
+        meal_breakdown = {
+            meal_type: {
+                'totals': {nutrient: None for nutrient in nutrients},
+                'entries': []
             }
+            for meal_type, _ in CalorieEntry._meta.get_field('meal_type').choices
+        }
+        entries_count = 0
+        summaries = DailySummary.objects.filter(date=date_filter, entries_count__gt=0)
+        for summary in summaries:
+            meal = meal_breakdown[summary.meal_type]
+            for nutrient in nutrients:
+                value = getattr(summary, nutrient)
+                totals[f'total_{nutrient}'] = (totals[f'total_{nutrient}'] or 0) + value
+                meal['totals'][nutrient] = value
+            entries_count += summary.entries_count
+        
+        # Fetch the day's entries once, joined to their food items
+        if entries_count and request.query_params.get('entries') != 'false':
+            entries = (
+                CalorieEntry.objects
+                .between_days(date_filter)
+                .select_related('food_item')
+            )
+            for entry_data in CalorieEntrySerializer(entries, many=True).data:
+                meal_breakdown[entry_data['meal_type']]['entries'].append(entry_data)
         
         return Response({
             'date': date_filter,
             'totals': totals,
             'goals': goals_data,
             'meal_breakdown': meal_breakdown,
-            'entries_count': entries.count()
+            'entries_count': entries_count
+        })
+        
+    except Exception as e:
+        return Response(
+            {'error': str(e)}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+SUMMARY_RANGE_TRUNCATIONS = {
+    'day': TruncDate,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+
+def bucket_start(day, granularity):
+    """
+    Return the first day of the bucket that `day` falls into.
+    """
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket_start(day, granularity):
+    if granularity == 'week':
+        return day + timedelta(days=7)
+    if granularity == 'month':
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+@api_view(['GET'])
+def summary_range_view(request):
+    """
+    Get nutrition totals and goal adherence for a date range, bucketed by
+    day, week or month, using a single grouped query.
+    """
+    granularity = request.query_params.get('granularity', 'day')
+    if granularity not in SUMMARY_RANGE_TRUNCATIONS:
+        return Response(
+            {'error': 'granularity must be one of: day, week, month'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        start = date.fromisoformat(request.query_params['start'])
+        end = date.fromisoformat(request.query_params['end'])
+    except (KeyError, ValueError):
+        return Response(
+            {'error': 'start and end are required as YYYY-MM-DD'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    max_days = getattr(settings, 'SUMMARY_RANGE_MAX_DAYS', 366)
+    if end < start or (end - start).days >= max_days:
+        return Response(
+            {'error': f'end must be on or after start and span at most {max_days} days'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        # Get daily goals (first one or create default)
+        goals = DailyGoal.current()
+        
+        rows = (
+            CalorieEntry.objects
+            .between_days(start, end)
+            .annotate(period=SUMMARY_RANGE_TRUNCATIONS[granularity]('created_at'))
+            .values('period')
+            .annotate(
+                calories=Sum('calories'),
+                protein=Sum('protein'),
+                carbs=Sum('carbs'),
+                fat=Sum('fat'),
+                entries_count=Count('id')
+            )
+            .order_by('period')
+        )
+        totals_by_period = {}
+        for row in rows:
+            period = row.pop('period')
+            if hasattr(period, 'date'):
+                period = period.date()
+            totals_by_period[period] = row
+        
+        nutrients = ('calories', 'protein', 'carbs', 'fat')
+        buckets = []
+        period = bucket_start(start, granularity)
+        while period <= end:
+            following = next_bucket_start(period, granularity)
+            # Goals scale with the number of days of the bucket inside the range
+            days = (min(following, end + timedelta(days=1)) - max(period, start)).days
+            row = totals_by_period.get(period, {})
+            totals = {nutrient: row.get(nutrient) or 0 for nutrient in nutrients}
+            buckets.append({
+                'period': period,
+                'days': days,
+                'totals': totals,
+                'entries_count': row.get('entries_count', 0),
+                'adherence': {
+                    nutrient: round(
+                        float(totals[nutrient]) / (float(getattr(goals, f'target_{nutrient}')) * days), 3
+                    ) if getattr(goals, f'target_{nutrient}') else None
+                    for nutrient in nutrients
+                }
+            })
+            period = following
+        
+        return Response({
+            'start': start,
+            'end': end,
+            'granularity': granularity,
+            'goals': DailyGoalSerializer(goals).data,
+            'buckets': buckets
         })
         
     except Exception as e:
@@ -121,67 +355,129 @@ class DailyGoalDetailView(generics.RetrieveUpdateAPIView):
     
     def get_object(self):
         # Get first goal or create default
-        goal, created = DailyGoal.objects.get_or_create(
-            defaults={
-                'target_calories': 2000,
-                'target_protein': 150,
-                'target_carbs': 250,
-                'target_fat': 65
-            }
-        )
+        goal = DailyGoal.current()
         return goal
 
 
+# Calories and macros are computed locally from FoodItem (see nutrition.py),
+# so the model only has to name the foods and their amounts. Foods missing
+# from the database are estimated in a follow-up call (FOOD_NUTRITION_PROMPT).
+FOOD_EXTRACTION_PROMPT = """
+        You are a nutrition assistant that turns a transcript of what a user ate into JSON.
+        
+        Return an object with:
+        
+        - meal: one of ["breakfast", "lunch", "dinner", "snack", "unknown"]
+        - items: list of foods eaten, each with:
+          - name: standardized food name (e.g., "banana", "paneer")
+          - quantity: number
+          - unit: "grams", "ml", "pieces", "slices", "bowl", "cup", etc.
+          - estimated_weight_g: inferred weight in grams
+        
+        If an amount is vague (like "some rice"), assume a common serving.
+        
+        Return only compact valid JSON.
+        """
+
+# Output budget: the meal and list overhead plus a compact item each
+# ({"name":"brown rice","quantity":1,"unit":"cup","estimated_weight_g":195})
+FOOD_EXTRACTION_BASE_TOKENS = 24
+FOOD_EXTRACTION_ITEM_TOKENS = 32
+FOOD_EXTRACTION_MAX_ITEMS = 20
+
+FOOD_NUTRITION_PROMPT = """
+        You are a nutrition assistant. The user message lists foods, one per line,
+        as "<number>. <name>, <weight> g".
+        
+        Return a JSON object {"items": [...]} with exactly one object per food, in
+        the same order, each with calories, protein_g, carbs_g and fat_g for the
+        given weight.
+        
+        Return only compact valid JSON.
+        """
+
+# {"calories":120,"protein_g":3.5,"carbs_g":20,"fat_g":2.1} per food
+FOOD_NUTRITION_BASE_TOKENS = 8
+FOOD_NUTRITION_ITEM_TOKENS = 32
+
+
+def food_extraction_max_tokens(transcription):
+    """
+    Output budget for the extraction of one transcription. A reply cannot
+    name more foods than the transcript has words that are not filler,
+    meal, unit or number words, so the budget grows with those.
+    """
+    words = normalize_transcript(transcription).split()
+    food_words = sum(
+        1 for word in words
+        if word not in FILLER_WORDS and word not in MEAL_WORDS and word not in UNIT_WORDS
+        and word not in QUANTITY_WORDS and not NUMBER_RE.match(word)
+    )
+    items = min(max(food_words, 1), FOOD_EXTRACTION_MAX_ITEMS)
+    return FOOD_EXTRACTION_BASE_TOKENS + FOOD_EXTRACTION_ITEM_TOKENS * items
+
+
+def build_audio_response(transcription, structured_data):
+    """
+    Shape the process-audio response from a transcription and extracted data
+    """
+    return {
+        'success': True,
+        'transcription': transcription,
+        'food': structured_data.get('food', 'unknown food'),
+        'meal': structured_data.get('meal', 'snack'),
+        'details': structured_data.get('details', {
+            'protein': 0,
+            'carbs': 0,
+            'fat': 0
+        }),
+        'confidence': structured_data.get('confidence', 0.85),
+        'items': structured_data.get('items', []),
+        'timestamp': int(date.today().strftime('%s')) * 1000,
+        'calories': structured_data.get('calories', 0)
+    }
+
+
 @api_view(['POST'])
 def process_audio_view(request):
     """
     Process audio recording and extract food items using OpenAI Whisper + ChatGPT
+
+    Both are reached through TRANSCRIPTION_BACKEND and EXTRACTION_BACKEND
+    (see backends.py). A failed transcription is reported as 502.
+
+    With `?mode=background` the audio is stored and queued instead, and the
+    response carries a job id to poll at /api/process-audio/<job_id>/.
     """
-    audio_file = request.FILES.get('file')
+    try:
+        audio_file = request.FILES.get('file')
+    except UploadTooLarge as e:
+        return Response({'error': str(e.detail)}, status=e.status_code)
     if not audio_file:
         return Response(
             {'error': 'No audio file provided'}, 
             status=status.HTTP_400_BAD_REQUEST
         )
     
+    if request.query_params.get('mode') == 'background':
+        return submit_audio_job(request, audio_file)
+    
     try:
-        # Save audio file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.m4a') as tmp_file:
-            for chunk in audio_file.chunks():
-                tmp_file.write(chunk)
-            tmp_file_path = tmp_file.name
+        # The upload is used in place: small files are still in memory and
+        # large ones in the temporary file Django spooled them to, which it
+        # deletes when the request is closed
+        transcription = transcribe_audio_stream(audio_file, audio_file.name or 'audio.m4a')
         
-        try:
-            # Transcribe audio using OpenAI Whisper
-            transcription = transcribe_audio_whisper(tmp_file_path)
-            
-            # Extract structured food data using ChatGPT
-            structured_data = extract_food_data_with_gpt(transcription)
-            
-            # Clean up temporary files
-            os.unlink(tmp_file_path)
-            
-            return Response({
-                'success': True,
-                'transcription': transcription,
-                'food': structured_data.get('food', 'unknown food'),
-                'meal': structured_data.get('meal', 'snack'),
-                'details': structured_data.get('details', {
-                    'protein': 0,
-                    'carbs': 0,
-                    'fat': 0
-                }),
-                'confidence': structured_data.get('confidence', 0.85),
-                'timestamp': int(date.today().strftime('%s')) * 1000,
-                'calories': structured_data.get('calories', 0)
-            })
-            
-        except Exception as e:
-            # Clean up on error
-            if os.path.exists(tmp_file_path):
-                os.unlink(tmp_file_path)
-            raise e
-            
+        # Extract structured food data locally, or with ChatGPT when unsure
+        structured_data = extract_food_data(transcription)
+        
+        return Response(build_audio_response(transcription, structured_data))
+    
+    except TranscriptionError as e:
+        return Response(
+            {'error': f'Transcription failed: {str(e)}'},
+            status=status.HTTP_502_BAD_GATEWAY
+        )
     except Exception as e:
         return Response(
             {'error': f'Audio processing failed: {str(e)}'}, 
@@ -189,113 +485,545 @@ def process_audio_view(request):
         )
 
 
-def transcribe_audio_whisper(file_path):
+def submit_audio_job(request, audio_file):
+    """
+    Store the upload as an AudioJob and hand it to the background worker pool
+    """
+    try:
+        audio_job_queue.reserve()
+    except QueueFull:
+        return Response(
+            {'error': 'Audio processing queue is full, try again shortly'},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    
+    audio_path = None
+    try:
+        audio_path = store_audio_upload(audio_file)
+        job = AudioJob.objects.create(audio_path=audio_path)
+    except Exception as e:
+        audio_job_queue.release()
+        # No job refers to the stored audio, so nothing would ever delete it
+        if audio_path and os.path.exists(audio_path):
+            os.unlink(audio_path)
+        return Response(
+            {'error': f'Audio processing failed: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+    audio_job_queue.submit(job.pk)
+    
+    data = AudioJobSerializer(job).data
+    data['status_url'] = request.build_absolute_uri(f'{job.pk}/')
+    return Response(data, status=status.HTTP_202_ACCEPTED)
+
+
+class AudioJobDetailView(generics.RetrieveAPIView):
+    """
+    Report the status and, once finished, the result of a background audio job.
+    """
+    queryset = AudioJob.objects.all()
+    serializer_class = AudioJobSerializer
+    lookup_url_kwarg = 'job_id'
+
+
+async def process_audio_async_view(request):
     """
-    Transcribe audio using OpenAI Whisper
+    Async variant of process_audio_view for the ASGI stack.
+
+    The upload is read in a worker thread and the transcription and
+    extraction backends are awaited (the async OpenAI client by default), so the event loop can keep many
+    transcriptions in flight instead of pinning one worker per request.
     """
+    if request.method != 'POST':
+        return JsonResponse(
+            {'detail': f'Method "{request.method}" not allowed.'},
+            status=status.HTTP_405_METHOD_NOT_ALLOWED
+        )
+    
+    def read_upload():
+        return request.FILES.get('file')
+    
     try:
-        # Initialize OpenAI client
-        api_key = getattr(settings, 'OPENAI_API_KEY', os.environ.get('OPENAI_API_KEY'))
-        if not api_key:
-            raise Exception("OpenAI API key not configured")
+        audio_file = await sync_to_async(read_upload, thread_sensitive=False)()
+    except UploadTooLarge as e:
+        return JsonResponse({'error': str(e.detail)}, status=e.status_code)
+    if not audio_file:
+        return JsonResponse(
+            {'error': 'No audio file provided'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        transcription = await async_transcribe_audio_whisper(audio_file, audio_file.name or 'audio.m4a')
+        structured_data = await async_extract_food_data(transcription)
+        return JsonResponse(build_audio_response(transcription, structured_data))
+    
+    except TranscriptionError as e:
+        return JsonResponse(
+            {'error': f'Transcription failed: {str(e)}'},
+            status=status.HTTP_502_BAD_GATEWAY
+        )
+    except Exception as e:
+        return JsonResponse(
+            {'error': f'Audio processing failed: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
 
-        client = openai.OpenAI(api_key=api_key)
+async def process_audio_stream_view(request):
+    """
+    Streaming variant of process_audio_view, as server-sent events.
 
+    Emits `accepted` once the upload is read, `transcription` as soon as
+    Whisper answers, one `item` per food as it is parsed out of the streamed
+    ChatGPT reply and finally `done` with the same payload as
+    process_audio_view. Failures are reported as an `error` event.
+    """
+    if request.method != 'POST':
+        return JsonResponse(
+            {'detail': f'Method "{request.method}" not allowed.'},
+            status=status.HTTP_405_METHOD_NOT_ALLOWED
+        )
+    
+    def read_upload():
+        return request.FILES.get('file')
+    
+    try:
+        audio_file = await sync_to_async(read_upload, thread_sensitive=False)()
+    except UploadTooLarge as e:
+        return JsonResponse({'error': str(e.detail)}, status=e.status_code)
+    if not audio_file:
+        return JsonResponse(
+            {'error': 'No audio file provided'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    async def events():
+        try:
+            file_name = audio_file.name or 'audio.m4a'
+            yield sse_event('accepted', {'file': file_name, 'bytes': audio_file.size})
+            
+            transcription = await async_transcribe_audio_whisper(audio_file, file_name)
+            yield sse_event('transcription', {'transcription': transcription})
+            
+            structured_data = None
+            async for event, data in async_stream_food_data(transcription):
+                if event == 'item':
+                    yield sse_event('item', data)
+                else:
+                    structured_data = data
+            yield sse_event('done', build_audio_response(transcription, structured_data))
+        
+        except TranscriptionError as e:
+            yield sse_event('error', {'error': f'Transcription failed: {str(e)}'})
+        except Exception as e:
+            yield sse_event('error', {'error': f'Audio processing failed: {str(e)}'})
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def transcribe_audio_whisper(file_path):
+    """
+    Transcribe an audio file on disk with the transcription backend
+    """
+    try:
         with open(file_path, 'rb') as audio_file:
-            transcription = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                response_format="text"
-            )
+            return transcribe_audio_stream(audio_file, os.path.basename(file_path))
+    except OSError as e:
+        print(f"Whisper transcription error: {e}")
+        raise TranscriptionError(str(e)) from e
+
+
+def transcribe_audio_stream(audio_file, file_name='audio.m4a'):
+    """
+    Transcribe a seekable binary stream (e.g. an upload) with the
+    transcription backend. Raises TranscriptionError when it fails.
+    """
+    backend = get_transcription_backend()
+    try:
+        # Identical audio (client retries, double taps) is served from the cache
+        cache_key = transcription_cache.make_key(hash_stream(audio_file), backend.model)
+        transcription = transcription_cache.get(cache_key)
+        if transcription is not None:
+            return transcription
+
+        # Downmix, resample, trim and re-encode so less audio is uploaded
+        upload_name, upload = prepare_upload(audio_file, file_name)
+        with external_call('whisper'):
+            transcription = backend.transcribe(upload_name, upload)
 
+        transcription_cache.set(cache_key, transcription)
         return transcription
 
     except Exception as e:
         print(f"Whisper transcription error: {e}")
-        # Fallback transcription for development
-        fallback_transcriptions = [
-            "I had a banana and a cup of coffee for breakfast",
-            "Had a chicken salad with olive oil dressing",
-            "Ate two slices of pizza for lunch",
-            "Had an apple and some almonds as a snack",
-            "I just finished eating grilled salmon with vegetables"
-        ]
-        import random
-        return random.choice(fallback_transcriptions)
+        raise TranscriptionError(str(e)) from e
 
 
-def extract_food_data_with_gpt(transcription):
+async def async_transcribe_audio_whisper(audio_file, file_name='audio.m4a'):
     """
-    Extract structured food data using ChatGPT
+    Async counterpart of transcribe_audio_stream
     """
+    backend = get_transcription_backend()
     try:
-        # Initialize OpenAI client
-        api_key = getattr(settings, 'OPENAI_API_KEY', os.environ.get('OPENAI_API_KEY'))
-        if not api_key:
-            raise Exception("OpenAI API key not configured")
+        # Hashing, cache and preprocessing are blocking, so keep them off the event loop
+        cache_key = transcription_cache.make_key(
+            await sync_to_async(hash_stream, thread_sensitive=False)(audio_file), backend.model
+        )
+        transcription = await sync_to_async(transcription_cache.get, thread_sensitive=False)(cache_key)
+        if transcription is not None:
+            return transcription
 
-        client = openai.OpenAI(api_key=api_key)
+        upload_name, upload = await sync_to_async(prepare_upload, thread_sensitive=False)(audio_file, file_name)
+        with external_call('whisper'):
+            transcription = await backend.atranscribe(upload_name, upload)
 
-        system_prompt =  f"""
-        You are a health and nutrition assistant helping users track their meals by analyzing transcripts from their voice input.
-        
-        Extract a structured JSON object containing:
-        
-        - meal: one of ["breakfast", "lunch", "dinner", "snack", "unknown"]
-        - items: list of food items the user consumed. Each item should include:
-          - name: food name (standardized, e.g., "banana", "paneer")
-          - quantity: number or estimated quantity
-          - unit: "grams", "ml", "pieces", "bowl", "cup", etc.
-          - estimated_weight_g: inferred weight in grams (for consistency)
-          - preparation: "cooked", "raw", "boiled", "fried", etc.
-          - estimated_calories
-          - macros:
-            - protein_g
-            - carbs_g
-            - fat_g
-        
-        - total_estimated_calories: sum of calories
-        
-        Use common nutrition knowledge (USDA/HealthifyMe-like DB).
-        If anything is vague (like "some rice"), estimate based on common serving sizes.
-        
-        Return only valid JSON.
+        await sync_to_async(transcription_cache.set, thread_sensitive=False)(cache_key, transcription)
+        return transcription
+
+    except Exception as e:
+        print(f"Whisper transcription error: {e}")
+        raise TranscriptionError(str(e)) from e
+
+
+def food_extraction_messages(transcription):
+    return [
+        {"role": "system", "content": FOOD_EXTRACTION_PROMPT},
+        {"role": "user", "content": f"Transcription: {transcription}"}
+    ]
+
+
+FOOD_EXTRACTION_BATCH_PROMPT = """
+        The user message holds several numbered transcripts, one per line.
+        Return a JSON object {"results": [...]} with exactly one object in the
+        format above per transcript, in the same order.
         """
 
 
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Transcription: {transcription}"}
-            ],
-            temperature=0.3,
-            max_tokens=300
-        )
+def food_extraction_batch_messages(transcriptions):
+    numbered = "\n".join(
+        f"{index}. {transcription}" for index, transcription in enumerate(transcriptions, 1)
+    )
+    return [
+        {"role": "system", "content": FOOD_EXTRACTION_PROMPT + FOOD_EXTRACTION_BATCH_PROMPT},
+        {"role": "user", "content": f"Transcriptions:\n{numbered}"}
+    ]
 
-        # Parse the JSON response
-        response_text = response.choices[0].message.content
-        json_str = response_text.strip()
-        json_str = re.sub(r"^```json\n", "", json_str)
-        json_str = re.sub(r"\n```$", "", json_str)
-        json_str = re.sub(r"^```[\w]*\n", "", json_str)  # generic code block
-        try:
-            structured_data = json.loads(json_str)
-            return structured_data
-        except json.JSONDecodeError:
+
+def request_food_extraction(transcription):
+    """
+    Ask the extraction backend about one transcription. Returns the parsed
+    reply, or None when it is not valid JSON.
+    """
+    reply = get_extraction_backend().complete(
+        food_extraction_messages(transcription), food_extraction_max_tokens(transcription)
+    )
+    return parse_food_data_response(reply)
+
+
+def request_food_extraction_batch(transcriptions):
+    """
+    Ask the extraction backend about several transcriptions in one request,
+    sharing the system prompt. Returns one parsed result (or None) per transcription.
+    """
+    if len(transcriptions) == 1:
+        return [request_food_extraction(transcriptions[0])]
+
+    reply = get_extraction_backend().complete(
+        food_extraction_batch_messages(transcriptions),
+        # {"results":[...]} around the individual replies
+        sum(food_extraction_max_tokens(transcription) for transcription in transcriptions) + 8
+    )
+    data = parse_food_data_response(reply) or {}
+    results = data.get('results')
+    if not isinstance(results, list) or len(results) != len(transcriptions):
+        # A reply we cannot line up with the inputs is useless to all of them
+        return [None] * len(transcriptions)
+    return [result if isinstance(result, dict) else None for result in results]
+
+
+# Concurrent extractions within EXTRACTION_BATCH_WINDOW_MS share one request
+# when EXTRACTION_BATCH_ENABLED is set
+extraction_batcher = MicroBatcher(request_food_extraction_batch, name='food-extraction')
+
+
+def parse_food_data_response(response_text):
+    """
+    Parse the ChatGPT reply, ignoring any markdown code fence around the
+    JSON. Returns None when the reply is not valid JSON.
+    """
+    parser = FoodDataStreamParser()
+    parser.feed(response_text)
+    return parser.result()
+
+
+def unmatched_items(structured_data):
+    """
+    (index, item) for the extracted items no FoodItem matches and the model
+    gave no calories for
+    """
+    items = structured_data.get('items')
+    if not isinstance(items, list):
+        return []
+    return [
+        (index, item) for index, item in enumerate(items)
+        if isinstance(item, dict) and 'estimated_calories' not in item
+        and match_food_item(str(item.get('name') or '')) is None
+    ]
+
+
+def food_nutrition_messages(items):
+    foods = "\n".join(
+        f"{index}. {item.get('name')}, {float(round(item_weight_grams(item), 1))} g"
+        for index, item in enumerate(items, 1)
+    )
+    return [
+        {"role": "system", "content": FOOD_NUTRITION_PROMPT},
+        {"role": "user", "content": f"Foods:\n{foods}"}
+    ]
+
+
+def food_nutrition_max_tokens(count):
+    return FOOD_NUTRITION_BASE_TOKENS + FOOD_NUTRITION_ITEM_TOKENS * count
+
+
+def apply_nutrition_estimates(structured_data, unmatched, reply):
+    """
+    Copy the calories and macros of a FOOD_NUTRITION_PROMPT reply onto the
+    unmatched items. A reply that does not line up with them is ignored.
+    """
+    estimates = (parse_food_data_response(reply) or {}).get('items')
+    if not isinstance(estimates, list) or len(estimates) != len(unmatched):
+        return structured_data
+    items = list(structured_data['items'])
+    for (index, item), estimate in zip(unmatched, estimates):
+        if isinstance(estimate, dict):
+            items[index] = {
+                **item,
+                'estimated_calories': estimate.get('calories'),
+                'macros': {key: estimate.get(key) for key in ('protein_g', 'carbs_g', 'fat_g')},
+            }
+    return {**structured_data, 'items': items}
+
+
+def add_nutrition_estimates(structured_data):
+    """
+    Ask the model for the calories and macros of the extracted foods the
+    database does not know, in one follow-up call sized by their number.
+    Without an answer those foods count as 0 kcal.
+    """
+    unmatched = unmatched_items(structured_data)
+    if not unmatched:
+        return structured_data
+    try:
+        with external_call('gpt'):
+            reply = get_extraction_backend().complete(
+                food_nutrition_messages([item for _, item in unmatched]), food_nutrition_max_tokens(len(unmatched))
+            )
+    except Exception as e:
+        print(f"Nutrition estimate error: {e}")
+        return structured_data
+    return apply_nutrition_estimates(structured_data, unmatched, reply)
+
+
+async def async_add_nutrition_estimates(structured_data):
+    """
+    Async counterpart of add_nutrition_estimates
+    """
+    # The food index is built from the database on first use
+    unmatched = await sync_to_async(unmatched_items)(structured_data)
+    if not unmatched:
+        return structured_data
+    try:
+        with external_call('gpt'):
+            reply = await get_extraction_backend().acomplete(
+                food_nutrition_messages([item for _, item in unmatched]), food_nutrition_max_tokens(len(unmatched))
+            )
+    except Exception as e:
+        print(f"Nutrition estimate error: {e}")
+        return structured_data
+    return apply_nutrition_estimates(structured_data, unmatched, reply)
+
+
+def food_extraction_cache_key(transcription):
+    return extraction_cache.make_key(
+        transcription,
+        get_extraction_backend().model,
+        FOOD_EXTRACTION_PROMPT + food_extraction_messages('')[-1]['content']
+    )
+
+
+def local_food_data(transcription):
+    """
+    Return resolved food data from the local extractor when it is confident
+    enough to skip ChatGPT, else None
+    """
+    try:
+        structured_data = local_food_extractor.extract(transcription)
+    except Exception as e:
+        print(f"Local food extraction error: {e}")
+        return None
+    min_confidence = getattr(settings, 'LOCAL_EXTRACTION_MIN_CONFIDENCE', 0.8)
+    if structured_data is None or structured_data['confidence'] < min_confidence:
+        return None
+    return resolve_food_data(structured_data)
+
+
+def extract_food_data(transcription):
+    """
+    Extract structured food data, trying the local extractor before ChatGPT
+    """
+    return local_food_data(transcription) or extract_food_data_with_gpt(transcription)
+
+
+async def async_extract_food_data(transcription):
+    """
+    Async counterpart of extract_food_data
+    """
+    # The extractor is built from the database on first use
+    structured_data = await sync_to_async(local_food_data)(transcription)
+    return structured_data or await async_extract_food_data_with_gpt(transcription)
+
+
+def extract_food_data_with_gpt(transcription):
+    """
+    Extract structured food data using ChatGPT
+    """
+    try:
+        # Repeated phrases are answered from the shared extraction cache
+        cache_key = food_extraction_cache_key(transcription)
+        structured_data = extraction_cache.get(cache_key)
+        if structured_data is not None:
+            return resolve_food_data(structured_data)
+
+        with external_call('gpt'):
+            if getattr(settings, 'EXTRACTION_BATCH_ENABLED', False):
+                structured_data = extraction_batcher.submit(transcription).result()
+            else:
+                structured_data = request_food_extraction(transcription)
+
+        if structured_data is None:
             # If JSON parsing fails, return a default structure
             return create_fallback_food_data(transcription)
+        structured_data = add_nutrition_estimates(structured_data)
+        # Cache the model's answer; nutrition is resolved against the
+        # current food database on every read
+        extraction_cache.set(cache_key, structured_data)
+        return resolve_food_data(structured_data)
 
     except Exception as e:
         print(f"ChatGPT processing error: {e}")
         return create_fallback_food_data(transcription)
 
 
+async def async_extract_food_data_with_gpt(transcription):
+    """
+    Async counterpart of extract_food_data_with_gpt
+    """
+    try:
+        cache_key = food_extraction_cache_key(transcription)
+        structured_data = await sync_to_async(extraction_cache.get, thread_sensitive=False)(cache_key)
+        if structured_data is not None:
+            return await sync_to_async(resolve_food_data)(structured_data)
+
+        with external_call('gpt'):
+            if getattr(settings, 'EXTRACTION_BATCH_ENABLED', False):
+                # Waits on the batch without holding a thread
+                structured_data = await asyncio.wrap_future(extraction_batcher.submit(transcription))
+            else:
+                reply = await get_extraction_backend().acomplete(
+                    food_extraction_messages(transcription), food_extraction_max_tokens(transcription)
+                )
+                structured_data = parse_food_data_response(reply)
+
+        if structured_data is None:
+            return await sync_to_async(create_fallback_food_data)(transcription)
+        structured_data = await async_add_nutrition_estimates(structured_data)
+        await sync_to_async(extraction_cache.set, thread_sensitive=False)(cache_key, structured_data)
+        # May build the food index from the database on first use
+        return await sync_to_async(resolve_food_data)(structured_data)
+
+    except Exception as e:
+        print(f"ChatGPT processing error: {e}")
+        # The fallback may build the local extractor from the database
+        return await sync_to_async(create_fallback_food_data)(transcription)
+
+
+async def async_stream_food_data(transcription):
+    """
+    Yield ('item', resolved item) for each food as soon as it is known, then
+    ('data', structured data) once extraction is complete.
+
+    Confident local extractions and cached replies are yielded at once;
+    otherwise items are parsed out of a streamed ChatGPT completion.
+    """
+    structured_data = await sync_to_async(local_food_data)(transcription)
+    if structured_data is None:
+        cache_key = food_extraction_cache_key(transcription)
+        cached = await sync_to_async(extraction_cache.get, thread_sensitive=False)(cache_key)
+        if cached is not None:
+            structured_data = await sync_to_async(resolve_food_data)(cached)
+    if structured_data is not None:
+        for item in structured_data.get('items', []):
+            yield 'item', item
+        yield 'data', structured_data
+        return
+    
+    parser = FoodDataStreamParser()
+    streamed_items = 0
+    try:
+        stream = get_extraction_backend().astream(
+            food_extraction_messages(transcription), food_extraction_max_tokens(transcription)
+        )
+        async for text in stream:
+            for item in parser.feed(text):
+                resolved = await sync_to_async(resolve_item)(item)
+                if resolved['source'] == 'model' and 'estimated_calories' not in item:
+                    # Sent once the follow-up call has estimated it
+                    continue
+                streamed_items += 1
+                yield 'item', resolved
+        structured_data = parser.result()
+    except Exception as e:
+        print(f"ChatGPT processing error: {e}")
+    
+    if structured_data is None:
+        structured_data = await sync_to_async(create_fallback_food_data)(transcription)
+        # Items already sent stay on screen; only add the fallback's when none were
+        if not streamed_items:
+            for item in structured_data.get('items', []):
+                yield 'item', item
+        yield 'data', structured_data
+        return
+    
+    unmatched = await sync_to_async(unmatched_items)(structured_data)
+    structured_data = await async_add_nutrition_estimates(structured_data)
+    await sync_to_async(extraction_cache.set, thread_sensitive=False)(cache_key, structured_data)
+    for index, _ in unmatched:
+        yield 'item', await sync_to_async(resolve_item)(structured_data['items'][index])
+    yield 'data', await sync_to_async(resolve_food_data)(structured_data)
+
+
 def create_fallback_food_data(transcription):
     """
     Create fallback structured data when GPT processing fails
     """
+    # Whatever the local extractor recognises beats a keyword guess
+    try:
+        structured_data = local_food_extractor.extract(transcription)
+    except Exception as e:
+        print(f"Local food extraction error: {e}")
+        structured_data = None
+    if structured_data is not None:
+        FALLBACKS.inc(source='local')
+        return resolve_food_data(structured_data)
+    
     # Simple keyword-based fallback
+    FALLBACKS.inc(source='keywords')
     transcription_lower = transcription.lower()
     
     # Default values
@@ -363,3 +1091,55 @@ def health_check(request):
         'message': 'Calify API is running',
         'timestamp': date.today().isoformat()
     })
+
+
+def metrics_view(request):
+    """
+    All metrics, summed over every worker process, in the Prometheus text
+    format. Requires "Authorization: Bearer <METRICS_TOKEN>" from one of
+    METRICS_ALLOWED_IPS; behind a proxy every client looks local, so the
+    address alone is not enough.
+    """
+    if not getattr(settings, 'METRICS_TOKEN', ''):
+        return JsonResponse({'error': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', ['127.0.0.1', '::1'])
+    if '*' not in allowed and request.META.get('REMOTE_ADDR') not in allowed:
+        return JsonResponse({'error': 'Forbidden'}, status=status.HTTP_403_FORBIDDEN)
+    if not scrape_token_matches(request):
+        return JsonResponse({'error': 'Invalid metrics token'}, status=status.HTTP_403_FORBIDDEN)
+    return HttpResponse(registry.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@api_view(['GET'])
+def profile_report_view(request):
+    """
+    Return this worker's aggregated profile as text: collapsed stacks for
+    the sampling profiler, pstats for cProfile.
+
+    Requires the X-Profile-Token header to match PROFILING_SECRET.
+    `?mode=` picks the profiler (PROFILING_MODE by default), `?limit=` caps
+    the output and `?reset=true` clears the profile once read.
+    """
+    if not getattr(settings, 'PROFILING_SECRET', ''):
+        return Response({'error': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
+    if not token_matches(request.headers.get(PROFILE_HEADER, '')):
+        return Response({'error': 'Invalid profiling token'}, status=status.HTTP_403_FORBIDDEN)
+    
+    mode = request.query_params.get('mode') or getattr(settings, 'PROFILING_MODE', 'sample')
+    if mode not in PROFILERS:
+        return Response(
+            {'error': f'mode must be one of: {", ".join(PROFILERS)}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        limit = int(request.query_params['limit']) if 'limit' in request.query_params else None
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    profiler = get_profiler(mode)
+    response = HttpResponse(profiler.report(limit=limit), content_type='text/plain; charset=utf-8')
+    response['X-Profile-Requests'] = profiler.profiles
+    response['X-Profile-Pid'] = os.getpid()
+    if request.query_params.get('reset') == 'true':
+        profiler.reset()
+    return response
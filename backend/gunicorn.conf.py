@@ -0,0 +1,21 @@
+"""
+gunicorn settings read from the working directory, e.g. by
+
+    gunicorn calorie_tracker.wsgi:application -w 4
+"""
+import os
+
+import environ
+
+
+def on_starting(server):
+    # Start the shared metrics from zero; the workers are not forked yet.
+    # METRICS_DIR is read like settings.py does, without loading the Django
+    # settings here: the entry point (wsgi.py, asgi.py) adjusts the
+    # environment they are built from in each worker.
+    environ.Env.read_env(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env'))
+    directory = environ.Env()('METRICS_DIR', default='')
+    if directory:
+        from food_tracking.metrics import MetricsRegistry
+
+        MetricsRegistry(directory).clear()
@@ -0,0 +1,186 @@
+"""
+Concurrency benchmark of the database profiles.
+
+Seeds a SQLite database with generate_entries, then, for each profile,
+starts gunicorn on a copy of it and drives a mix of entry writes and
+summary, entry list and food search reads at the given concurrency:
+
+    python -m loadtest.database --workers 4 --requests 2000 --concurrency 32 --write-ratio 0.3
+
+Profiles: "default" is SQLite's rollback journal without persistent
+connections (SQLITE_TUNING=false), "tuned" the WAL profile of settings.py
+and "replica" the tuned profile with GET views reading through a second,
+read-only connection to the same file (DATABASE_REPLICA_PATH). Failed
+requests are mostly "database is locked" errors; see the server log.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+import httpx
+
+from .pipeline import BACKEND_DIR, free_port, start, stop, wait_for_port
+from .process_audio import percentile
+
+
+PROFILES = {
+    'default': {'SQLITE_TUNING': 'false'},
+    'tuned': {'SQLITE_TUNING': 'true'},
+    'replica': {'SQLITE_TUNING': 'true', 'DATABASE_REPLICA_PATH': '{path}'},
+}
+SEARCH_TERMS = ['apple', 'rice', 'gri', 'chicken breast', 'yog', 'baked sweet potato']
+
+
+def seed(path, args, log):
+    env = dict(os.environ, DATABASE_PATH=path, SQLITE_TUNING='false')
+    for command in (
+        ['migrate', '--verbosity', '0'],
+        ['generate_entries', '--foods', str(args.foods), '--days', str(args.days),
+         '--entries', str(args.entries), '--seed', '1'],
+    ):
+        subprocess.run(
+            [sys.executable, 'manage.py', *command], cwd=BACKEND_DIR, env=env, stdout=log,
+            stderr=subprocess.STDOUT, check=True,
+        )
+    with sqlite3.connect(path) as connection:
+        return [row[0] for row in connection.execute('SELECT id FROM food_tracking_fooditem')]
+
+
+def next_request(rng, args, food_ids):
+    if rng.random() < args.write_ratio:
+        body = {
+            'food_item': rng.choice(food_ids),
+            'quantity_grams': rng.randint(20, 400),
+            'meal_type': rng.choice(['breakfast', 'lunch', 'dinner', 'snack']),
+        }
+        return 'write', 'POST', '/api/entries/', body
+    day = date.today() - timedelta(days=rng.randrange(args.days))
+    kind = rng.choice(['summary', 'range', 'entries', 'search'])
+    if kind == 'summary':
+        return 'read', 'GET', f'/api/summary/?date={day}', None
+    if kind == 'range':
+        return 'read', 'GET', f'/api/summary/range/?start={day - timedelta(days=30)}&end={day}', None
+    if kind == 'entries':
+        return 'read', 'GET', f'/api/entries/?date={day}', None
+    return 'read', 'GET', f'/api/food-items/?search={rng.choice(SEARCH_TERMS)}', None
+
+
+async def drive(base_url, args, food_ids):
+    rng = random.Random(args.seed)
+    requests = [next_request(rng, args, food_ids) for _ in range(args.requests)]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = {'read': [], 'write': []}
+    statuses = Counter()
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        async def one(kind, method, path, body):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, path, json=body)
+                    statuses[str(response.status_code)] += 1
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                latencies[kind].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(*request) for request in requests))
+        elapsed = time.perf_counter() - started
+
+    errors = sum(count for status, count in statuses.items() if status not in ('200', '201'))
+    result = {
+        'requests': args.requests,
+        'errors': errors,
+        'statuses': dict(sorted(statuses.items())),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(args.requests / elapsed, 2),
+    }
+    for kind, values in latencies.items():
+        if values:
+            result[f'{kind}_mean_ms'] = round(statistics.mean(values) * 1000, 1)
+            result[f'{kind}_p50_ms'] = round(percentile(values, 0.50) * 1000, 1)
+            result[f'{kind}_p95_ms'] = round(percentile(values, 0.95) * 1000, 1)
+    return result
+
+
+def run_profile(name, seed_path, directory, args, food_ids, log):
+    path = os.path.join(directory, f'{name}.sqlite3')
+    shutil.copyfile(seed_path, path)
+    env = dict(os.environ, PYTHONUNBUFFERED='1', DEBUG='false', DATABASE_PATH=path,
+               METRICS_DIR=os.path.join(directory, f'metrics-{name}'))
+    env.update({key: value.format(path=path) for key, value in PROFILES[name].items()})
+
+    port = free_port()
+    server = start([
+        'gunicorn', '--workers', str(args.workers), '--threads', str(args.threads),
+        '--bind', f'127.0.0.1:{port}', 'calorie_tracker.wsgi:application',
+    ], env, log)
+    try:
+        wait_for_port(port, server)
+        return asyncio.run(drive(f'http://127.0.0.1:{port}', args, food_ids))
+    finally:
+        stop(server)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--profiles', default='default,tuned,replica', help=f'Any of {", ".join(PROFILES)}')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=1, help='Threads per gunicorn worker')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--write-ratio', type=float, default=0.3, help='Fraction of requests creating entries')
+    parser.add_argument('--entries', type=int, default=100_000, help='Entries in the seeded database')
+    parser.add_argument('--foods', type=int, default=2000, help='Food items in the seeded database')
+    parser.add_argument('--days', type=int, default=365, help='Days covered by the seeded entries')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--log', default=os.devnull, help='File for the seeding and server logs')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    profiles = [name.strip() for name in args.profiles.split(',') if name.strip()]
+    unknown = set(profiles) - set(PROFILES)
+    if unknown:
+        parser.error(f'unknown profiles: {", ".join(sorted(unknown))}')
+
+    directory = tempfile.mkdtemp(prefix='calorie-tracker-db-')
+    results = {}
+    try:
+        with open(args.log, 'a') as log:
+            seed_path = os.path.join(directory, 'seed.sqlite3')
+            food_ids = seed(seed_path, args, log)
+            for name in profiles:
+                results[name] = run_profile(name, seed_path, directory, args, food_ids, log)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(
+        f'{"profile":<9} {"req/s":>8} {"errors":>7} {"read p50":>9} {"read p95":>9} '
+        f'{"write p50":>10} {"write p95":>10}'
+    )
+    for name, result in results.items():
+        print(
+            f'{name:<9} {result["throughput_rps"]:>8.1f} {result["errors"]:>7} '
+            f'{result.get("read_p50_ms", 0):>9.1f} {result.get("read_p95_ms", 0):>9.1f} '
+            f'{result.get("write_p50_ms", 0):>10.1f} {result.get("write_p95_ms", 0):>10.1f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
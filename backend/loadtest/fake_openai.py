@@ -0,0 +1,183 @@
+"""
+Minimal stand-in for the OpenAI API used by the audio pipeline load tests.
+
+Serves `/v1/audio/transcriptions` and `/v1/chat/completions` with an
+artificial latency (fixed, plus optional random jitter) and an optional
+error rate, so the Django process under test can be compared without
+network access or API spend. It runs on a single asyncio event loop, so it
+can hold thousands of slow requests open at once.
+
+    python -m loadtest.fake_openai --port 9100 --latency 0.5
+    python -m loadtest.fake_openai --latency 0.3 --jitter 0.4 --error-rate 0.05 --error-status 429
+
+Point the backend at it with OPENAI_BASE_URL=http://127.0.0.1:9100/v1 and
+any non-empty OPENAI_API_KEY. GET /stats reports how many chat completions
+were requested, e.g. to check micro-batching, and how many errors were
+injected.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+
+TRANSCRIPT = "I had a banana and a cup of coffee for breakfast"
+FOOD_DATA = {
+    "meal": "breakfast",
+    "items": [
+        {
+            "name": "banana",
+            "quantity": 1,
+            "unit": "pieces",
+            "estimated_weight_g": 118,
+            "preparation": "raw",
+            "estimated_calories": 105,
+            "macros": {"protein_g": 1.3, "carbs_g": 27, "fat_g": 0.4},
+        }
+    ],
+    "total_estimated_calories": 105,
+}
+
+
+def chat_completion_content(request=None):
+    """
+    FOOD_DATA as JSON, or {"results": [...]} with one entry per numbered
+    transcript for a batched extraction request
+    """
+    messages = (request or {}).get("messages") or [{}]
+    user_content = messages[-1].get("content") or ""
+    if user_content.startswith("Transcriptions:"):
+        count = len(user_content.splitlines()) - 1
+        return json.dumps({"results": [FOOD_DATA] * count})
+    return json.dumps(FOOD_DATA)
+
+
+def chat_completion_body(request=None):
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "gpt-3.5-turbo",
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": chat_completion_content(request)},
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+def chat_completion_stream(chunk_size=16):
+    """
+    The same reply as chat_completion_body, as streamed completion chunks
+    """
+    content = json.dumps(FOOD_DATA)
+    events = []
+    for start in range(0, len(content), chunk_size):
+        chunk = {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": "gpt-3.5-turbo",
+            "choices": [{
+                "index": 0,
+                "finish_reason": None,
+                "delta": {"content": content[start:start + chunk_size]},
+            }],
+        }
+        events.append(f"data: {json.dumps(chunk)}\n\n")
+    events.append("data: [DONE]\n\n")
+    return "".join(events)
+
+
+class FakeOpenAIServer:
+    def __init__(self, latency=0.5, jitter=0.0, error_rate=0.0, error_status=500):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.chat_requests = 0
+        self.errors = 0
+
+    async def respond(self, path, body):
+        """
+        Return (status, content type, body bytes) for one request
+        """
+        if path.endswith('/stats'):
+            stats = {"chat_requests": self.chat_requests, "errors": self.errors}
+            return 200, 'application/json', json.dumps(stats).encode()
+        await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        if random.random() < self.error_rate:
+            self.errors += 1
+            error = {"error": {"message": "Injected failure", "type": "server_error", "code": None}}
+            return self.error_status, 'application/json', json.dumps(error).encode()
+        if path.endswith('/audio/transcriptions'):
+            return 200, 'text/plain', TRANSCRIPT.encode()
+        if path.endswith('/chat/completions'):
+            self.chat_requests += 1
+            request = json.loads(body or b'{}')
+            if request.get('stream'):
+                return 200, 'text/event-stream', chat_completion_stream().encode()
+            return 200, 'application/json', json.dumps(chat_completion_body(request)).encode()
+        return 404, 'application/json', b'{"error": "not found"}'
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length') or 0))
+
+                status, content_type, payload = await self.respond(path, body)
+                head = (
+                    f'HTTP/1.1 {status} {"OK" if status < 400 else "Error"}\r\n'
+                    f'Content-Type: {content_type}\r\n'
+                    f'Content-Length: {len(payload)}\r\n'
+                    '\r\n'
+                )
+                writer.write(head.encode('latin-1') + payload)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_connection, host, port, backlog=4096)
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9100)
+    parser.add_argument('--latency', type=float, default=0.5, help='Seconds to wait before each response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Up to this many extra seconds, at random')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with an error')
+    parser.add_argument('--error-status', type=int, default=500, help='HTTP status of injected errors')
+    args = parser.parse_args()
+
+    print(
+        f'Fake OpenAI API on http://{args.host}:{args.port}/v1 '
+        f'(latency {args.latency}s + {args.jitter}s jitter, {args.error_rate:.0%} errors)',
+        flush=True,
+    )
+    server = FakeOpenAIServer(args.latency, args.jitter, args.error_rate, args.error_status)
+    asyncio.run(server.serve(args.host, args.port))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+End-to-end load test of the audio pipeline, fully offline.
+
+Starts the Django app under gunicorn (WSGI) or uvicorn (ASGI) with its
+speech and language model backends pointed at a local stand-in, drives
+/api/process-audio/ at the given concurrency with loadtest/process_audio.py
+and stops everything again.
+
+    python -m loadtest.pipeline --requests 200 --concurrency 50 \
+        --latency 0.5 --jitter 0.3 --error-rate 0.05
+
+With `--upstream server` (the default) the stand-in is loadtest/fake_openai.py
+and requests go through the real OpenAI clients, retries and circuit
+breakers; with `--upstream in-process` the StandIn backends of
+food_tracking/backends.py answer inside the app. The transcription and
+extraction caches are disabled unless `--cache` is given, so every request
+reaches the backends.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from .process_audio import run
+
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+SERVERS = {
+    'wsgi': ['gunicorn', '--workers', '{workers}', '--threads', '{threads}', '--bind', '127.0.0.1:{port}',
+             'calorie_tracker.wsgi:application'],
+    'asgi': ['uvicorn', '--workers', '{workers}', '--port', '{port}', 'calorie_tracker.asgi:application'],
+}
+PATHS = {'wsgi': '/api/process-audio/', 'asgi': '/api/process-audio/async/'}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{process.args[0]} exited with status {process.returncode}')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'{process.args[0]} did not listen on port {port} within {timeout}s')
+
+
+def start(command, env, log):
+    # A new session so the whole process group (e.g. gunicorn workers) can be stopped
+    return subprocess.Popen(
+        command, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT, start_new_session=True
+    )
+
+
+def stop(process):
+    if process.poll() is None:
+        os.killpg(process.pid, signal.SIGTERM)
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+
+
+def app_environment(args, upstream_port):
+    env = dict(os.environ, PYTHONUNBUFFERED='1')
+    if args.upstream == 'server':
+        env.update({
+            'OPENAI_BASE_URL': f'http://127.0.0.1:{upstream_port}/v1',
+            'OPENAI_API_KEY': env.get('OPENAI_API_KEY') or 'loadtest',
+            'OPENAI_ASYNC_MAX_CONNECTIONS': str(max(200, args.concurrency * 2)),
+            'TRANSCRIPTION_BACKEND': 'food_tracking.backends.OpenAITranscriptionBackend',
+            'EXTRACTION_BACKEND': 'food_tracking.backends.OpenAIExtractionBackend',
+        })
+    else:
+        env.update({
+            'TRANSCRIPTION_BACKEND': 'food_tracking.backends.StandInTranscriptionBackend',
+            'EXTRACTION_BACKEND': 'food_tracking.backends.StandInExtractionBackend',
+            'STAND_IN_LATENCY_MS': str(int(args.latency * 1000)),
+            'STAND_IN_JITTER_MS': str(int(args.jitter * 1000)),
+            'STAND_IN_ERROR_RATE': str(args.error_rate),
+        })
+    if not args.cache:
+        env.update({
+            'TRANSCRIPTION_CACHE_MEMORY_ITEMS': '0',
+            'TRANSCRIPTION_CACHE_DIR': '',
+            'EXTRACTION_CACHE_PATH': '',
+        })
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--server', choices=sorted(SERVERS), default='asgi')
+    parser.add_argument('--upstream', choices=['server', 'in-process'], default='server')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8, help='Threads per gunicorn worker')
+    parser.add_argument('--path', help='Endpoint to drive (defaults to the one for --server)')
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.5, help='Stand-in seconds per upstream call')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Up to this many extra seconds, at random')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of upstream calls that fail')
+    parser.add_argument('--error-status', type=int, default=500, help='HTTP status of injected upstream errors')
+    parser.add_argument('--cache', action='store_true', help='Keep the transcription and extraction caches')
+    parser.add_argument('--audio', help='Audio file to upload (defaults to 32 KiB of silence)')
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--log', default=os.devnull, help='File for the server logs')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    if args.audio:
+        with open(args.audio, 'rb') as audio_file:
+            audio_bytes = audio_file.read()
+    else:
+        audio_bytes = bytes(32 * 1024)
+
+    processes = []
+    with open(args.log, 'a') as log:
+        try:
+            upstream_port = None
+            if args.upstream == 'server':
+                upstream_port = free_port()
+                processes.append(start([
+                    sys.executable, '-m', 'loadtest.fake_openai', '--port', str(upstream_port),
+                    '--latency', str(args.latency), '--jitter', str(args.jitter),
+                    '--error-rate', str(args.error_rate), '--error-status', str(args.error_status),
+                ], os.environ, log))
+                wait_for_port(upstream_port, processes[-1])
+
+            port = free_port()
+            command = [
+                part.format(workers=args.workers, threads=args.threads, port=port)
+                for part in SERVERS[args.server]
+            ]
+            processes.append(start(command, app_environment(args, upstream_port), log))
+            wait_for_port(port, processes[-1])
+
+            url = f'http://127.0.0.1:{port}{args.path or PATHS[args.server]}'
+            result = asyncio.run(run(url, args.requests, args.concurrency, audio_bytes, args.timeout))
+        finally:
+            for process in reversed(processes):
+                stop(process)
+
+    result = {'server': args.server, 'upstream': args.upstream, **result}
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    for key, value in result.items():
+        print(f'{key:>16}: {value}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Concurrent load test for the process-audio endpoints.
+
+    python -m loadtest.process_audio --url http://127.0.0.1:8000/api/process-audio/async/ \
+        --requests 200 --concurrency 100
+
+Reports throughput, latency percentiles, the error rate and the count of
+each response status so the sync and async paths can be compared against
+the same fake OpenAI server (see loadtest/fake_openai.py). To start the
+servers as well, use loadtest/pipeline.py.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from collections import Counter
+
+import httpx
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(url, total, concurrency, audio_bytes, timeout):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    statuses = Counter()
+
+    async with httpx.AsyncClient(timeout=timeout, limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def one():
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.post(url, files={'file': ('clip.m4a', audio_bytes, 'audio/m4a')})
+                    statuses[str(response.status_code)] += 1
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+
+    errors = total - statuses['200']
+    return {
+        'requests': total,
+        'concurrency': concurrency,
+        'errors': errors,
+        'error_rate': round(errors / total, 4) if total else 0.0,
+        'statuses': dict(sorted(statuses.items())),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(total / elapsed, 2),
+        'latency_mean_s': round(statistics.mean(latencies), 3),
+        'latency_p50_s': round(percentile(latencies, 0.50), 3),
+        'latency_p95_s': round(percentile(latencies, 0.95), 3),
+        'latency_p99_s': round(percentile(latencies, 0.99), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000/api/process-audio/')
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--audio', help='Audio file to upload (defaults to 32 KiB of silence)')
+    parser.add_argument('--timeout', type=float, default=120)
+    args = parser.parse_args()
+
+    if args.audio:
+        with open(args.audio, 'rb') as audio_file:
+            audio_bytes = audio_file.read()
+    else:
+        audio_bytes = bytes(32 * 1024)
+
+    result = asyncio.run(run(args.url, args.requests, args.concurrency, audio_bytes, args.timeout))
+    for key, value in result.items():
+        print(f'{key:>16}: {value}')
+
+
+if __name__ == '__main__':
+    main()